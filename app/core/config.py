@@ -1,5 +1,97 @@
+from typing import List, Optional
 from dotenv import load_dotenv
+from pydantic_settings import BaseSettings
 
 print("Loading environment variables from .env file...")
 load_dotenv()
-print("Environment variables loaded.")
\ No newline at end of file
+print("Environment variables loaded.")
+
+class Settings(BaseSettings):
+    """
+    Service settings, read from environment variables (or the .env file).
+    """
+    # --- LLM ---
+    llm_model: str = "gpt-4o-mini"
+    llm_base_url: Optional[str] = None  # Point at any OpenAI-compatible server
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_timeout_seconds: float = 60.0
+    llm_connect_timeout_seconds: float = 5.0
+    llm_http2: bool = False
+    llm_repair_enabled: bool = True  # Fix near-miss structured output locally before re-asking the model
+
+    # --- Upstream scheduler ---
+    llm_rpm_limit: Optional[int] = None  # Requests per minute allowed by the API tier; None = unlimited
+    llm_tpm_limit: Optional[int] = None  # Tokens per minute allowed by the API tier; None = unlimited
+    llm_max_concurrency: int = 64
+    llm_min_concurrency: int = 1
+    llm_completion_token_estimate: int = 1000  # Tokens reserved per request for the completion
+    llm_latency_tolerance: float = 2.0  # Shrink concurrency when latency exceeds this multiple of the best seen
+    llm_max_retries: int = 4
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 30.0
+
+    # --- Tail-latency policy, opted into per operation (analysis, ats_check, ats_check_hybrid, jd_analysis) ---
+    llm_hedge_operations: List[str] = []  # Send a second request when a call of these is slower than usual
+    llm_hedge_percentile: float = 95.0  # "Slower than usual": this percentile of recent call durations
+    llm_hedge_min_delay_seconds: float = 0.5
+    llm_hedge_window: int = 200  # Recent durations kept per operation and model
+    llm_hedge_min_samples: int = 20  # No hedging until this many calls were seen
+    llm_cascade_operations: List[str] = []  # Try llm_cascade_model first for these
+    llm_cascade_model: Optional[str] = None  # Faster/cheaper model; escalate to llm_model when its output fails validation
+    llm_cascade_max_input_tokens: int = 3000  # Larger inputs go straight to llm_model
+
+    # --- Result cache ---
+    cache_enabled: bool = True
+    cache_memory_max_entries: int = 1024
+    cache_memory_ttl_seconds: int = 3600
+    cache_db_path: str = "cache.sqlite3"
+    cache_db_ttl_seconds: int = 7 * 24 * 3600
+
+    # --- Input preprocessing ---
+    preprocess_enabled: bool = True
+    cv_token_budget: int = 6000
+    jd_token_budget: int = 3000
+
+    # --- Batch analysis ---
+    batch_max_items: int = 200
+    batch_max_concurrency: int = 8
+
+    # --- Local pre-scoring ---
+    prescore_threshold: Optional[int] = None  # Skip the LLM below this technical score
+    prescore_max_batch_items: int = 10000
+
+    # --- Document upload ---
+    ingest_max_upload_bytes: int = 10 * 1024 * 1024
+    ingest_spool_memory_bytes: int = 1024 * 1024  # Larger uploads are spooled to a temporary file
+    ingest_workers: Optional[int] = None  # Text extraction processes; None = one per CPU core
+    ingest_timeout_seconds: float = 30.0
+
+    # --- Candidate pool and /rank ---
+    pool_dir: str = "candidate_pool"
+    pool_compact_threshold: int = 2000  # Rebuild the on-disk index after this many additions
+    rank_max_top_k: int = 100
+
+    # --- Incremental re-analysis ---
+    documents_db_path: str = "documents.sqlite3"
+    documents_ttl_seconds: int = 30 * 24 * 3600  # Forget a document's analysis after this long without edits
+
+    # --- Job queue ---
+    jobs_db_path: str = "jobs.sqlite3"
+    jobs_concurrency: int = 4  # Workers per process; 0 only queues jobs for other processes
+    jobs_max_queued: int = 100000
+    jobs_lease_seconds: float = 600.0  # Renewed while a job runs; a job whose process dies is re-queued once it expires
+    jobs_max_attempts: int = 3
+    jobs_retry_backoff_seconds: float = 30.0  # Before the first retry of a transient failure, doubling after
+    jobs_poll_interval_seconds: float = 1.0
+    jobs_retention_seconds: int = 7 * 24 * 3600
+    jobs_webhook_timeout_seconds: float = 10.0
+    jobs_webhook_max_attempts: int = 3
+    jobs_webhook_secret: Optional[str] = None  # Signs webhook bodies with HMAC-SHA256
+    jobs_webhook_allow_private: bool = False  # Allow webhooks to loopback, private and link-local addresses
+
+    # --- Metrics ---
+    metrics_timing_header: bool = False  # Add a Server-Timing header with the per-phase breakdown
+
+settings = Settings()
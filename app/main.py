@@ -1,17 +1,52 @@
 from .core import config
-from fastapi import FastAPI, HTTPException
-from .schemas import AnalysisRequest, AnalysisResponse, ATSCheckRequest, ATSCheckResponse, JDAnalysisRequest, JDAnalysisResponse
-from .services.analyzer import run_analysis
-from .services.jd_analyzer import run_jd_analysis
-from .services.ats_checker import run_ats_check
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import List, Literal, Optional
+from fastapi import FastAPI, File, Form, HTTPException, Response, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from .core.config import settings
+from .schemas import AnalysisRequest, AnalysisResponse, AnalysisSection, ATSCheckRequest, ATSCheckResponse, ATSSection, ATSCheckJobRequest, AnalysisJobRequest, BatchAnalysisRequest, CandidateCreateRequest, CandidateCreateResponse, JDAnalysisJobRequest, JDAnalysisRequest, JDAnalysisResponse, JobStatusResponse, ExtractedDocument, PreprocessRequest, PreprocessResponse, RankRequest, RankResponse, ReportRequest, ReportResponse
+from .services.analyzer import run_analysis, stream_analysis
+from .services.jd_analyzer import run_jd_analysis, stream_jd_analysis
+from .services.ats_checker import run_ats_check, stream_ats_check
+from .services.batch import run_batch_analysis
+from .services.cache import result_cache
+from .services.candidate_pool import close_pool, get_pool, run_rank
+from .services.documents import close_document_store
+from .services.ingest import UploadLimitMiddleware, close_extractor_pool, ingest_upload
+from .services.jobs import close_job_queue, get_job_queue
+from .services.llm import close_client
+from .services.metrics import MetricsMiddleware, registry
+from .services.preprocess import prepare_text, preprocess_stats
+from .services.report import run_report
+from .services.singleflight import inflight
+from .services.streaming import SSE_HEADERS, to_sse
 from app.__version__ import __version__
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads the candidate pool index and starts the job workers on startup, and
+    releases shared resources, such as the pooled LLM client, on shutdown.
+    """
+    get_pool()
+    await get_job_queue().start(settings.jobs_concurrency)
+    yield
+    await close_job_queue()
+    await close_client()
+    close_pool()
+    close_document_store()
+    close_extractor_pool()
+
 # Initialize the FastAPI app
 app = FastAPI(
     title="ResumeAlign AI - Alignment Service",
     description="A microservice to analyze CVs against job descriptions.",
-    version=__version__
+    version=__version__,
+    lifespan=lifespan
 )
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(MetricsMiddleware, timing_header=settings.metrics_timing_header)
 
 @app.get("/", tags=["Health Check"])
 async def read_root():
@@ -43,6 +78,30 @@ async def analyze_cv_jd(request: AnalysisRequest):
         # Catch any other unexpected errors
         raise HTTPException(status_code=500, detail=f"An unexpected internal error occurred: {str(e)}")
     
+@app.post("/analyze/stream", tags=["Analysis"])
+async def analyze_cv_jd_stream(request: AnalysisRequest):
+    """
+    Streaming variant of /analyze using Server-Sent Events.
+
+    Emits 'partial' events with the analysis as far as the model has produced it,
+    then one 'complete' event with the fully validated response (or an 'error' event).
+    """
+    return StreamingResponse(to_sse(stream_analysis(request)), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/analyze/batch", tags=["Analysis"])
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyzes one CV against many JDs (or many CVs against one JD).
+
+    Results are streamed back as NDJSON, one line per item in completion order.
+    Each line carries the item's 'index' and either its 'analysis' or an 'error'.
+    """
+    item_count = len(request.jd_texts if request.jd_texts is not None else request.cv_texts)
+    max_items = settings.prescore_max_batch_items if request.mode == "fast" else settings.batch_max_items
+    if item_count > max_items:
+        raise HTTPException(status_code=422, detail=f"A batch may contain at most {max_items} items.")
+    return StreamingResponse(run_batch_analysis(request), media_type="application/x-ndjson")
+
 @app.post("/analyze-jd-profile", response_model=JDAnalysisResponse, tags=["Analysis"])
 async def analyze_jd_profile(request: JDAnalysisRequest):
     """
@@ -63,6 +122,13 @@ async def analyze_jd_profile(request: JDAnalysisRequest):
         # Catch any other unexpected errors
         raise HTTPException(status_code=500, detail="An unexpected internal error occurred.")
     
+@app.post("/analyze-jd-profile/stream", tags=["Analysis"])
+async def analyze_jd_profile_stream(request: JDAnalysisRequest):
+    """
+    Streaming variant of /analyze-jd-profile using Server-Sent Events.
+    """
+    return StreamingResponse(to_sse(stream_jd_analysis(request)), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post("/check-ats", response_model=ATSCheckResponse, tags=["ATS Checker"])
 async def check_ats_friendliness(request: ATSCheckRequest):
     """
@@ -75,3 +141,167 @@ async def check_ats_friendliness(request: ATSCheckRequest):
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected internal error occurred: {str(e)}")
+
+@app.post("/check-ats/stream", tags=["ATS Checker"])
+async def check_ats_friendliness_stream(request: ATSCheckRequest):
+    """
+    Streaming variant of /check-ats using Server-Sent Events.
+    """
+    return StreamingResponse(to_sse(stream_ats_check(request)), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/analyze/upload", response_model=AnalysisResponse, tags=["Analysis"])
+async def analyze_cv_upload(
+    cv_file: UploadFile = File(..., description="The CV as a PDF, DOCX or plain text file."),
+    jd_text: str = Form(..., description="The full text content of the job description."),
+    mode: Literal['full', 'fast'] = Form('full'),
+    jd_format: Literal['raw', 'digest'] = Form('raw'),
+    sections: Optional[List[AnalysisSection]] = Form(None),
+):
+    """
+    Variant of /analyze that takes the CV as an uploaded file. Its text is
+    extracted in a separate process and cached by file hash.
+    """
+    try:
+        document = await ingest_upload(cv_file)
+        request = AnalysisRequest(cv_text=document.text, jd_text=jd_text, mode=mode, jd_format=jd_format, sections=sections)
+        return await run_analysis(request)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected internal error occurred: {str(e)}")
+
+@app.post("/check-ats/upload", response_model=ATSCheckResponse, tags=["ATS Checker"])
+async def check_ats_upload(
+    cv_file: UploadFile = File(..., description="The CV as a PDF, DOCX or plain text file."),
+    mode: Literal['llm', 'hybrid', 'local'] = Form('llm'),
+    sections: Optional[List[ATSSection]] = Form(None),
+):
+    """
+    Variant of /check-ats that takes the CV as an uploaded file. Besides the
+    text checks, the file's layout (columns, tables, text boxes, images,
+    header/footer text) is checked for parsing risks.
+    """
+    try:
+        document = await ingest_upload(cv_file)
+        request = ATSCheckRequest(cv_text=document.text, mode=mode, sections=sections)
+        return await run_ats_check(request, layout=document.layout)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected internal error occurred: {str(e)}")
+
+@app.post("/report", response_model=ReportResponse, tags=["Analysis"])
+async def get_report(request: ReportRequest):
+    """
+    Runs /analyze, /check-ats and /analyze-jd-profile on one CV and JD
+    concurrently and returns the results together, in about the time of the
+    slowest one. Choose the sections with 'include'; a section that fails is
+    null and its error is reported under 'errors'.
+    """
+    return await run_report(request)
+
+@app.post("/jobs/analyze", response_model=JobStatusResponse, status_code=202, tags=["Jobs"])
+async def submit_analysis_job(request: AnalysisJobRequest):
+    """
+    Queues an /analyze request and returns its job id immediately.
+    Fetch the result from GET /jobs/{job_id}, or pass a 'webhook_url' to have it pushed.
+    """
+    return await get_job_queue().submit("analyze", request)
+
+@app.post("/jobs/check-ats", response_model=JobStatusResponse, status_code=202, tags=["Jobs"])
+async def submit_ats_check_job(request: ATSCheckJobRequest):
+    """
+    Queues a /check-ats request and returns its job id immediately.
+    """
+    return await get_job_queue().submit("check-ats", request)
+
+@app.post("/jobs/analyze-jd-profile", response_model=JobStatusResponse, status_code=202, tags=["Jobs"])
+async def submit_jd_analysis_job(request: JDAnalysisJobRequest):
+    """
+    Queues an /analyze-jd-profile request and returns its job id immediately.
+    """
+    return await get_job_queue().submit("analyze-jd-profile", request)
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse, tags=["Jobs"])
+async def get_job(job_id: str):
+    """
+    Returns the status of a job and, once it has finished, its result or error.
+    """
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.post("/candidates", response_model=CandidateCreateResponse, tags=["Candidate Pool"])
+async def add_candidate(request: CandidateCreateRequest):
+    """
+    Adds a CV to the candidate pool and indexes it for /rank.
+    """
+    pool = get_pool()
+    candidate_id = await pool.add(request.cv_text, request.candidate_id)
+    return CandidateCreateResponse(candidate_id=candidate_id, pool_size=pool.size())
+
+@app.delete("/candidates/{candidate_id}", status_code=204, tags=["Candidate Pool"])
+async def remove_candidate(candidate_id: str):
+    """
+    Removes a CV from the candidate pool.
+    """
+    if not await get_pool().remove(candidate_id):
+        raise HTTPException(status_code=404, detail="Candidate not found.")
+    return Response(status_code=204)
+
+@app.post("/rank", response_model=RankResponse, tags=["Candidate Pool"])
+async def rank_candidates(request: RankRequest):
+    """
+    Returns the top-k CVs of the pool for a job description, using the local
+    skill/keyword index. With 'analyze', the full analysis runs on those k only.
+    """
+    try:
+        return await run_rank(request)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected internal error occurred: {str(e)}")
+
+@app.post("/preprocess", response_model=PreprocessResponse, tags=["Preprocessing"])
+async def preprocess_text(request: PreprocessRequest):
+    """
+    Shows what the services send to the model for a CV or JD: the normalized,
+    de-duplicated and budget-trimmed text, with original vs. compacted token counts.
+    """
+    prepared = prepare_text(request.text, request.kind, request.token_budget)
+    return PreprocessResponse(**asdict(prepared))
+
+@app.post("/extract", response_model=ExtractedDocument, tags=["Preprocessing"])
+async def extract_upload(file: UploadFile = File(..., description="A PDF, DOCX or plain text file.")):
+    """
+    Returns the text and layout signals extracted from an uploaded file, as
+    the upload endpoints use them.
+    """
+    return await ingest_upload(file)
+
+@app.get("/preprocess/stats", tags=["Preprocessing"])
+async def get_preprocess_stats():
+    """
+    Returns the running totals of original vs. compacted tokens for this worker process.
+    """
+    return preprocess_stats.totals
+
+@app.get("/cache/stats", tags=["Cache"])
+async def get_cache_stats():
+    """
+    Returns hit/miss counters for the result cache of this worker process,
+    plus how many identical in-flight requests were coalesced.
+    """
+    return {**await result_cache.stats(), "single_flight": inflight.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Metrics"])
+async def get_metrics():
+    """
+    Returns the metrics of this worker process in the Prometheus text format:
+    per-endpoint latency and in-flight requests, LLM latency, tokens, retries
+    and errors, the per-phase time breakdown, and cache counters.
+    """
+    # The job counts come from SQLite; read them off the event loop before rendering
+    await get_job_queue().refresh_counts()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,13 +1,20 @@
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field, HttpUrl, model_validator
+from typing import Dict, List, Literal, Optional, Union
 
 # --- Analysis Models ---
+AnalysisSection = Literal['match_score', 'strengths', 'skill_gaps', 'learning_path', 'executive_summary', 'learning_potential']
+
 class AnalysisRequest(BaseModel):
     """
     Defines the input structure for the analysis endpoint.
     """
     cv_text: str = Field(..., description="The full text content of the user's curriculum vitae.")
     jd_text: str = Field(..., description="The full text content of the job description.")
+    mode: Literal['full', 'fast'] = Field('full', description="'fast' skips the LLM and returns a local, deterministic skill-overlap score.")
+    jd_format: Literal['raw', 'digest'] = Field('raw', description="'digest' sends the cached structured JD analysis to the model instead of the raw JD text.")
+    sections: Optional[List[AnalysisSection]] = Field(None, min_length=1, description="Only generate these parts of the analysis; the others are null. All by default.")
+    document_id: Optional[str] = Field(None, min_length=1, max_length=200, description="Identifies a CV that is edited and re-analyzed; only the parts affected by the changed CV sections are re-evaluated.")
 
 class LearningPotential(BaseModel):
     """
@@ -22,8 +29,8 @@ class ScoreBreakdown(BaseModel):
     Provides a detailed breakdown of the match score across different categories.
     """
     technical_skills: int = Field(..., ge=0, le=100, description="Score for matching required technologies, frameworks, and tools.")
-    experience: int = Field(..., ge=0, le=100, description="Score for alignment in years of experience and role responsibilities.")
-    soft_skills: int = Field(..., ge=0, le=100, description="Score for matching soft skills like communication, leadership, etc.")
+    experience: Optional[int] = Field(..., ge=0, le=100, description="Score for alignment in years of experience and role responsibilities. Null only when not assessed, as in fast mode.")
+    soft_skills: Optional[int] = Field(..., ge=0, le=100, description="Score for matching soft skills like communication, leadership, etc. Null only when not assessed, as in fast mode.")
 
 class MatchScore(BaseModel):
     """
@@ -59,11 +66,11 @@ class AnalysisResult(BaseModel):
     """
     The main structure containing the full analysis result.
     """
-    match_score: MatchScore
-    strengths: List[Strength]
-    skill_gaps: List[SkillGap]
+    match_score: MatchScore | None = None
+    strengths: List[Strength] | None = None
+    skill_gaps: List[SkillGap] | None = None
     learning_path: list[LearningStep] | None = None
-    executive_summary: str = Field(..., max_length=1000, description="A summary for the candidate about their fit for the role.")
+    executive_summary: str | None = Field(None, max_length=1000, description="A summary for the candidate about their fit for the role.")
     learning_potential: LearningPotential | None = None
 
 class AnalysisResponse(BaseModel):
@@ -72,12 +79,133 @@ class AnalysisResponse(BaseModel):
     """
     analysis: AnalysisResult
 
+# --- Batch analysis models ---
+class BatchAnalysisRequest(BaseModel):
+    """
+    Defines the input for the batch analysis endpoint: one CV against many JDs,
+    or many CVs against one JD.
+    """
+    cv_text: Optional[str] = Field(None, description="A single CV to analyze against every entry of 'jd_texts'.")
+    jd_texts: Optional[List[str]] = Field(None, description="The job descriptions to analyze 'cv_text' against.")
+    jd_text: Optional[str] = Field(None, description="A single JD to analyze every entry of 'cv_texts' against.")
+    cv_texts: Optional[List[str]] = Field(None, description="The CVs to analyze against 'jd_text'.")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Upper bound on concurrent analyses for this batch; capped by the server limit.")
+    mode: Literal['full', 'fast'] = Field('full', description="'fast' scores every pair locally without calling the LLM.")
+    jd_format: Literal['raw', 'digest'] = Field('raw', description="'digest' analyzes each JD once and reuses its structured form for every pair.")
+
+    @model_validator(mode="after")
+    def _check_pairing(self) -> "BatchAnalysisRequest":
+        one_cv = self.cv_text is not None and self.jd_texts is not None
+        one_jd = self.jd_text is not None and self.cv_texts is not None
+        if one_cv == one_jd:
+            raise ValueError("Provide either 'cv_text' with 'jd_texts' or 'jd_text' with 'cv_texts'.")
+        return self
+
+    def items(self) -> List[AnalysisRequest]:
+        """Expands the batch into one AnalysisRequest per CV/JD pair, in input order."""
+        if self.jd_texts is not None:
+            return [AnalysisRequest(cv_text=self.cv_text, jd_text=jd, mode=self.mode, jd_format=self.jd_format) for jd in self.jd_texts]
+        return [AnalysisRequest(cv_text=cv, jd_text=self.jd_text, mode=self.mode, jd_format=self.jd_format) for cv in self.cv_texts]
+
+class BatchItemError(BaseModel):
+    """
+    Describes why a single item of a batch failed.
+    """
+    status_code: int = Field(..., description="The HTTP status the item would have returned on its own.")
+    detail: str = Field(..., description="The error message for this item.")
+
+class BatchAnalysisItem(BaseModel):
+    """
+    One NDJSON line of the batch analysis stream. Exactly one of 'analysis' or 'error' is set.
+    """
+    index: int = Field(..., description="Position of the item in 'jd_texts' or 'cv_texts'.")
+    analysis: Optional[AnalysisResult] = None
+    error: Optional[BatchItemError] = None
+
+# --- Candidate pool models ---
+class CandidateCreateRequest(BaseModel):
+    """
+    Adds a CV to the candidate pool. Re-using an existing id replaces that CV.
+    """
+    candidate_id: Optional[str] = Field(None, description="A stable id for the CV; generated when omitted.")
+    cv_text: str = Field(..., description="The full text content of the candidate's curriculum vitae.")
+
+class CandidateCreateResponse(BaseModel):
+    """The id under which the CV was stored, and the resulting pool size."""
+    candidate_id: str
+    pool_size: int
+
+class RankRequest(BaseModel):
+    """
+    Ranks the whole candidate pool against one job description.
+    """
+    jd_text: str = Field(..., description="The full text content of the job description.")
+    top_k: int = Field(20, ge=1, description="How many of the best-matching CVs to return.")
+    analyze: bool = Field(False, description="Also run the full LLM analysis on the returned CVs.")
+
+class RankedCandidate(BaseModel):
+    """A CV from the pool with its local retrieval score."""
+    candidate_id: str
+    score: float = Field(..., description="Share (0-1) of the JD's IDF-weighted skills and keywords found in the CV.")
+    analysis: Optional[AnalysisResult] = Field(None, description="The full analysis, when 'analyze' was requested.")
+    error: Optional[BatchItemError] = Field(None, description="Why the full analysis failed for this CV, if it did.")
+
+class RankResponse(BaseModel):
+    """The best-matching CVs, highest score first."""
+    pool_size: int
+    results: List[RankedCandidate]
+
+# --- Preprocessing models ---
+class PreprocessRequest(BaseModel):
+    """
+    Runs the input preprocessing stage on one text, as the services do before building prompts.
+    """
+    text: str = Field(..., description="The raw CV or JD text.")
+    kind: Literal['cv', 'jd'] = Field(..., description="Whether the text is a CV or a job description.")
+    token_budget: Optional[int] = Field(None, ge=1, description="Overrides the configured token budget for this kind.")
+
+class PreprocessResponse(BaseModel):
+    """
+    The compacted text with its original and compacted token estimates.
+    """
+    text: str
+    original_tokens: int
+    tokens: int
+    sections: List[str] = Field(..., description="The sections kept, in document order.")
+    dropped_sections: List[str] = Field(..., description="Sections removed to fit the token budget.")
+    truncated: bool = Field(..., description="True if trailing lines of a kept section were cut.")
+
+# --- Upload models ---
+class DocumentLayout(BaseModel):
+    """
+    Layout signals of an uploaded file that its extracted text no longer shows.
+    """
+    file_type: Literal['pdf', 'docx', 'txt']
+    pages: Optional[int] = Field(None, description="Page count, for PDFs.")
+    columns: int = Field(1, description="The most text columns found in any section or page.")
+    tables: int = Field(0, description="Tables in the document (DOCX only).")
+    text_boxes: int = Field(0, description="Floating text boxes, which many parsers skip (DOCX only).")
+    images: int = Field(0, description="Embedded images, such as photos, icons or logos.")
+    header_footer_text: bool = Field(False, description="True if text such as contact details sits in page headers or footers (DOCX only).")
+
+class ExtractedDocument(BaseModel):
+    """
+    The text extracted from an uploaded file, with its layout signals.
+    """
+    sha256: str = Field(..., description="Hash of the file contents; extractions are cached under it.")
+    text: str
+    layout: DocumentLayout
+
 # --- ATS checker models ---
+ATSSection = Literal['ats_score', 'summary', 'issues']
+
 class ATSCheckRequest(BaseModel):
     """
     Defines the input for the ATS checker endpoint. It only needs the CV text.
     """
     cv_text: str = Field(..., description="The full text content of the user's curriculum vitae.")
+    mode: Literal['llm', 'hybrid', 'local'] = Field('llm', description="'local' runs only the rule-based checks; 'hybrid' adds an LLM-written summary and parsing-risk review on top of them; 'llm' asks the model for everything.")
+    sections: Optional[List[ATSSection]] = Field(None, min_length=1, description="Only generate these parts of the check; the others are null. All by default.")
 
 class ATSIssue(BaseModel):
     """
@@ -91,9 +219,9 @@ class ATSResult(BaseModel):
     """
     Contains the full results of the ATS-friendliness check, including a score and a list of issues.
     """
-    ats_score: int = Field(..., ge=0, le=100, description="An overall score from 0-100 indicating ATS compatibility.")
-    summary: str = Field(..., description="A general summary of the CV's performance against ATS standards.")
-    issues: List[ATSIssue] = Field(..., description="A list of specific issues found that could harm ATS parsing.")
+    ats_score: int | None = Field(None, ge=0, le=100, description="An overall score from 0-100 indicating ATS compatibility.")
+    summary: str | None = Field(None, description="A general summary of the CV's performance against ATS standards.")
+    issues: List[ATSIssue] | None = Field(None, description="A list of specific issues found that could harm ATS parsing.")
 
 class ATSCheckResponse(BaseModel):
     """
@@ -101,10 +229,26 @@ class ATSCheckResponse(BaseModel):
     """
     ats_check: ATSResult
 
+class ATSProseIssue(ATSIssue):
+    """
+    An issue the model may add in hybrid mode; the other categories are checked locally.
+    """
+    issue_type: Literal['Formatting', 'Parsing Risk'] = Field(..., description="The category of the issue found.")
+
+class ATSProseResult(BaseModel):
+    """
+    The model's part of a hybrid ATS check: the summary and the layout-related issues.
+    """
+    summary: str = Field(..., description="A general summary of the CV's performance against ATS standards, covering the local findings too.")
+    issues: List[ATSProseIssue] = Field(..., description="Formatting and parsing-risk issues inferred from the text.")
+
 # --- JD analyzer models ---
+JDSection = Literal['is_hybrid_role', 'primary_focus', 'identified_profiles', 'conflict_summary', 'hiring_realism', 'recommendations']
+
 class JDAnalysisRequest(BaseModel):
     """Request model for JD-only analysis."""
     jd_text: str
+    sections: Optional[List[JDSection]] = Field(None, min_length=1, description="Only generate these parts of the analysis; the others are null. All by default.")
 
 class IdentifiedProfile(BaseModel):
     """Represents a single professional profile identified within a JD."""
@@ -121,14 +265,72 @@ class HiringRealism(BaseModel):
 
 class JDAnalysis(BaseModel):
     """The core analysis of the job description."""
-    is_hybrid_role: bool = Field(..., description="True if the JD combines multiple distinct roles.")
-    primary_focus: str = Field(..., description="The main functional area of the job.")
-    identified_profiles: List[IdentifiedProfile] = Field(..., description="A list of distinct profiles found in the JD.")
-    conflict_summary: str = Field(..., description="An explanation of why the combination of profiles is challenging.")
-    hiring_realism: HiringRealism = Field(..., description="An assessment of the hiring difficulty.")
-    recommendations: List[str] = Field(..., description="Actionable suggestions for the hiring manager.")
+    is_hybrid_role: bool | None = Field(None, description="True if the JD combines multiple distinct roles.")
+    primary_focus: str | None = Field(None, description="The main functional area of the job.")
+    identified_profiles: List[IdentifiedProfile] | None = Field(None, description="A list of distinct profiles found in the JD.")
+    conflict_summary: str | None = Field(None, description="An explanation of why the combination of profiles is challenging.")
+    hiring_realism: HiringRealism | None = Field(None, description="An assessment of the hiring difficulty.")
+    recommendations: List[str] | None = Field(None, description="Actionable suggestions for the hiring manager.")
 
 class JDAnalysisResponse(BaseModel):
     """The final Pydantic model for the JD analysis API response."""
     jd_analysis: JDAnalysis
-    
\ No newline at end of file
+
+# --- Report models ---
+ReportSection = Literal['analysis', 'ats_check', 'jd_analysis']
+
+class ReportRequest(BaseModel):
+    """
+    Runs the CV/JD analysis, the ATS check and the JD analysis in one request.
+    """
+    cv_text: str = Field(..., description="The full text content of the user's curriculum vitae.")
+    jd_text: str = Field(..., description="The full text content of the job description.")
+    include: List[ReportSection] = Field(['analysis', 'ats_check', 'jd_analysis'], min_length=1, description="The sections to compute.")
+    mode: Literal['full', 'fast'] = Field('full', description="Mode of the 'analysis' section, as in /analyze.")
+    jd_format: Literal['raw', 'digest'] = Field('raw', description="JD format of the 'analysis' section, as in /analyze. 'digest' reuses this report's JD analysis.")
+    ats_mode: Literal['llm', 'hybrid', 'local'] = Field('llm', description="Mode of the 'ats_check' section, as in /check-ats.")
+
+class ReportResponse(BaseModel):
+    """
+    The requested sections, each with the same body its own endpoint returns.
+    A section that failed is null and its error is listed under 'errors'.
+    """
+    analysis: Optional[AnalysisResult] = None
+    ats_check: Optional[ATSResult] = None
+    jd_analysis: Optional[JDAnalysis] = None
+    errors: Dict[ReportSection, BatchItemError] = Field(default_factory=dict, description="Why each failed section failed, with the status its own endpoint would have returned.")
+
+# --- Job models ---
+JobKind = Literal['analyze', 'check-ats', 'analyze-jd-profile']
+JobStatus = Literal['queued', 'running', 'succeeded', 'failed']
+
+class JobOptions(BaseModel):
+    """
+    Scheduling options accepted by every job submission.
+    """
+    priority: Literal['high', 'normal', 'low'] = Field('normal', description="Queued jobs run by priority, oldest first within a level.")
+    webhook_url: Optional[HttpUrl] = Field(None, description="If set, the finished job is POSTed to this URL.")
+
+class AnalysisJobRequest(JobOptions, AnalysisRequest):
+    """Queues an /analyze request."""
+
+class ATSCheckJobRequest(JobOptions, ATSCheckRequest):
+    """Queues a /check-ats request."""
+
+class JDAnalysisJobRequest(JobOptions, JDAnalysisRequest):
+    """Queues an /analyze-jd-profile request."""
+
+class JobStatusResponse(BaseModel):
+    """
+    The state of a queued job and, once it has finished, its result or error.
+    """
+    job_id: str
+    kind: JobKind
+    status: JobStatus
+    priority: Literal['high', 'normal', 'low']
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Union[AnalysisResponse, ATSCheckResponse, JDAnalysisResponse]] = Field(None, description="The same body the synchronous endpoint returns.")
+    error: Optional[BatchItemError] = Field(None, description="Why the job failed, with the status the synchronous endpoint would have returned.")
+    webhook_status: Optional[Literal['pending', 'delivered', 'failed']] = Field(None, description="Delivery state of the webhook, if one was given.")
@@ -1,119 +1,238 @@
-import instructor
-import openai
+from typing import AsyncIterator, Optional, Tuple
 from fastapi import HTTPException
-from ..schemas import AnalysisRequest, AnalysisResponse
-
-aclient  = instructor.patch(openai.AsyncOpenAI())
-
-def _create_analysis_prompt(cv_text: str, jd_text: str) -> str:
-    """
-    Creates the detailed, structured prompt for the LLM.
-    This is a private helper function.
-    """
-    # Note: The quality of this prompt is critical for the quality of the output.
-    # We are instructing the AI to act as a specific persona and to format
-    # its output exactly like our Pydantic models.
-    return f"""
+from pydantic import BaseModel
+from ..core.config import settings
+from ..schemas import AnalysisRequest, AnalysisResponse, AnalysisResult, JDAnalysisRequest
+from .cache import make_key, result_cache
+from .documents import INCREMENTAL_ANALYSES, DocumentState, affected_sections, get_document_store, section_fingerprints
+from .jd_analyzer import JD_ANALYSIS_PROMPT, render_jd_digest, run_jd_analysis
+from .llm import create_completion
+from .metrics import timed_phase
+from .preprocess import prepare_text
+from .prescorer import build_fast_analysis, prescore_pair
+from .prompts import PromptSection, register_sectioned_prompt
+from .sections import llm_response_model, section_key, select_sections, to_api_response
+from .singleflight import inflight
+from .streaming import stream_completion
+
+# Note: The quality of this prompt is critical for the quality of the output.
+# We are instructing the AI to act as a specific persona and to format
+# its output exactly like our Pydantic models. The CV and JD follow as their own messages.
+# Bump the version whenever the prompt changes so cached results are not reused across versions.
+ANALYSIS_PROMPT = register_sectioned_prompt(
+  "analysis",
+  "3",
+  header="""
 # ROLE & GOAL
 You are a world-class, senior IT recruitment expert with 15+ years of experience. Your task is to provide a critical, data-driven analysis comparing a candidate's CV against a job description (JD). Your output must be structured, actionable, and strictly adhere to the requested JSON format. Do not add any commentary or text outside of the final JSON object.
 
 # CONTEXT
-- CV_TEXT: ```{cv_text}```
-- JOB_DESCRIPTION_TEXT: ```{jd_text}```
+The candidate's CV (CV_TEXT) and the job description (JOB_DESCRIPTION_TEXT) follow in separate messages.
 
 # DETAILED INSTRUCTIONS
 Analyze the provided texts and generate a JSON response. The analysis must cover the following points:
-
-1.  **Match Score Calculation**:
+""",
+  sections=[
+    PromptSection(("match_score",), """
+**Match Score Calculation**:
     - Evaluate the alignment across three key areas: technical skills, experience, and soft skills, each on a scale of 0-100.
     - Calculate a final, weighted 'overall_score'.
     - Provide a concise 'summary' justifying your scoring.
-
-2.  **Strengths Identification**:
+"""),
+    PromptSection(("strengths",), """
+**Strengths Identification**:
     - List the top, most relevant skills or experiences from the CV that directly match the core requirements of the JD.
     - For each strength, provide a short 'evidence' quote from the CV.
-
-3.  **Skill Gap Detection**:
+"""),
+    PromptSection(("skill_gaps",), """
+**Skill Gap Detection**:
     - Identify critical, important, or desirable skills mentioned in the JD that are absent or underdeveloped in the CV. A desirable skill may be mentioned as familiarity and Additional knowledge.
     - For each gap, state its 'importance' and provide a 'reason' explaining its relevance to the role based on the JD.
-
-4.  **Learning Path Suggestion**:
+"""),
+    PromptSection(("learning_path",), """
+**Learning Path Suggestion**:
     - For the most significant skill gaps, propose a concrete 'recommendation' for improvement (e.g., a specific course, book, or type of project).
-
-5.  **Executive Summary**:
+"""),
+    PromptSection(("executive_summary",), """
+**Executive Summary**:
     - Write a concise summary (max 150 words) for the candidate. It should summarize their overall fit, highlight their main selling points, and suggest the most critical area for improvement to become an ideal candidate.
-
-6.  **Learning Potential Assessment**:
+"""),
+    PromptSection(("learning_potential",), """
+**Learning Potential Assessment**:
     - Based on the candidate's career progression, diversity of technologies used (e.g., working with multiple languages, clouds, or frameworks), and evidence of continuous learning (like certifications or personal projects), assess their potential to learn the missing skills.
     - Provide a 'rating' of High, Medium, or Low.
     - Justify this rating in a 'summary'.
     - List the specific 'evidence' from the CV that supports your conclusion.
-
+"""),
+  ],
+  footer="""
 # MANDATORY OUTPUT FORMAT
 Generate a single JSON object that strictly follows the required schema. Do not include markdown formatting like ```json in your response.
 **CRITICAL: All keys in the JSON object MUST be in snake_case (e.g., 'overall_score', 'technical_skills', 'skill_gaps'). Do not use spaces, dashes, or capitalization in the keys. The output must strictly follow the required schema.**
 The final JSON object MUST be complete and contain all the sections shown in the example structure below.
 
 **HERE IS AN EXAMPLE of the required structure. Populate all fields with your analysis:**
-```json
-{{
-  "analysis": {{
-    "match_score": {{
-      "overall_score": 0,
-      "breakdown": {{
-        "technical_skills": 0,
-        "experience": 0,
-        "soft_skills": 0
-      }},
-      "summary": "Your summary of the score goes here."
-    }},
-    "strengths": [
-      {{
-        "skill": "A key skill from the CV that matches the JD.",
-        "evidence": "A brief quote from the CV as evidence."
-      }}
-    ],
-    "skill_gaps": [
-      {{
-        "skill": "A skill required by the JD but missing from the CV.",
-        "importance": "Critical",
-        "reason": "Why this skill is important for the role."
-      }}
-    ],
-    "learning_path": [
-      {{
-        "skill_to_develop": "The skill from the gap.",
-        "recommendation": "A concrete learning recommendation."
-      }}
-    ],
-    "executive_summary": "Your final executive summary for the candidate.",
-    "learning_potential": {{
-      "rating": "High",
-      "summary": "The candidate has a strong track record of adapting to new technologies and frameworks, suggesting they can learn the missing skills quickly.",
-      "evidence": [
-        "Successfully migrated a legacy system from Java to Go.",
-        "Holds certifications in both AWS and GCP, showing adaptability across cloud platforms."
-      ]
-    }}
-  }}
-}}
-"""
-
-async def run_analysis(request: AnalysisRequest) -> AnalysisResponse:
+""",
+  example={
+    "analysis": {
+      "match_score": {
+        "overall_score": 0,
+        "breakdown": {
+          "technical_skills": 0,
+          "experience": 0,
+          "soft_skills": 0
+        },
+        "summary": "Your summary of the score goes here."
+      },
+      "strengths": [
+        {
+          "skill": "A key skill from the CV that matches the JD.",
+          "evidence": "A brief quote from the CV as evidence."
+        }
+      ],
+      "skill_gaps": [
+        {
+          "skill": "A skill required by the JD but missing from the CV.",
+          "importance": "Critical",
+          "reason": "Why this skill is important for the role."
+        }
+      ],
+      "learning_path": [
+        {
+          "skill_to_develop": "The skill from the gap.",
+          "recommendation": "A concrete learning recommendation."
+        }
+      ],
+      "executive_summary": "Your final executive summary for the candidate.",
+      "learning_potential": {
+        "rating": "High",
+        "summary": "The candidate has a strong track record of adapting to new technologies and frameworks, suggesting they can learn the missing skills quickly.",
+        "evidence": [
+          "Successfully migrated a legacy system from Java to Go.",
+          "Holds certifications in both AWS and GCP, showing adaptability across cloud platforms."
+        ]
+      }
+    }
+  },
+  wrapper="analysis",
+)
+
+# Sections the model may leave out even when they are requested
+_OPTIONAL_SECTIONS = ("learning_path", "learning_potential")
+
+def _try_fast_analysis(request: AnalysisRequest) -> Optional[AnalysisResponse]:
+  """
+  Returns the local pre-scored analysis when the request should not reach the LLM.
+  """
+  sections = section_key(AnalysisResult, request.sections)
+  if request.mode == "fast":
+    score = prescore_pair(request.cv_text, request.jd_text)
+    return select_sections(build_fast_analysis(request.cv_text, request.jd_text, score), sections)
+  if settings.prescore_threshold is not None:
+    score = prescore_pair(request.cv_text, request.jd_text)
+    if score.technical_skills < settings.prescore_threshold:
+      return select_sections(build_fast_analysis(request.cv_text, request.jd_text, score), sections)
+  return None
+
+def _analysis_cache_key(request: AnalysisRequest) -> str:
+  # A digest prompt also depends on the JD analysis prompt that produced the digest
+  namespace = "analysis" if request.jd_format == "raw" else f"analysis:digest:{JD_ANALYSIS_PROMPT.version}"
+  sections = section_key(AnalysisResult, request.sections)
+  if sections is not None:
+    namespace += ":" + ",".join(sections)
+  return make_key(namespace, settings.llm_model, ANALYSIS_PROMPT.version, request.cv_text, request.jd_text)
+
+async def _jd_prompt_text(request: AnalysisRequest) -> str:
+  """
+  Returns the JD text to embed in the prompt. In 'digest' mode this is the
+  structured JD analysis, computed once per JD and reused from the result
+  cache for every later CV matched against the same JD.
+  """
+  if request.jd_format == "digest":
+    jd_response = await run_jd_analysis(JDAnalysisRequest(jd_text=request.jd_text), preprocessed=True)
+    return render_jd_digest(jd_response.jd_analysis)
+  return request.jd_text
+
+def _prepare_request(request: AnalysisRequest) -> AnalysisRequest:
+  """
+  Returns a copy of the request with the CV and JD normalized, de-duplicated
+  and trimmed to their token budgets.
+  """
+  return request.model_copy(update={
+    "cv_text": prepare_text(request.cv_text, "cv").text,
+    "jd_text": prepare_text(request.jd_text, "jd").text,
+  })
+
+async def run_analysis(request: AnalysisRequest, *, preprocessed: bool = False) -> AnalysisResponse:
   """
   Runs the analysis by sending the request to the LLM and parsing
   the structured response.
+
+  In 'fast' mode, or when the local pre-score falls below the configured
+  threshold, the LLM is skipped and the local analysis is returned instead.
+  Pass `preprocessed` when the texts already went through prepare_text.
+  """
+  if not preprocessed:
+    request = _prepare_request(request)
+  fast_result = _try_fast_analysis(request)
+  if fast_result is not None:
+    return fast_result
+  if request.document_id is not None and request.sections is None:
+    return await _run_incremental_analysis(request)
+  return await _analyze(request)
+
+async def _run_incremental_analysis(request: AnalysisRequest) -> AnalysisResponse:
+  """
+  Re-analyzes a new version of a tracked CV against the same JD. Only the
+  parts of the analysis that draw on the changed CV sections, and the match
+  score, are re-evaluated; the rest is reused from the previous analysis.
   """
-  prompt = _create_analysis_prompt(request.cv_text, request.jd_text)
+  store = get_document_store()
+  # A different JD, model or prompt invalidates the whole previous analysis
+  basis = make_key(
+    f"analysis:document:{request.jd_format}", settings.llm_model,
+    f"{ANALYSIS_PROMPT.version}:{JD_ANALYSIS_PROMPT.version}", request.jd_text,
+  )
+  fingerprints = section_fingerprints(request.cv_text)
+  previous = await store.get(request.document_id)
+
+  if previous is None or previous.basis != basis:
+    INCREMENTAL_ANALYSES.inc(outcome="new" if previous is None else "rebased")
+    response = await _analyze(request)
+  else:
+    sections = affected_sections(previous.fingerprints, fingerprints)
+    if not sections:
+      INCREMENTAL_ANALYSES.inc(outcome="unchanged")
+      return previous.analysis
+    INCREMENTAL_ANALYSES.inc(outcome="partial" if len(sections) < len(AnalysisResult.model_fields) else "full")
+    update = await _analyze(request.model_copy(update={"sections": list(sections)}))
+    response = previous.analysis.model_copy(update={
+      "analysis": previous.analysis.analysis.model_copy(update={name: getattr(update.analysis, name) for name in sections}),
+    })
+
+  await store.set(request.document_id, DocumentState(basis, fingerprints, response))
+  return response
+
+async def _analyze(request: AnalysisRequest) -> AnalysisResponse:
+  cache_key = _analysis_cache_key(request)
+  # Identical requests arriving while one is in flight share its upstream call
+  return await inflight.do(cache_key, lambda: _run_analysis(request, cache_key))
+
+async def _run_analysis(request: AnalysisRequest, cache_key: str) -> AnalysisResponse:
+  cached = await result_cache.get(cache_key, AnalysisResponse)
+  if cached is not None:
+    return cached
+
+  sections = section_key(AnalysisResult, request.sections)
+  jd_text = await _jd_prompt_text(request)
+  with timed_phase("prompt"):
+    messages = ANALYSIS_PROMPT.messages(sections, cv_text=request.cv_text, job_description_text=jd_text)
   
   try:
-    response = await aclient.chat.completions.create(
-      model="gpt-4o-mini",
-      messages=[{"role": "user", "content": prompt}],
-      response_model=AnalysisResponse,
-      max_retries=2,
-    )
-    return response
+    output = await create_completion("analysis", messages, llm_response_model(AnalysisResponse, sections, _OPTIONAL_SECTIONS))
+    response = to_api_response(AnalysisResponse, output)
+  except HTTPException:
+    raise
   except Exception as e:
     # Add structured logging here  <-- IMPORTANT
     print(f"An error occurred during LLM analysis: {e}")
@@ -121,4 +240,35 @@ async def run_analysis(request: AnalysisRequest) -> AnalysisResponse:
     raise HTTPException(
       status_code=500,
       detail="Failed to get a valid analysis from the AI model."
-    )
\ No newline at end of file
+    )
+
+  await result_cache.set(cache_key, response)
+  return response
+
+async def stream_analysis(request: AnalysisRequest) -> AsyncIterator[Tuple[str, BaseModel]]:
+  """
+  Streams the analysis as the model produces it: yields ("partial", snapshot)
+  pairs, then ("complete", AnalysisResponse) once it is fully validated.
+  """
+  request = _prepare_request(request)
+  fast_result = _try_fast_analysis(request)
+  if fast_result is not None:
+    yield "complete", fast_result
+    return
+
+  cache_key = _analysis_cache_key(request)
+  cached = await result_cache.get(cache_key, AnalysisResponse)
+  if cached is not None:
+    yield "complete", cached
+    return
+
+  sections = section_key(AnalysisResult, request.sections)
+  jd_text = await _jd_prompt_text(request)
+  with timed_phase("prompt"):
+    messages = ANALYSIS_PROMPT.messages(sections, cv_text=request.cv_text, job_description_text=jd_text)
+
+  async for event, item in stream_completion(
+    "analysis", messages, llm_response_model(AnalysisResponse, sections, _OPTIONAL_SECTIONS), AnalysisResponse,
+    cache_key, "Failed to get a valid analysis from the AI model."
+  ):
+    yield event, item
@@ -1,21 +1,29 @@
-import instructor
-import openai
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import HTTPException
-from ..schemas import ATSCheckRequest, ATSCheckResponse
+from pydantic import BaseModel
+from ..core.config import settings
+from ..schemas import ATSCheckRequest, ATSCheckResponse, ATSIssue, ATSProseResult, ATSResult, DocumentLayout
+from .ats_rules import LocalATSReport, add_layout_findings, run_local_ats_check
+from .cache import make_key, result_cache
+from .llm import create_completion
+from .metrics import timed_phase
+from .preprocess import prepare_text
+from .prompts import register_prompt, register_sectioned_prompt
+from .sections import llm_response_model, section_key, select_sections, to_api_response
+from .singleflight import inflight
+from .streaming import stream_completion
 
-aclient = instructor.patch(openai.AsyncOpenAI())
-
-def _create_ats_prompt(cv_text: str) -> str:
-  """
-  Creates the specialized prompt for the ATS Friendliness Checker.
-  This prompt instructs the AI to act like an ATS system.
-  """
-  return f"""
+# Instructs the AI to act like an ATS system; the CV follows the instructions as its own message.
+# Bump the version whenever the prompt changes so cached results are not reused across versions.
+ATS_PROMPT = register_sectioned_prompt(
+  "ats_check",
+  "3",
+  header="""
 # ROLE & GOAL
 You are an advanced Applicant Tracking System (ATS) parser simulator. Your goal is to analyze a CV's text for its machine-readability and keyword optimization. You must identify any elements that could cause parsing errors or lower the candidate's ranking in an automated screening process.
 
 # CONTEXT
-- CV_TEXT: ```{cv_text}```
+The CV text (CV_TEXT) follows in the next message.
 
 # DETAILED INSTRUCTIONS
 Analyze the CV text based on the following ATS compatibility criteria:
@@ -24,46 +32,137 @@ Analyze the CV text based on the following ATS compatibility criteria:
 3.  **Keywords & Skills**: Check if the skills section is clear and uses common industry keywords. Note if important skills are mentioned only in prose (harder to parse) instead of a dedicated skills list.
 4.  **Structure & Headings**: Assess if the CV uses standard, conventional headings (e.g., "Work Experience", "Education", "Skills"). Non-standard headings can confuse a parser.
 5.  **Action Verbs & Quantifiability**: Check if job descriptions start with strong action verbs and include quantifiable results (e.g., "Increased sales by 20%").
-
+""",
+  # Every criterion feeds the score, the summary and the issues alike
+  sections=[],
+  footer="""
 # MANDATORY OUTPUT FORMAT
 Generate a single JSON object that strictly follows the required schema. All keys MUST be in snake_case. Populate all fields, including a list of specific issues found. If no issues are found in a category, confirm that it passed the check.
 
 **HERE IS AN EXAMPLE of the required structure. Populate all fields with your analysis:**
-```json
-{{
-  "ats_check": {{
-    "ats_score": 85,
-    "summary": "The CV is well-structured and uses standard headings, but could be improved by quantifying achievements and ensuring contact information is complete.",
-    "issues": [
-      {{
-        "issue_type": "Parsing Risk",
-        "description": "The text mentions a 'portfolio link in the header'. If the original document used a graphical header or a text box, an ATS might not read it correctly.",
-        "suggestion": "Ensure all critical information, including links, is part of the main text body and not in headers, footers, or text boxes."
-      }},
-      {{
-        "issue_type": "Keywords",
-        "description": "Achievements under 'Software Engineer at Acme Corp' are descriptive but lack quantifiable metrics.",
-        "suggestion": "Revise bullet points to include numbers and metrics, for example, change 'Developed new features' to 'Developed 3 new features, improving user engagement by 15%'."
-      }}
-    ]
-  }}
-}}
-"""
-
-async def run_ats_check(request: ATSCheckRequest) -> ATSCheckResponse:
+""",
+  example={
+    "ats_check": {
+      "ats_score": 85,
+      "summary": "The CV is well-structured and uses standard headings, but could be improved by quantifying achievements and ensuring contact information is complete.",
+      "issues": [
+        {
+          "issue_type": "Parsing Risk",
+          "description": "The text mentions a 'portfolio link in the header'. If the original document used a graphical header or a text box, an ATS might not read it correctly.",
+          "suggestion": "Ensure all critical information, including links, is part of the main text body and not in headers, footers, or text boxes."
+        },
+        {
+          "issue_type": "Keywords",
+          "description": "Achievements under 'Software Engineer at Acme Corp' are descriptive but lack quantifiable metrics.",
+          "suggestion": "Revise bullet points to include numbers and metrics, for example, change 'Developed new features' to 'Developed 3 new features, improving user engagement by 15%'."
+        }
+      ]
+    }
+  },
+  wrapper="ats_check",
+)
+
+# Hybrid mode: contact info, structure and keywords were already checked
+# locally; the model only writes the summary and reviews formatting and
+# parsing risks. The CV and the rule-based findings follow as their own messages.
+ATS_HYBRID_PROMPT = register_prompt("ats_check_hybrid", "2", """
+# ROLE & GOAL
+You are an advanced Applicant Tracking System (ATS) parser simulator. A rule-based checker has already verified the CV's contact information, section headings, skills list, action verbs and quantified results. Your task is limited to the parts that need judgement.
+
+# CONTEXT
+The CV text (CV_TEXT) and the rule-based score and findings (RULE_BASED_FINDINGS) follow in separate messages.
+
+# DETAILED INSTRUCTIONS
+1.  **Parsing Risks & Formatting**: Identify elements that suggest complex formatting. Since you only see text, infer potential issues, e.g. text that looks like it came from a two-column layout, a table, text boxes, or images/icons. Only report issues of type 'Parsing Risk' or 'Formatting'. Do not repeat the rule-based findings.
+2.  **Summary**: Write a general 'summary' of the CV's ATS performance that takes both the rule-based findings and your own into account.
+
+# MANDATORY OUTPUT FORMAT
+Generate a single JSON object with the keys 'summary' and 'issues'. All keys MUST be in snake_case. If you find no parsing risks, return an empty 'issues' list.
+""")
+
+def _ats_hybrid_messages(cv_text: str, report: LocalATSReport) -> List[dict]:
+  findings = "\n".join(f"- [{issue.issue_type}] {issue.description}" for issue in report.issues) or "- No issues found."
+  return ATS_HYBRID_PROMPT.messages(cv_text=cv_text, rule_based_findings=f"Score: {report.ats_score}/100\n{findings}")
+
+async def run_ats_check(
+  request: ATSCheckRequest,
+  *,
+  preprocessed: bool = False,
+  raw_cv_text: Optional[str] = None,
+  layout: Optional[DocumentLayout] = None,
+) -> ATSCheckResponse:
   """
   Runs the ATS check by sending the request to the LLM and parsing the structured response.
+
+  In 'local' mode only the rule-based checks run; in 'hybrid' mode the LLM
+  adds the summary and parsing-risk review on top of the local findings.
+  Since the hybrid score is rule-based, a hybrid check for the score alone
+  does not reach the LLM either.
+  Pass `preprocessed` when the CV already went through prepare_text, with
+  the original text as `raw_cv_text` if available, and the `layout` of an
+  uploaded CV file to also check its parsing risks.
+
+  The rule-based checks always run on the whole CV: the token budget only
+  applies to the text sent to the LLM, and trimmed sections would otherwise
+  be reported as missing.
   """
-  prompt = _create_ats_prompt(request.cv_text)
+  if not preprocessed:
+    raw_cv_text = request.cv_text
+    request = request.model_copy(update={"cv_text": prepare_text(request.cv_text, "cv").text})
+  rules_text = raw_cv_text if raw_cv_text is not None else request.cv_text
+  sections = section_key(ATSResult, request.sections)
+  if request.mode == "local" or (request.mode == "hybrid" and sections == ("ats_score",)):
+    return select_sections(run_local_ats_check(rules_text, layout).to_response(), sections)
+  cache_key = _ats_cache_key(request, sections, layout, rules_text)
+  # Identical requests arriving while one is in flight share its upstream call
+  response = await inflight.do(cache_key, lambda: _run_ats_check(request, sections, cache_key, layout, rules_text))
+  if request.mode == "llm" and layout is not None:
+    # The model only sees text, so the layout's findings are added to its result
+    response = add_layout_findings(response, layout)
+  return select_sections(response, sections)
+
+def _ats_cache_key(
+  request: ATSCheckRequest, sections: Optional[Tuple[str, ...]], layout: Optional[DocumentLayout], rules_text: str,
+) -> str:
+  if request.mode == "llm":
+    namespace = "ats_check" if sections is None else "ats_check:" + ",".join(sections)
+    return make_key(namespace, settings.llm_model, ATS_PROMPT.version, request.cv_text)
+  # The hybrid prompt always asks for both summary and issues, so one entry serves every selection,
+  # but it includes the rule-based findings on the whole CV and the layout's findings
+  texts = [request.cv_text, rules_text] if rules_text != request.cv_text else [request.cv_text]
+  if layout is not None:
+    texts.append(layout.model_dump_json())
+  return make_key(f"ats_check:{request.mode}", settings.llm_model, ATS_HYBRID_PROMPT.version, *texts)
+
+async def _run_hybrid_ats_check(cv_text: str, rules_text: str, layout: Optional[DocumentLayout]) -> ATSCheckResponse:
+  report = run_local_ats_check(rules_text, layout)
+  with timed_phase("prompt"):
+    messages = _ats_hybrid_messages(cv_text, report)
+  prose = await create_completion("ats_check_hybrid", messages, ATSProseResult)
+  issues = report.issues + [ATSIssue.model_validate(issue.model_dump()) for issue in prose.issues]
+  return ATSCheckResponse(ats_check=ATSResult(ats_score=report.ats_score, summary=prose.summary, issues=issues))
+
+async def _run_ats_check(
+  request: ATSCheckRequest,
+  sections: Optional[Tuple[str, ...]],
+  cache_key: str,
+  layout: Optional[DocumentLayout],
+  rules_text: str,
+) -> ATSCheckResponse:
+  cached = await result_cache.get(cache_key, ATSCheckResponse)
+  if cached is not None:
+    return cached
 
   try:
-    response = await aclient.chat.completions.create(
-      model="gpt-4o-mini",
-      messages=[{"role": "user", "content": prompt}],
-      response_model=ATSCheckResponse,
-      max_retries=2,
-    )
-    return response
+    if request.mode == "hybrid":
+      response = await _run_hybrid_ats_check(request.cv_text, rules_text, layout)
+    else:
+      with timed_phase("prompt"):
+        messages = ATS_PROMPT.messages(sections, cv_text=request.cv_text)
+      output = await create_completion("ats_check", messages, llm_response_model(ATSCheckResponse, sections))
+      response = to_api_response(ATSCheckResponse, output)
+  except HTTPException:
+    raise
   except Exception as e:
     # Add structured logging here  <-- IMPORTANT
     print(f"An error occurred during ATS check: {e}")
@@ -71,3 +170,33 @@ async def run_ats_check(request: ATSCheckRequest) -> ATSCheckResponse:
       status_code=500,
       detail="Failed to get a valid ATS analysis from the AI model."
     )
+
+  await result_cache.set(cache_key, response)
+  return response
+
+async def stream_ats_check(request: ATSCheckRequest) -> AsyncIterator[Tuple[str, BaseModel]]:
+  """
+  Streams the ATS check as the model produces it: yields ("partial", snapshot)
+  pairs, then ("complete", ATSCheckResponse) once it is fully validated.
+  Local and hybrid checks are not streamed and arrive as one complete event.
+  """
+  if request.mode != "llm":
+    yield "complete", await run_ats_check(request)
+    return
+
+  request = request.model_copy(update={"cv_text": prepare_text(request.cv_text, "cv").text})
+  sections = section_key(ATSResult, request.sections)
+  cache_key = _ats_cache_key(request, sections, None, request.cv_text)
+  cached = await result_cache.get(cache_key, ATSCheckResponse)
+  if cached is not None:
+    yield "complete", cached
+    return
+
+  with timed_phase("prompt"):
+    messages = ATS_PROMPT.messages(sections, cv_text=request.cv_text)
+
+  async for event, item in stream_completion(
+    "ats_check", messages, llm_response_model(ATSCheckResponse, sections), ATSCheckResponse,
+    cache_key, "Failed to get a valid ATS analysis from the AI model."
+  ):
+    yield event, item
@@ -0,0 +1,208 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from ..schemas import ATSCheckResponse, ATSIssue, DocumentLayout
+from .preprocess import heading_name, normalize_text, split_sections
+from .prescorer import extract_skills
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE_RE = re.compile(r"\+?\(?\d[\d\s().-]{7,}\d")
+_YEAR_RANGE_RE = re.compile(r"^(19|20)\d{2}\s*[-–/]\s*(19|20)\d{2}$")
+_LINKEDIN_RE = re.compile(r"linkedin\.com/in/[\w%-]+", re.IGNORECASE)
+_QUANTIFIED_RE = re.compile(r"\d+(?:[.,]\d+)?\s*(?:%|percent|x\b|k\b|m\b|\+)|[$€£]\s?\d|\b\d{2,}\b(?!\s*[-–]\s*(?:19|20)\d{2})")
+_HEADING_LIKE_RE = re.compile(r"^(?:[A-Z][A-Z &/]{2,40}|[A-Za-z][A-Za-z &/']{2,40}:)$")
+
+_ACTION_VERBS = frozenset("""
+accelerated achieved adapted administered analyzed architected automated built championed coached collaborated
+completed configured consolidated coordinated created cut decreased defined delivered deployed designed developed
+directed drove eliminated enabled engineered established evaluated executed expanded facilitated founded generated
+grew guided headed implemented improved increased initiated integrated introduced launched led maintained managed
+mentored migrated modernized monitored negotiated optimized orchestrated organized overhauled owned partnered piloted
+planned produced programmed published reduced refactored reengineered resolved restructured revamped saved scaled
+secured shipped simplified spearheaded standardized streamlined supervised trained transformed troubleshot upgraded
+wrote
+""".split())
+
+# Points deducted from 100 per finding
+_PENALTIES = {
+    "missing_email": 15,
+    "missing_phone": 10,
+    "missing_linkedin": 5,
+    "contact_not_at_top": 5,
+    "missing_experience_heading": 15,
+    "missing_education_heading": 5,
+    "missing_skills_section": 10,
+    "nonstandard_headings": 5,
+    "skills_only_in_prose": 5,
+    "weak_action_verbs": 10,
+    "few_quantified_results": 10,
+    "multi_column_layout": 10,
+    "layout_tables": 10,
+    "text_boxes": 5,
+    "header_footer_text": 5,
+    "images": 5,
+}
+
+_CONTACT_LINES = 10
+
+
+@dataclass
+class LocalATSReport:
+    """
+    Deterministic findings for one CV: the issues, the score and the raw signals.
+    """
+    ats_score: int
+    issues: List[ATSIssue] = field(default_factory=list)
+    findings: List[str] = field(default_factory=list)
+    layout_checked: bool = False
+
+    def to_response(self) -> ATSCheckResponse:
+        """Builds a full ATSCheckResponse with a generated summary."""
+        if self.issues:
+            categories = sorted({issue.issue_type for issue in self.issues})
+            summary = f"Rule-based ATS check found {len(self.issues)} issue(s) in: {', '.join(categories)}."
+            if not self.layout_checked:
+                summary += " Parsing risks from the original layout (columns, tables, images) cannot be judged from text alone."
+        else:
+            summary = "Rule-based ATS check found no issues with contact info, structure or keywords."
+        return ATSCheckResponse.model_validate({
+            "ats_check": {"ats_score": self.ats_score, "summary": summary, "issues": [i.model_dump() for i in self.issues]}
+        })
+
+
+def _has_phone(text: str) -> bool:
+    for match in _PHONE_RE.finditer(text):
+        candidate = match.group(0).strip()
+        if sum(c.isdigit() for c in candidate) >= 9 and not _YEAR_RANGE_RE.match(candidate):
+            return True
+    return False
+
+def _first_word(line: str) -> str:
+    words = line.lstrip("- ").split()
+    return words[0].lower().strip(",.;:") if words else ""
+
+def layout_findings(layout: DocumentLayout) -> List[Tuple[str, ATSIssue]]:
+    """
+    Parsing risks in the layout of an uploaded CV file, as (finding, issue) pairs.
+    """
+    findings = []
+
+    def add(finding: str, description: str, suggestion: str) -> None:
+        findings.append((finding, ATSIssue(issue_type="Parsing Risk", description=description, suggestion=suggestion)))
+
+    if layout.columns > 1:
+        add("multi_column_layout", f"The document uses a {layout.columns}-column layout; parsers often read across columns and mix up sections.",
+            "Use a single-column layout so the text is read in order.")
+    if layout.tables:
+        add("layout_tables", f"The document contains {layout.tables} table(s); parsers may skip table cells or merge them into one line.",
+            "Replace tables with plain headings and bullet points.")
+    if layout.text_boxes:
+        add("text_boxes", f"{layout.text_boxes} text box(es) hold part of the content; many parsers ignore text boxes.",
+            "Move the text out of text boxes into the main body.")
+    if layout.header_footer_text:
+        add("header_footer_text", "Some text sits in the page header or footer, which many parsers do not read.",
+            "Put your name and contact details in the body of the first page.")
+    if layout.images:
+        add("images", f"The document contains {layout.images} image(s); photos, icons and logos carry no text a parser can read.",
+            "Remove icons and photos, and write out anything they convey, such as skill levels or contact types.")
+    return findings
+
+def add_layout_findings(response: ATSCheckResponse, layout: DocumentLayout) -> ATSCheckResponse:
+    """
+    Adds the layout's parsing risks to a model-written ATS check and deducts
+    their penalties from its score. Sections left out of the check stay null.
+    """
+    findings = layout_findings(layout)
+    result = response.ats_check
+    update = {}
+    if result.ats_score is not None:
+        update["ats_score"] = max(0, result.ats_score - sum(_PENALTIES[finding] for finding, _ in findings))
+    if result.issues is not None:
+        update["issues"] = result.issues + [issue for _, issue in findings]
+    return response.model_copy(update={"ats_check": result.model_copy(update=update)})
+
+def run_local_ats_check(cv_text: str, layout: Optional[DocumentLayout] = None) -> LocalATSReport:
+    """
+    Checks contact info, structure and keywords with precompiled rules and
+    returns the issues together with a deterministic ATS score. With the
+    `layout` of an uploaded file, its parsing risks are checked too.
+    """
+    lines = normalize_text(cv_text)
+    sections = split_sections(lines, "cv")
+    names = {section.name for section in sections}
+    text = "\n".join(lines)
+    top = "\n".join(lines[:_CONTACT_LINES])
+    issues: List[ATSIssue] = []
+    findings: List[str] = []
+
+    def add(finding: str, issue_type: str, description: str, suggestion: str) -> None:
+        findings.append(finding)
+        issues.append(ATSIssue(issue_type=issue_type, description=description, suggestion=suggestion))
+
+    # --- Contact info ---
+    has_email, has_phone, has_linkedin = bool(_EMAIL_RE.search(text)), _has_phone(text), bool(_LINKEDIN_RE.search(text))
+    if not has_email:
+        add("missing_email", "Contact Info", "No email address was found in the CV.",
+            "Add a professional email address in plain text at the top of the CV.")
+    if not has_phone:
+        add("missing_phone", "Contact Info", "No phone number was found in the CV.",
+            "Add a phone number with country code, e.g. '+1 555 123 4567', next to your email.")
+    if not has_linkedin:
+        add("missing_linkedin", "Contact Info", "No LinkedIn profile URL was found in the CV.",
+            "Add your LinkedIn URL in the form 'linkedin.com/in/your-name'.")
+    if (has_email and not _EMAIL_RE.search(top)) or (has_phone and not _has_phone(top)):
+        add("contact_not_at_top", "Contact Info", "Contact details are not in the first lines of the CV, where parsers look for them.",
+            "Move your email and phone number directly below your name.")
+
+    # --- Structure ---
+    if "experience" not in names:
+        add("missing_experience_heading", "Structure", "No standard work experience heading was found.",
+            "Use a conventional heading such as 'Work Experience' or 'Professional Experience'.")
+    if "education" not in names:
+        add("missing_education_heading", "Structure", "No standard education heading was found.",
+            "Add an 'Education' section with a conventional heading.")
+    unrecognized = [line for line in lines if _HEADING_LIKE_RE.match(line) and heading_name(line, "cv") is None]
+    if len(names - {"header"}) < 3 and unrecognized:
+        add("nonstandard_headings", "Structure",
+            f"The CV appears to use non-standard headings such as '{unrecognized[0]}', which parsers may not map to known sections.",
+            "Rename sections to standard headings: 'Summary', 'Work Experience', 'Skills', 'Education'.")
+
+    # --- Keywords ---
+    skills = extract_skills(text)
+    skills_section = next((section for section in sections if section.name == "skills"), None)
+    if skills_section is None:
+        add("missing_skills_section", "Keywords", "There is no dedicated skills section; skills are harder for an ATS to extract.",
+            "Add a 'Skills' section listing your key technologies as comma-separated keywords.")
+    else:
+        listed = extract_skills(skills_section.text())
+        prose_only = [skill for skill in skills if skill not in listed]
+        if len(prose_only) >= 3:
+            add("skills_only_in_prose", "Keywords",
+                f"Skills such as {', '.join(prose_only[:5])} appear only in descriptions, not in the skills list.",
+                "Repeat the key technologies you used in your 'Skills' section so they are matched as keywords.")
+
+    experience = [section for section in sections if section.name == "experience"]
+    statements = [line for section in experience for line in section.lines[1:] if line.startswith("- ")]
+    if not statements:
+        statements = [line for section in experience for line in section.lines[1:] if len(line) > 40]
+    if statements:
+        with_verbs = sum(_first_word(line) in _ACTION_VERBS for line in statements)
+        if with_verbs / len(statements) < 0.5:
+            add("weak_action_verbs", "Keywords",
+                f"Only {with_verbs} of {len(statements)} experience bullets start with a strong action verb.",
+                "Start each bullet with a verb such as 'Led', 'Built', 'Reduced' or 'Automated'.")
+        quantified = sum(bool(_QUANTIFIED_RE.search(line)) for line in statements)
+        if quantified / len(statements) < 0.3:
+            add("few_quantified_results", "Keywords",
+                f"Only {quantified} of {len(statements)} experience bullets include a measurable result.",
+                "Add numbers to your achievements, e.g. 'Reduced build time by 40%' or 'Served 2M daily users'.")
+
+    # --- Parsing risks ---
+    if layout is not None:
+        for finding, issue in layout_findings(layout):
+            findings.append(finding)
+            issues.append(issue)
+
+    score = max(0, 100 - sum(_PENALTIES[finding] for finding in findings))
+    return LocalATSReport(ats_score=score, issues=issues, findings=findings, layout_checked=layout is not None)
@@ -0,0 +1,73 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Sequence
+
+from fastapi import HTTPException
+
+from ..core.config import settings
+from ..schemas import AnalysisRequest, BatchAnalysisItem, BatchAnalysisRequest, BatchItemError
+from .analyzer import run_analysis
+from .prescorer import build_fast_analysis, prescore
+from .preprocess import prepare_text
+
+# Pairs scored per worker-thread call in fast mode; lines stream out between chunks
+_FAST_CHUNK_SIZE = 500
+
+def _fast_lines(items: Sequence[AnalysisRequest], offset: int) -> List[str]:
+    """
+    Scores a chunk of pairs in one vectorized pass and renders their NDJSON
+    lines. The texts are preprocessed as in /analyze, so a pair scores the
+    same there and in a batch.
+    """
+    jd_texts: Dict[str, str] = {}
+    pairs = []
+    for item in items:
+        # Usually one JD for the whole batch; prepare it once
+        if item.jd_text not in jd_texts:
+            jd_texts[item.jd_text] = prepare_text(item.jd_text, "jd").text
+        pairs.append((prepare_text(item.cv_text, "cv").text, jd_texts[item.jd_text]))
+    scores = prescore(pairs)
+    return [
+        BatchAnalysisItem(
+            index=offset + position, analysis=build_fast_analysis(cv_text, jd_text, score).analysis,
+        ).model_dump_json(exclude={"error"}) + "\n"
+        for position, ((cv_text, jd_text), score) in enumerate(zip(pairs, scores))
+    ]
+
+async def run_batch_analysis(request: BatchAnalysisRequest) -> AsyncIterator[str]:
+    """
+    Fans the batch out to run_analysis with bounded concurrency and yields one
+    NDJSON line per item as soon as it finishes. Items fail independently: an
+    error is reported on its own line instead of aborting the batch.
+    """
+    items = request.items()
+    if request.mode == "fast":
+        # Scoring is CPU-bound; run it off the event loop, a chunk at a time
+        for offset in range(0, len(items), _FAST_CHUNK_SIZE):
+            for line in await asyncio.to_thread(_fast_lines, items[offset:offset + _FAST_CHUNK_SIZE], offset):
+                yield line
+        return
+
+    limit = min(request.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run_item(index: int, item: AnalysisRequest) -> BatchAnalysisItem:
+        async with semaphore:
+            try:
+                result = await run_analysis(item)
+                return BatchAnalysisItem(index=index, analysis=result.analysis)
+            except HTTPException as e:
+                return BatchAnalysisItem(index=index, error=BatchItemError(status_code=e.status_code, detail=str(e.detail)))
+            except Exception as e:
+                print(f"An error occurred during batch item {index}: {e}")
+                return BatchAnalysisItem(index=index, error=BatchItemError(status_code=500, detail="An unexpected internal error occurred."))
+
+    tasks = [asyncio.create_task(_run_item(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            unset = {"analysis"} if item.error is not None else {"error"}
+            yield item.model_dump_json(exclude=unset) + "\n"
+    finally:
+        # The client may disconnect mid-stream; do not keep spending on its batch
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from ..core.config import settings
+from .metrics import registry, render_samples
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# How often a process deletes expired rows from the SQLite tier
+_PURGE_INTERVAL_SECONDS = 300.0
+
+def _normalize(text: str) -> str:
+    """
+    Normalizes input text so that cosmetic differences (unicode forms,
+    whitespace, line endings) map to the same cache key.
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+def make_key(namespace: str, model: str, prompt_version: str, *texts: str) -> str:
+    """
+    Builds a content-addressed cache key from the normalized input texts,
+    the model name and the prompt version.
+    """
+    material = json.dumps([namespace, model, prompt_version, *(_normalize(t) for t in texts)])
+    return f"{namespace}:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+
+class _MemoryTier:
+    """
+    In-process LRU tier with a maximum size and a per-entry TTL.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def set(self, key: str, payload: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _SQLiteTier:
+    """
+    Persistent tier backed by a SQLite file, shared by all worker processes.
+    """
+    def __init__(self, path: str, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS result_cache_by_expiry ON result_cache (expires_at)")
+        self._conn.commit()
+        self._next_purge = 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM result_cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, payload: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, payload, expires_at) VALUES (?, ?, ?)",
+                (key, payload, now + self.ttl_seconds),
+            )
+            # Expired rows are already invisible to get(); delete them in bulk now and then
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + _PURGE_INTERVAL_SECONDS
+                self._conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM result_cache WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+
+
+class ResultCache:
+    """
+    Two-tier cache for validated LLM responses: an in-process LRU in front of
+    a SQLite file. Values are stored as the response model's JSON.
+    """
+    def __init__(self):
+        self.enabled = settings.cache_enabled
+        self._memory = _MemoryTier(settings.cache_memory_max_entries, settings.cache_memory_ttl_seconds)
+        self._sqlite: Optional[_SQLiteTier] = None
+        if self.enabled and settings.cache_db_path:
+            self._sqlite = _SQLiteTier(settings.cache_db_path, settings.cache_db_ttl_seconds)
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, response_model: Type[ModelT]) -> Optional[ModelT]:
+        """
+        Returns the cached response for `key`, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        payload = self._memory.get(key)
+        if payload is not None:
+            self.memory_hits += 1
+            return response_model.model_validate_json(payload)
+        if self._sqlite is not None:
+            payload = await asyncio.to_thread(self._sqlite.get, key)
+            if payload is not None:
+                self.sqlite_hits += 1
+                self._memory.set(key, payload)
+                return response_model.model_validate_json(payload)
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: BaseModel) -> None:
+        """
+        Stores a validated response in both tiers.
+        """
+        if not self.enabled:
+            return
+        payload = value.model_dump_json()
+        self._memory.set(key, payload)
+        if self._sqlite is not None:
+            try:
+                await asyncio.to_thread(self._sqlite.set, key, payload)
+            except sqlite3.Error as e:
+                # A failed write only costs a future miss, never the request
+                print(f"An error occurred while writing to the result cache: {e}")
+
+    async def stats(self) -> dict:
+        """
+        Hit/miss counters for this worker process, used to size the cache.
+        """
+        sqlite_entries = await asyncio.to_thread(self._sqlite.count) if self._sqlite is not None else 0
+        hits = self.memory_hits + self.sqlite_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self._memory.max_entries,
+            "memory_evictions": self._memory.evictions,
+            "sqlite_entries": sqlite_entries,
+        }
+
+result_cache = ResultCache()
+
+def _collect_cache_metrics():
+    """Exports the cache counters on /metrics."""
+    yield from render_samples("resumealign_cache_hits_total", "counter", "Result cache hits, by tier.", [
+        ({"tier": "memory"}, result_cache.memory_hits), ({"tier": "sqlite"}, result_cache.sqlite_hits)])
+    yield from render_samples("resumealign_cache_misses_total", "counter", "Result cache misses.", [({}, result_cache.misses)])
+    yield from render_samples("resumealign_cache_memory_entries", "gauge", "Entries in the in-process cache tier.", [({}, len(result_cache._memory))])
+
+registry.register_collector(_collect_cache_metrics)
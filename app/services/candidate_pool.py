@@ -0,0 +1,367 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from ..core.config import settings
+from ..schemas import AnalysisRequest, BatchItemError, RankedCandidate, RankRequest, RankResponse
+from .analyzer import run_analysis
+from .preprocess import prepare_text
+from .prescorer import idf_weights, term_weights
+
+_CURRENT_FILE = "CURRENT"
+# Replaced segments are kept this long, as other processes may still be loading or using them
+_SEGMENT_GRACE_SECONDS = 3600.0
+
+class CandidatePool:
+    """
+    A persistent pool of CVs with an inverted skill/keyword index.
+
+    CV texts and their extracted terms live in SQLite. The index has two parts:
+    an immutable segment on disk (term postings as .npy arrays, memory-mapped
+    on load) and an in-memory delta for CVs added since the segment was built.
+    When the delta grows past `pool_compact_threshold` the segment is rebuilt
+    from SQLite and swapped in atomically. Removed CVs are masked out until then.
+
+    Every uvicorn worker keeps its own index over the shared SQLite pool. A
+    generation counter in SQLite is bumped on each change, and a worker
+    reloads its index before ranking when another process changed the pool.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._db = sqlite3.connect(os.path.join(directory, "candidates.sqlite3"), timeout=5.0, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS candidates ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT NOT NULL UNIQUE,"
+            " cv_text TEXT NOT NULL,"
+            " terms TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS pool_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO pool_meta (key, value) VALUES ('generation', 0)")
+        self._db.commit()
+        self._generation = -1
+        self._stale = True
+        self._load()
+
+    # --- Index state ---
+
+    def _load(self) -> None:
+        """
+        Memory-maps the current segment and rebuilds the delta from SQLite.
+        """
+        vocabulary: Dict[str, int] = {}
+        indptr = np.zeros(1, dtype=np.int64)
+        postings = np.zeros(0, dtype=np.int32)
+        row_seqs = np.zeros(0, dtype=np.int64)
+        max_seq = 0
+        segment = self._current_segment()
+        if segment is not None:
+            path = os.path.join(self.directory, segment)
+            with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+                vocabulary = json.load(f)
+            indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+            postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+            row_seqs = np.load(os.path.join(path, "row_seqs.npy"), mmap_mode="r")
+            max_seq = int(row_seqs[-1]) if len(row_seqs) else 0
+
+        with self._lock:
+            # Read first: a change made while loading then triggers another reload
+            self._generation = self._read_generation()
+            self._stale = False
+            live_seqs = np.fromiter((row[0] for row in self._db.execute("SELECT seq FROM candidates")), dtype=np.int64)
+            self._vocabulary = vocabulary
+            self._indptr = indptr
+            self._postings = postings
+            self._row_seqs = row_seqs
+            self._segment_max_seq = max_seq
+            self._dead_segment = np.isin(row_seqs, live_seqs, invert=True)
+            self._delta_postings: Dict[str, List[int]] = {}
+            self._delta_seqs: List[int] = []
+            self._dead_delta: set = set()
+            self._seq_to_row: Dict[int, int] = {
+                int(seq): row for row, seq in enumerate(row_seqs) if not self._dead_segment[row]
+            }
+            for seq, terms in self._db.execute("SELECT seq, terms FROM candidates WHERE seq > ? ORDER BY seq", (max_seq,)):
+                self._index_delta(seq, json.loads(terms))
+
+    def _read_generation(self) -> int:
+        return self._db.execute("SELECT value FROM pool_meta WHERE key = 'generation'").fetchone()[0]
+
+    @contextmanager
+    def _write(self, changed: bool = False) -> Iterator[None]:
+        """
+        A write transaction that bumps the generation if it changed anything.
+        If another process changed the pool since this index was loaded, the
+        index is marked stale so the next query reloads it.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                changes = self._db.total_changes
+                yield
+                if changed or self._db.total_changes != changes:
+                    previous = self._read_generation()
+                    self._db.execute("UPDATE pool_meta SET value = ? WHERE key = 'generation'", (previous + 1,))
+                    self._stale = self._stale or previous != self._generation
+                    self._generation = previous + 1
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                # The in-memory index may already hold the rolled-back change
+                self._stale = True
+                raise
+
+    def _refresh(self) -> None:
+        """Reloads the index if another process changed the pool since it was loaded."""
+        with self._lock:
+            if not self._stale and self._read_generation() == self._generation:
+                return
+        self._load()
+
+    def _current_segment(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, _CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _index_delta(self, seq: int, terms: List[str]) -> None:
+        row = len(self._row_seqs) + len(self._delta_seqs)
+        self._delta_seqs.append(seq)
+        self._seq_to_row[seq] = row
+        for term in terms:
+            self._delta_postings.setdefault(term, []).append(row)
+
+    def _dead_mask(self) -> np.ndarray:
+        dead_delta = np.zeros(len(self._delta_seqs), dtype=bool)
+        if self._dead_delta:
+            dead_delta[[row - len(self._row_seqs) for row in self._dead_delta]] = True
+        return np.concatenate([self._dead_segment, dead_delta])
+
+    def _mark_dead(self, seq: int) -> None:
+        row = self._seq_to_row.pop(seq, None)
+        if row is None:
+            return
+        if row < len(self._row_seqs):
+            self._dead_segment[row] = True
+        else:
+            self._dead_delta.add(row)
+
+    # --- Mutations ---
+
+    def _add(self, candidate_id: str, cv_text: str) -> None:
+        # Terms come from the preprocessed text, as in the /analyze pre-score
+        terms = sorted(term_weights(prepare_text(cv_text, "cv").text))
+        with self._write():
+            previous = self._db.execute("SELECT seq FROM candidates WHERE id = ?", (candidate_id,)).fetchone()
+            if previous is not None:
+                self._db.execute("DELETE FROM candidates WHERE seq = ?", (previous[0],))
+                self._mark_dead(previous[0])
+            cursor = self._db.execute(
+                "INSERT INTO candidates (id, cv_text, terms) VALUES (?, ?, ?)",
+                (candidate_id, cv_text, json.dumps(terms)),
+            )
+            self._index_delta(cursor.lastrowid, terms)
+
+    def _remove(self, candidate_id: str) -> bool:
+        with self._write():
+            row = self._db.execute("SELECT seq FROM candidates WHERE id = ?", (candidate_id,)).fetchone()
+            if row is None:
+                return False
+            self._db.execute("DELETE FROM candidates WHERE seq = ?", (row[0],))
+            self._mark_dead(row[0])
+            return True
+
+    def _compact(self) -> None:
+        """
+        Rebuilds the on-disk segment from every live CV and swaps it in.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT seq, terms FROM candidates ORDER BY seq").fetchall()
+        vocabulary: Dict[str, int] = {}
+        term_columns: List[int] = []
+        term_rows: List[int] = []
+        for row, (_, terms) in enumerate(rows):
+            for term in json.loads(terms):
+                term_columns.append(vocabulary.setdefault(term, len(vocabulary)))
+                term_rows.append(row)
+        columns = np.asarray(term_columns, dtype=np.int64)
+        order = np.argsort(columns, kind="stable")
+        postings = np.asarray(term_rows, dtype=np.int32)[order]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(columns, minlength=len(vocabulary)))]).astype(np.int64)
+        row_seqs = np.asarray([seq for seq, _ in rows], dtype=np.int64)
+
+        segment = f"segment-{int(row_seqs[-1]) if len(row_seqs) else 0}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, segment)
+        os.makedirs(path)
+        np.save(os.path.join(path, "indptr.npy"), indptr)
+        np.save(os.path.join(path, "postings.npy"), postings)
+        np.save(os.path.join(path, "row_seqs.npy"), row_seqs)
+        with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f)
+
+        previous = self._current_segment()
+        pointer = os.path.join(self.directory, _CURRENT_FILE)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(segment)
+        os.replace(pointer + ".tmp", pointer)
+        if previous is not None and os.path.isdir(os.path.join(self.directory, previous)):
+            # Start its grace period now, when it stops being current
+            os.utime(os.path.join(self.directory, previous))
+        with self._write(changed=True):
+            pass
+        self._load()
+        self._remove_old_segments(segment)
+
+    def _remove_old_segments(self, current: str) -> None:
+        """Deletes replaced segments once no process can still be reading them."""
+        cutoff = time.time() - _SEGMENT_GRACE_SECONDS
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("segment-") and name != current and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    # --- Queries ---
+
+    def _rank(self, jd_text: str, top_k: int) -> List[Tuple[int, float]]:
+        """
+        Scores the JD against every live CV with one sparse dot product and
+        returns the (seq, score) of the best `top_k`, highest score first.
+        """
+        # The pool's own document frequencies replace the reference ones
+        query = term_weights(prepare_text(jd_text, "jd").text, reference_idf=False)
+        self._refresh()
+        with self._lock:
+            segment_rows = len(self._row_seqs)
+            n_rows = segment_rows + len(self._delta_seqs)
+            dead = self._dead_mask()
+            live_count = n_rows - int(dead.sum())
+            if live_count == 0 or not query:
+                return []
+            doc_chunks, weight_chunks, total = [], [], 0.0
+            for term, weight in query.items():
+                parts = []
+                column = self._vocabulary.get(term)
+                if column is not None:
+                    parts.append(np.asarray(self._postings[self._indptr[column]:self._indptr[column + 1]], dtype=np.int64))
+                if term in self._delta_postings:
+                    parts.append(np.asarray(self._delta_postings[term], dtype=np.int64))
+                docs = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+                document_frequency = int((~dead[docs]).sum())
+                term_weight = weight * float(idf_weights(np.float64(document_frequency), live_count))
+                total += term_weight
+                doc_chunks.append(docs)
+                weight_chunks.append(np.full(len(docs), term_weight))
+            seqs = np.concatenate([self._row_seqs, np.asarray(self._delta_seqs, dtype=np.int64)])
+
+        scores = np.bincount(np.concatenate(doc_chunks), weights=np.concatenate(weight_chunks), minlength=n_rows) / total
+        scores[dead] = -1.0
+        k = min(top_k, live_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(seqs[row]), float(scores[row])) for row in top]
+
+    def _fetch(self, seqs: List[int]) -> Dict[int, Tuple[str, str]]:
+        with self._lock:
+            placeholders = ",".join("?" * len(seqs))
+            rows = self._db.execute(f"SELECT seq, id, cv_text FROM candidates WHERE seq IN ({placeholders})", seqs).fetchall()
+        return {seq: (candidate_id, cv_text) for seq, candidate_id, cv_text in rows}
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._seq_to_row)
+
+    # --- Async API used by the endpoints ---
+
+    async def add(self, cv_text: str, candidate_id: Optional[str] = None) -> str:
+        """
+        Adds (or replaces) a CV in the pool and returns its id.
+        """
+        candidate_id = candidate_id or uuid.uuid4().hex
+        await asyncio.to_thread(self._add, candidate_id, cv_text)
+        if len(self._delta_seqs) >= settings.pool_compact_threshold and not self._compacting:
+            self._compacting = True
+            try:
+                await asyncio.to_thread(self._compact)
+            finally:
+                self._compacting = False
+        return candidate_id
+
+    async def remove(self, candidate_id: str) -> bool:
+        """
+        Removes a CV from the pool. Returns False if the id is unknown.
+        """
+        return await asyncio.to_thread(self._remove, candidate_id)
+
+    async def rank(self, jd_text: str, top_k: int) -> List[Tuple[str, str, float]]:
+        """
+        Returns (candidate_id, cv_text, score) for the `top_k` best CVs for the JD.
+        """
+        ranked = await asyncio.to_thread(self._rank, jd_text, top_k)
+        if not ranked:
+            return []
+        stored = await asyncio.to_thread(self._fetch, [seq for seq, _ in ranked])
+        return [(*stored[seq], score) for seq, score in ranked if seq in stored]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+_pool: Optional[CandidatePool] = None
+
+def get_pool() -> CandidatePool:
+    """
+    Returns the process-wide candidate pool, loading it on first use.
+    """
+    global _pool
+    if _pool is None:
+        _pool = CandidatePool(settings.pool_dir)
+    return _pool
+
+def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+async def run_rank(request: RankRequest) -> RankResponse:
+    """
+    Retrieves the top-k CVs for a JD from the pool and, if requested, runs the
+    full LLM analysis on just those k, so LLM cost scales with k rather than
+    with the pool size.
+    """
+    pool = get_pool()
+    ranked = await pool.rank(request.jd_text, min(request.top_k, settings.rank_max_top_k))
+    results = [RankedCandidate(candidate_id=candidate_id, score=round(score, 4)) for candidate_id, _, score in ranked]
+
+    if request.analyze and ranked:
+        semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+
+        async def _analyze(result: RankedCandidate, cv_text: str) -> None:
+            async with semaphore:
+                try:
+                    response = await run_analysis(AnalysisRequest(cv_text=cv_text, jd_text=request.jd_text))
+                    result.analysis = response.analysis
+                except HTTPException as e:
+                    result.error = BatchItemError(status_code=e.status_code, detail=str(e.detail))
+                except Exception as e:
+                    print(f"An error occurred while analyzing candidate {result.candidate_id}: {e}")
+                    result.error = BatchItemError(status_code=500, detail="An unexpected internal error occurred.")
+
+        await asyncio.gather(*(_analyze(result, cv_text) for result, (_, cv_text, _) in zip(results, ranked)))
+
+    return RankResponse(pool_size=pool.size(), results=results)
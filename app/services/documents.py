@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..schemas import AnalysisResponse, AnalysisResult
+from .metrics import Counter, registry
+from .preprocess import normalize_text, split_sections
+
+# How often a process deletes expired documents
+_PURGE_INTERVAL_SECONDS = 300.0
+
+INCREMENTAL_ANALYSES = registry.register(Counter(
+    "resumealign_incremental_analyses_total",
+    "Analyses of a tracked document, by how much of the previous analysis was reused.",
+    ("outcome",),
+))
+
+# CV section -> the parts of the analysis that draw on it. match_score and
+# the executive summary, which restates it, are always re-evaluated, and so
+# is the learning path whenever the skill gaps it is derived from are.
+# Sections not listed here affect every part. That
+# includes 'header': in a CV without recognized headings it is the whole
+# text, and skills are often listed above the first heading.
+_SECTION_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "summary": (),
+    "experience": ("strengths", "skill_gaps", "learning_potential"),
+    "projects": ("strengths", "skill_gaps", "learning_potential"),
+    "skills": ("strengths", "skill_gaps", "learning_path"),
+    "certifications": ("skill_gaps", "learning_path"),
+    "education": ("skill_gaps", "learning_path"),
+    "languages": ("strengths",),
+}
+
+def section_fingerprints(cv_text: str) -> Dict[str, str]:
+    """Hashes of the CV's sections by name; repeated headings are hashed together."""
+    texts: Dict[str, list] = {}
+    for section in split_sections(normalize_text(cv_text), "cv"):
+        texts.setdefault(section.name, []).append(section.text())
+    return {name: hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest() for name, parts in texts.items()}
+
+def affected_sections(previous: Dict[str, str], current: Dict[str, str]) -> Tuple[str, ...]:
+    """
+    The parts of the analysis to re-evaluate after the CV changed from
+    `previous` to `current` fingerprints, in field order. Empty if the CV
+    did not change.
+    """
+    changed = {name for name in previous.keys() | current.keys() if previous.get(name) != current.get(name)}
+    if not changed:
+        return ()
+    fields = {"match_score", "executive_summary"}
+    for name in changed:
+        fields.update(_SECTION_FIELDS.get(name, AnalysisResult.model_fields))
+    if "skill_gaps" in fields:
+        fields.add("learning_path")
+    return tuple(name for name in AnalysisResult.model_fields if name in fields)
+
+
+@dataclass
+class DocumentState:
+    """The last full analysis of a document and what it was computed from."""
+    basis: str
+    fingerprints: Dict[str, str]
+    analysis: AnalysisResponse
+
+
+class DocumentStore:
+    """
+    The last analysis per document id, in SQLite so that every worker
+    process sees the latest version. Concurrent re-analyses of the same
+    document are not serialized; the last one to finish is kept.
+    """
+    def __init__(self, path: str, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id TEXT PRIMARY KEY,"
+            " basis TEXT NOT NULL,"
+            " fingerprints TEXT NOT NULL,"
+            " analysis TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_by_update ON documents (updated_at)")
+        self._conn.commit()
+        self._next_purge = 0.0
+
+    def _get(self, document_id: str) -> Optional[Tuple[str, str, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT basis, fingerprints, analysis FROM documents WHERE id = ? AND updated_at >= ?",
+                (document_id, time.time() - self.ttl_seconds),
+            ).fetchone()
+
+    def _set(self, document_id: str, basis: str, fingerprints: str, analysis: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (id, basis, fingerprints, analysis, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (document_id, basis, fingerprints, analysis, now),
+            )
+            # Expired documents are already invisible to _get(); delete them in bulk now and then
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + _PURGE_INTERVAL_SECONDS
+                self._conn.execute("DELETE FROM documents WHERE updated_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    async def get(self, document_id: str) -> Optional[DocumentState]:
+        row = await asyncio.to_thread(self._get, document_id)
+        if row is None:
+            return None
+        basis, fingerprints, analysis = row
+        return DocumentState(basis, json.loads(fingerprints), AnalysisResponse.model_validate_json(analysis))
+
+    async def set(self, document_id: str, state: DocumentState) -> None:
+        try:
+            await asyncio.to_thread(
+                self._set, document_id, state.basis, json.dumps(state.fingerprints), state.analysis.model_dump_json(),
+            )
+        except sqlite3.Error as e:
+            # A failed write only costs a full analysis next time, never the request
+            print(f"An error occurred while saving the document analysis: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_store: Optional[DocumentStore] = None
+
+def get_document_store() -> DocumentStore:
+    """
+    Returns the process-wide document store, opening it on first use.
+    """
+    global _store
+    if _store is None:
+        _store = DocumentStore(settings.documents_db_path, settings.documents_ttl_seconds)
+    return _store
+
+def close_document_store() -> None:
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
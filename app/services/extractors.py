@@ -0,0 +1,146 @@
+import io
+import re
+import zipfile
+import zlib
+from typing import Any, Dict, List, Tuple
+from xml.etree import ElementTree
+
+# Runs in the ingestion pool's worker processes, so only the standard library
+# (and pypdf for PDFs) is imported here to keep the workers light.
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_BLIP = "{http://schemas.openxmlformats.org/drawingml/2006/main}blip"
+_HEADER_FOOTER_RE = re.compile(r"^word/(header|footer)\d*\.xml$")
+
+# Refuse archives that inflate a part beyond this, to stop zip bombs
+_MAX_XML_BYTES = 50 * 1024 * 1024
+# A line of a layout-preserving PDF extraction that holds two columns of text
+_COLUMN_GAP_RE = re.compile(r"\S.{14,}?\S {6,}\S.{14,}")
+
+def _layout(file_type: str, **signals: Any) -> Dict[str, Any]:
+    layout = {"file_type": file_type, "pages": None, "columns": 1, "tables": 0, "text_boxes": 0, "images": 0,
+              "header_footer_text": False}
+    layout.update(signals)
+    return layout
+
+def _read_xml(archive: zipfile.ZipFile, name: str) -> ElementTree.Element:
+    if archive.getinfo(name).file_size > _MAX_XML_BYTES:
+        raise ValueError(f"'{name}' is too large to extract.")
+    try:
+        return ElementTree.fromstring(archive.read(name))
+    # Corrupt, encrypted or unsupported compression in the part, or malformed XML
+    except (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError, ElementTree.ParseError) as e:
+        raise ValueError(f"The file is not a valid DOCX document: '{name}' could not be read: {e}")
+
+def _inline_text(element: ElementTree.Element, boxes: List[ElementTree.Element]) -> str:
+    """The text of a paragraph; text boxes anchored in it are collected separately."""
+    parts = []
+    for child in element:
+        if child.tag == _MC_FALLBACK:
+            # The legacy rendering of the drawing next to it; reading both would duplicate its text
+            continue
+        if child.tag == _W + "txbxContent":
+            boxes.append(child)
+        elif child.tag == _W + "t":
+            parts.append(child.text or "")
+        elif child.tag == _W + "tab":
+            parts.append("\t")
+        elif child.tag in (_W + "br", _W + "cr"):
+            parts.append("\n")
+        else:
+            parts.append(_inline_text(child, boxes))
+    return "".join(parts)
+
+def _block_lines(container: ElementTree.Element, boxes: List[ElementTree.Element], layout: Dict[str, Any]) -> List[str]:
+    """The lines of the paragraphs and tables in a body, cell or text box, in order."""
+    lines: List[str] = []
+    for child in container:
+        if child.tag == _W + "p":
+            lines.append(_inline_text(child, boxes))
+        elif child.tag == _W + "tbl":
+            layout["tables"] += 1
+            for row in child.findall(_W + "tr"):
+                cells = [" ".join(_block_lines(cell, boxes, layout)).strip() for cell in row.findall(_W + "tc")]
+                lines.append(" | ".join(cell for cell in cells if cell))
+        elif child.tag == _W + "sdt":
+            content = child.find(_W + "sdtContent")
+            if content is not None:
+                lines.extend(_block_lines(content, boxes, layout))
+    return lines
+
+def _extract_docx(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    layout = _layout("docx")
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        document = _read_xml(archive, "word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ValueError(f"The file is not a valid DOCX document: {e}")
+
+    body = document.find(_W + "body")
+    boxes: List[ElementTree.Element] = []
+    lines = _block_lines(body, boxes, layout) if body is not None else []
+    # Parsers that read only the main text flow miss text boxes; keep their text, after the body
+    index = 0
+    while index < len(boxes):
+        lines.extend(_block_lines(boxes[index], boxes, layout))
+        index += 1
+    layout["text_boxes"] = len(boxes)
+    layout["images"] = sum(1 for _ in document.iter(_BLIP))
+    for section in document.iter(_W + "sectPr"):
+        columns = section.find(_W + "cols")
+        if columns is not None:
+            layout["columns"] = max(layout["columns"], int(columns.get(_W + "num", "1")))
+
+    header, footer = [], []
+    for name in sorted(name for name in archive.namelist() if _HEADER_FOOTER_RE.match(name)):
+        part_lines = [line for line in _block_lines(_read_xml(archive, name), [], layout) if line.strip()]
+        if part_lines:
+            layout["header_footer_text"] = True
+            (header if "header" in name else footer).extend(part_lines)
+    return "\n".join(header + lines + footer), layout
+
+def _extract_pdf(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ValueError("The PDF is password protected.")
+        pages, column_lines, text_lines, images = [], 0, 0, 0
+        for page in reader.pages:
+            pages.append(page.extract_text() or "")
+            for line in (page.extract_text(extraction_mode="layout") or "").splitlines():
+                if line.strip():
+                    text_lines += 1
+                    column_lines += bool(_COLUMN_GAP_RE.search(line))
+            images += len(page.images)
+    except PdfReadError as e:
+        raise ValueError(f"The file is not a valid PDF document: {e}")
+    # Side-by-side text on a good share of the lines means a multi-column layout
+    columns = 2 if text_lines and column_lines / text_lines >= 0.3 else 1
+    return "\n".join(pages), _layout("pdf", pages=len(pages), columns=columns, images=images)
+
+def _extract_txt(data: bytes) -> Tuple[str, Dict[str, Any]]:
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    return text, _layout("txt")
+
+_EXTRACTORS = {"docx": _extract_docx, "pdf": _extract_pdf, "txt": _extract_txt}
+
+def extract_document(data: bytes, file_type: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Returns the text of a document and its layout signals (columns, tables,
+    text boxes, images, text in headers/footers). Raises ValueError for
+    files that cannot be read.
+    """
+    try:
+        return _EXTRACTORS[file_type](data)
+    except ValueError:
+        raise
+    except Exception as e:
+        # Parsers raise all kinds of errors on malformed input; report them all as unreadable files
+        raise ValueError(f"The file could not be read as a {file_type.upper()} document: {e}")
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import IO, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from ..core.config import settings
+from ..schemas import DocumentLayout, ExtractedDocument
+from .cache import make_key, result_cache
+from .extractors import extract_document
+from .metrics import Counter, Histogram, record_phase, registry
+
+# Bump whenever extraction changes so cached extractions are not reused across versions
+EXTRACTOR_VERSION = "1"
+
+_CHUNK_BYTES = 64 * 1024
+_DOCX_TYPES = frozenset({"application/vnd.openxmlformats-officedocument.wordprocessingml.document"})
+
+INGEST_FILES = registry.register(Counter(
+    "resumealign_ingest_files_total", "Uploaded files, by type and outcome (extracted, cached, rejected).", ("file_type", "outcome")))
+INGEST_DURATION = registry.register(Histogram(
+    "resumealign_ingest_extract_seconds", "Text extraction time in the process pool, by file type.", ("file_type",)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_extractor_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool that extracts text from uploads, created on
+    first use with one worker per CPU core unless INGEST_WORKERS is set.
+    """
+    global _pool
+    if _pool is None:
+        # Spawned rather than forked: the server process holds threads and open connections
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.ingest_workers or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+def close_extractor_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _discard_extractor_pool(pool: ProcessPoolExecutor, terminate: bool = False) -> None:
+    """
+    Replaces a broken or stuck pool: later uploads get a fresh one. With
+    `terminate`, its worker processes are killed, failing any other
+    extraction still running in them.
+    """
+    global _pool
+    if _pool is pool:
+        _pool = None
+    if terminate:
+        # ProcessPoolExecutor has no public way to stop a running task
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that rejects multipart uploads over the upload limit with
+    413 before their body is parsed: up front from Content-Length, or as soon
+    as a chunked body passes the limit. Form fields besides the file are
+    allowed `form_overhead_bytes` on top of INGEST_MAX_UPLOAD_BYTES.
+    """
+    def __init__(self, app, form_overhead_bytes: int = 1024 * 1024):
+        self.app = app
+        self.form_overhead_bytes = form_overhead_bytes
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers") or []) if scope["type"] == "http" else {}
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.ingest_max_upload_bytes + self.form_overhead_bytes
+        detail = f"The file exceeds the upload limit of {settings.ingest_max_upload_bytes} bytes."
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+def _file_type(upload: UploadFile, head: bytes) -> str:
+    """Detects the file type from its leading bytes, falling back to the declared type and name."""
+    name = (upload.filename or "").lower()
+    if head.startswith(b"%PDF-"):
+        # pypdf is in requirements.txt; this only guards trimmed-down installs
+        if importlib.util.find_spec("pypdf") is None:
+            raise HTTPException(status_code=415, detail="PDF uploads need the 'pypdf' package to be installed.")
+        return "pdf"
+    if head.startswith(b"PK\x03\x04") and (name.endswith(".docx") or upload.content_type in _DOCX_TYPES):
+        return "docx"
+    if name.endswith(".txt") or (upload.content_type or "").startswith("text/"):
+        return "txt"
+    raise HTTPException(status_code=415, detail="Unsupported file type. Upload a PDF, DOCX or plain text file.")
+
+async def _spool_upload(upload: UploadFile) -> Tuple[IO[bytes], str, bytes, int]:
+    """
+    Copies the upload into a spooled temporary file, kept in memory up to
+    INGEST_SPOOL_MEMORY_BYTES, while hashing it and enforcing the size
+    limit. Returns the file, rewound, with its SHA-256, leading bytes and size.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.ingest_spool_memory_bytes)
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    try:
+        while chunk := await upload.read(_CHUNK_BYTES):
+            size += len(chunk)
+            if size > settings.ingest_max_upload_bytes:
+                raise HTTPException(status_code=413, detail=f"The file exceeds the upload limit of {settings.ingest_max_upload_bytes} bytes.")
+            if len(head) < 8:
+                head += chunk[:8 - len(head)]
+            digest.update(chunk)
+            # Writes past the in-memory threshold go to disk; keep them off the event loop
+            if size > settings.ingest_spool_memory_bytes:
+                await asyncio.to_thread(spool.write, chunk)
+            else:
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest(), head, size
+
+async def ingest_upload(upload: UploadFile) -> ExtractedDocument:
+    """
+    Extracts the text and layout signals of an uploaded CV. The file is
+    streamed to a spooled buffer, parsed in the extraction process pool so
+    the event loop never blocks, and the result is cached by file hash.
+    """
+    spool, sha256, head, size = await _spool_upload(upload)
+    try:
+        if size == 0:
+            raise HTTPException(status_code=422, detail="The uploaded file is empty.")
+        try:
+            file_type = _file_type(upload, head)
+        except HTTPException:
+            INGEST_FILES.inc(file_type="unknown", outcome="rejected")
+            raise
+
+        cache_key = make_key("ingest", file_type, EXTRACTOR_VERSION, sha256)
+        cached = await result_cache.get(cache_key, ExtractedDocument)
+        if cached is not None:
+            INGEST_FILES.inc(file_type=file_type, outcome="cached")
+            return cached
+
+        data = await asyncio.to_thread(spool.read)
+    finally:
+        spool.close()
+
+    started = time.perf_counter()
+    pool = get_extractor_pool()
+    try:
+        text, layout = await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(pool, extract_document, data, file_type),
+            timeout=settings.ingest_timeout_seconds,
+        )
+    except ValueError as e:
+        INGEST_FILES.inc(file_type=file_type, outcome="rejected")
+        raise HTTPException(status_code=422, detail=str(e))
+    except asyncio.TimeoutError:
+        # Otherwise the worker stays busy with the file; kill it so it cannot hold the pool
+        _discard_extractor_pool(pool, terminate=True)
+        INGEST_FILES.inc(file_type=file_type, outcome="rejected")
+        raise HTTPException(status_code=422, detail="Extracting text from the file took too long.")
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory on a malformed file); start a fresh pool for later uploads
+        _discard_extractor_pool(pool)
+        INGEST_FILES.inc(file_type=file_type, outcome="rejected")
+        raise HTTPException(status_code=422, detail="The file could not be processed.")
+    elapsed = time.perf_counter() - started
+    INGEST_DURATION.observe(elapsed, file_type=file_type)
+    record_phase("extract", elapsed)
+    if not text.strip():
+        INGEST_FILES.inc(file_type=file_type, outcome="rejected")
+        raise HTTPException(status_code=422, detail="No text could be extracted from the file. Scanned documents are not supported.")
+
+    document = ExtractedDocument(sha256=sha256, text=text, layout=DocumentLayout(**layout))
+    await result_cache.set(cache_key, document)
+    INGEST_FILES.inc(file_type=file_type, outcome="extracted")
+    return document
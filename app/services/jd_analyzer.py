@@ -1,119 +1,168 @@
-import instructor
-import openai
+from typing import AsyncIterator, Optional, Tuple
 from fastapi import HTTPException
-from ..schemas import JDAnalysisRequest, JDAnalysisResponse
+from pydantic import BaseModel
+from ..core.config import settings
+from ..schemas import JDAnalysis, JDAnalysisRequest, JDAnalysisResponse
+from .cache import make_key, result_cache
+from .llm import create_completion
+from .metrics import timed_phase
+from .preprocess import prepare_text
+from .prompts import PromptSection, register_sectioned_prompt
+from .sections import llm_response_model, section_key, to_api_response
+from .singleflight import inflight
+from .streaming import stream_completion
 
-aclient  = instructor.patch(openai.AsyncOpenAI())
-
-def _create_jd_analysis_prompt(jd_text: str) -> str:
-    """
-    Creates the detailed, structured prompt for the LLM to analyze a job description.
-    This prompt is designed to identify "unicorn" roles that combine multiple profiles.
-    """
-    return f"""
+# Detects "unicorn" JDs that combine multiple profiles; the JD follows the instructions as its own message.
+# Bump the version whenever the prompt changes so cached results are not reused across versions.
+JD_ANALYSIS_PROMPT = register_sectioned_prompt(
+    "jd_analysis",
+    "3",
+    header="""
 # ROLE & GOAL
 You are a world-class, senior Recruitment Strategist and HR Analyst with over 20 years of experience. Your expertise is in organizational design and analyzing job market trends. Your task is to critically analyze a single job description (JD) to determine if it is asking for a "unicorn" candidate—an individual expected to fill multiple, distinct professional roles. Your output must be a structured JSON object, providing actionable insights for hiring managers. Do not add any commentary or text outside of the final JSON object.
 
 # CONTEXT
-- JOB_DESCRIPTION_TEXT: ```{jd_text}```
+The job description (JOB_DESCRIPTION_TEXT) follows in the next message.
 
 # DETAILED INSTRUCTIONS
 Analyze the provided job description and generate a JSON response. The analysis must cover the following points:
-
-1.  **Overall Assessment**:
+""",
+    sections=[
+        PromptSection(("is_hybrid_role", "primary_focus"), """
+**Overall Assessment**:
     -   First, determine if the JD describes a single, cohesive role or if it's a hybrid role blending multiple distinct profiles. Set 'is_hybrid_role' to true or false.
     -   Identify the 'primary_focus' of the position, even if it's a hybrid role (e.g., "Backend Development with DevOps responsibilities").
-
-2.  **Profile Deconstruction**:
+"""),
+        PromptSection(("identified_profiles",), """
+**Profile Deconstruction**:
     -   Identify and list each distinct professional profile found within the JD (e.g., "Data Scientist", "DevOps Engineer", "Frontend Developer").
     -   For each 'identified_profile', extract and list its specific 'key_responsibilities'.
     -   Critical Skill Differentiation: Carefully differentiate between mandatory skills (**core_requirements**) and "nice to have" or "desirable" skills (**desirable_skills**). Place skills mentioned as "plus", "bonus", or "preferred" in the 'desirable_skills' list. This instruction now fully governs skill extraction.
-
-3.  **Conflict & Overlap Summary**:
+"""),
+        PromptSection(("conflict_summary",), """
+**Conflict & Overlap Summary**:
     -   Write a concise 'conflict_summary' explaining *why* the combination of profiles is challenging. Highlight the core tensions or the rarity of the combined skill set. For example, explain how the mindset of a creative UI/UX designer differs from a systems-focused DevOps engineer.
-
-4.  **Hiring Realism Assessment**:
+"""),
+        PromptSection(("hiring_realism",), """
+**Hiring Realism Assessment**:
     -   Assess the probability of finding a single candidate who genuinely possesses all 'core_requirements' at a high level.
     -   Factor in "Nice to Haves": Explicitly consider the volume and diversity of the 'desirable_skills'. A large or unrelated list of desirable skills significantly decreases the hiring realism.
     -   Provide a 'rating' (**High**, **Medium**, **Low**) and justify it based on both core requirements and the weight of desirable skills.
-
-5.  **Actionable Recommendations**:
+"""),
+        PromptSection(("recommendations",), """
+**Actionable Recommendations**:
     -   Provide a list of concrete, actionable 'recommendations' for the hiring manager. These could include suggestions like splitting the role into two separate positions, refining the job description to focus on core needs, or adjusting seniority and compensation expectations.
-
+"""),
+    ],
+    footer="""
 # MANDATORY OUTPUT FORMAT
 Generate a single JSON object that strictly follows the required schema. Do not include markdown formatting like ```json in your response.
 **CRITICAL: All keys in the JSON object MUST be in snake_case (e.g., 'is_hybrid_role', 'primary_focus', 'identified_profiles'). The output must strictly follow the required schema.**
 The final JSON object MUST be complete and contain all the sections shown in the example structure below.
 
 **HERE IS AN EXAMPLE of the required structure. Populate all fields with your analysis:**
-```json
-{{
-  "jd_analysis": {{
-    "is_hybrid_role": true,
-    "primary_focus": "Senior Backend Developer with Data Science expectations",
-    "identified_profiles": [
-      {{
-        "profile_title": "Backend Developer",
-        "key_responsibilities": [
-          "Develop and maintain microservices.",
-          "Optimize application performance and database queries.",
-          "Write clean, testable code and perform code reviews."
-        ],
-        "core_requirements": [
-          "Python",
-          "FastAPI/Django",
-          "PostgreSQL",
-          "Docker"
-        ],
-        "desirable_skills": [
-          "Kubernetes experience",
-          "Frontend knowledge (React)"
-        ]
-      }},
-      {{
-        "profile_title": "Data Scientist (implied by desirable skills)",
-        "key_responsibilities": [
-          "Analyze user data to generate insights.",
-          "Develop predictive models (as suggested by 'nice to have')."
-        ],
-        "core_requirements": [
-          "SQL complex queries"
-        ],
-        "desirable_skills": [
-          "Pandas",
-          "Scikit-learn",
-          "Experience with ML pipelines"
-        ]
-      }}
-    ],
-    "conflict_summary": "The core role is clearly a Backend Developer. However, the desirable skills introduce elements of Data Science and advanced DevOps. The skills listed under 'nice to have' are not trivial; they represent a separate career track. This suggests the company wants a developer who can also function as a part-time data scientist.",
-    "hiring_realism": {{
-      "rating": "Low",
-      "justification": "Finding a senior developer with deep backend expertise is feasible. However, adding expectations for machine learning (Pandas, Scikit-learn) and Kubernetes significantly narrows the pool. Candidates with this combined skill set are rare and highly sought after, likely exceeding standard developer compensation bands."
-    }},
-    "recommendations": [
-      "Focus the role entirely on Backend Development by removing the data science 'nice to haves' to attract a larger pool of qualified developers.",
-      "If data science capabilities are critical, consider creating a separate, part-time Data Analyst role or allocate budget for a specialized contractor.",
-      "Move 'Kubernetes experience' from desirable to core if infrastructure management is essential, or remove it if a separate DevOps team handles deployment."
+""",
+    example={
+        "jd_analysis": {
+            "is_hybrid_role": True,
+            "primary_focus": "Senior Backend Developer with Data Science expectations",
+            "identified_profiles": [
+                {
+                    "profile_title": "Backend Developer",
+                    "key_responsibilities": [
+                        "Develop and maintain microservices.",
+                        "Optimize application performance and database queries.",
+                        "Write clean, testable code and perform code reviews."
+                    ],
+                    "core_requirements": [
+                        "Python",
+                        "FastAPI/Django",
+                        "PostgreSQL",
+                        "Docker"
+                    ],
+                    "desirable_skills": [
+                        "Kubernetes experience",
+                        "Frontend knowledge (React)"
+                    ]
+                },
+                {
+                    "profile_title": "Data Scientist (implied by desirable skills)",
+                    "key_responsibilities": [
+                        "Analyze user data to generate insights.",
+                        "Develop predictive models (as suggested by 'nice to have')."
+                    ],
+                    "core_requirements": [
+                        "SQL complex queries"
+                    ],
+                    "desirable_skills": [
+                        "Pandas",
+                        "Scikit-learn",
+                        "Experience with ML pipelines"
+                    ]
+                }
+            ],
+            "conflict_summary": "The core role is clearly a Backend Developer. However, the desirable skills introduce elements of Data Science and advanced DevOps. The skills listed under 'nice to have' are not trivial; they represent a separate career track. This suggests the company wants a developer who can also function as a part-time data scientist.",
+            "hiring_realism": {
+                "rating": "Low",
+                "justification": "Finding a senior developer with deep backend expertise is feasible. However, adding expectations for machine learning (Pandas, Scikit-learn) and Kubernetes significantly narrows the pool. Candidates with this combined skill set are rare and highly sought after, likely exceeding standard developer compensation bands."
+            },
+            "recommendations": [
+                "Focus the role entirely on Backend Development by removing the data science 'nice to haves' to attract a larger pool of qualified developers.",
+                "If data science capabilities are critical, consider creating a separate, part-time Data Analyst role or allocate budget for a specialized contractor.",
+                "Move 'Kubernetes experience' from desirable to core if infrastructure management is essential, or remove it if a separate DevOps team handles deployment."
+            ]
+        }
+    },
+    wrapper="jd_analysis",
+)
+
+def render_jd_digest(analysis: JDAnalysis) -> str:
+    """
+    Renders a JD analysis as a compact text that can stand in for the raw JD
+    in other prompts: the focus, and per profile its responsibilities, core
+    requirements and desirable skills.
+    """
+    lines = [
+        "STRUCTURED SUMMARY OF THE JOB DESCRIPTION (core requirements are mandatory, desirable skills are nice to have)",
+        f"Primary focus: {analysis.primary_focus}",
     ]
-  }}
-}}
-"""
+    for profile in analysis.identified_profiles or []:
+        lines.append(f"Profile: {profile.profile_title}")
+        lines.append(f"- Responsibilities: {'; '.join(profile.key_responsibilities)}")
+        lines.append(f"- Core requirements: {'; '.join(profile.core_requirements)}")
+        if profile.desirable_skills:
+            lines.append(f"- Desirable skills: {'; '.join(profile.desirable_skills)}")
+    return "\n".join(lines)
 
-async def run_jd_analysis(request: JDAnalysisRequest) -> JDAnalysisResponse:
+async def run_jd_analysis(request: JDAnalysisRequest, *, preprocessed: bool = False) -> JDAnalysisResponse:
     """
     Runs the analysis on a single JD to identify combined roles.
+    Pass `preprocessed` when the JD already went through prepare_text.
     """
-    prompt = _create_jd_analysis_prompt(request.jd_text)
+    if not preprocessed:
+        request = request.model_copy(update={"jd_text": prepare_text(request.jd_text, "jd").text})
+    sections = section_key(JDAnalysis, request.sections)
+    cache_key = _jd_cache_key(request, sections)
+    # Identical requests arriving while one is in flight share its upstream call
+    return await inflight.do(cache_key, lambda: _run_jd_analysis(request, sections, cache_key))
+
+def _jd_cache_key(request: JDAnalysisRequest, sections: Optional[Tuple[str, ...]]) -> str:
+    namespace = "jd_analysis" if sections is None else "jd_analysis:" + ",".join(sections)
+    return make_key(namespace, settings.llm_model, JD_ANALYSIS_PROMPT.version, request.jd_text)
+
+async def _run_jd_analysis(request: JDAnalysisRequest, sections: Optional[Tuple[str, ...]], cache_key: str) -> JDAnalysisResponse:
+    cached = await result_cache.get(cache_key, JDAnalysisResponse)
+    if cached is not None:
+        return cached
+
+    with timed_phase("prompt"):
+        messages = JD_ANALYSIS_PROMPT.messages(sections, job_description_text=request.jd_text)
     
     try:
-        response = await aclient.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_model=JDAnalysisResponse,
-            max_retries=2,
-        )
-        return response
+        output = await create_completion("jd_analysis", messages, llm_response_model(JDAnalysisResponse, sections))
+        response = to_api_response(JDAnalysisResponse, output)
+    except HTTPException:
+        raise
     except Exception as e:
         # Add structured logging here  <-- IMPORTANT
         print(f"An error occurred during LLM analysis: {e}")
@@ -121,4 +170,29 @@ async def run_jd_analysis(request: JDAnalysisRequest) -> JDAnalysisResponse:
         raise HTTPException(
           status_code=500,
           detail="Failed to get a valid analysis from the AI model."
-        )
\ No newline at end of file
+        )
+
+    await result_cache.set(cache_key, response)
+    return response
+
+async def stream_jd_analysis(request: JDAnalysisRequest) -> AsyncIterator[Tuple[str, BaseModel]]:
+    """
+    Streams the JD analysis as the model produces it: yields ("partial",
+    snapshot) pairs, then ("complete", JDAnalysisResponse) once it is fully validated.
+    """
+    request = request.model_copy(update={"jd_text": prepare_text(request.jd_text, "jd").text})
+    sections = section_key(JDAnalysis, request.sections)
+    cache_key = _jd_cache_key(request, sections)
+    cached = await result_cache.get(cache_key, JDAnalysisResponse)
+    if cached is not None:
+        yield "complete", cached
+        return
+
+    with timed_phase("prompt"):
+        messages = JD_ANALYSIS_PROMPT.messages(sections, job_description_text=request.jd_text)
+
+    async for event, item in stream_completion(
+        "jd_analysis", messages, llm_response_model(JDAnalysisResponse, sections), JDAnalysisResponse,
+        cache_key, "Failed to get a valid analysis from the AI model."
+    ):
+        yield event, item
@@ -0,0 +1,460 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type
+
+import httpx
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from ..core.config import settings
+from ..schemas import (
+    AnalysisRequest, AnalysisResponse, ATSCheckRequest, ATSCheckResponse, BatchItemError, JDAnalysisRequest,
+    JDAnalysisResponse, JobKind, JobOptions, JobStatusResponse,
+)
+from .analyzer import run_analysis
+from .ats_checker import run_ats_check
+from .jd_analyzer import run_jd_analysis
+from .metrics import Counter, registry, render_samples
+
+_PRIORITIES = {"low": 0, "normal": 1, "high": 2}
+_PRIORITY_NAMES = {value: name for name, value in _PRIORITIES.items()}
+
+# Request model, response model and service call per job kind
+_HANDLERS: Dict[str, Tuple[Type[BaseModel], Type[BaseModel], Callable[[BaseModel], Awaitable[BaseModel]]]] = {
+    "analyze": (AnalysisRequest, AnalysisResponse, run_analysis),
+    "check-ats": (ATSCheckRequest, ATSCheckResponse, run_ats_check),
+    "analyze-jd-profile": (JDAnalysisRequest, JDAnalysisResponse, run_jd_analysis),
+}
+
+# How often an idle worker re-queues jobs with expired leases and purges old results
+_MAINTENANCE_INTERVAL_SECONDS = 60.0
+# Upper bound of a worker's backoff after database errors
+_ERROR_BACKOFF_MAX_SECONDS = 30.0
+_FINISH_ATTEMPTS = 3
+# Failures worth another attempt: rate limits and upstream or internal errors
+_TRANSIENT_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+JOBS_FINISHED = registry.register(Counter(
+    "resumealign_jobs_finished_total", "Jobs that finished, by kind and status.", ("kind", "status")))
+JOB_WEBHOOKS = registry.register(Counter(
+    "resumealign_job_webhooks_total", "Webhook deliveries, by outcome.", ("outcome",)))
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value is not None else None
+
+
+class _JobStore:
+    """
+    The jobs table in SQLite, shared by all worker processes. Every method
+    blocks; call them through asyncio.to_thread.
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " webhook_url TEXT,"
+            " webhook_status TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " lease_expires_at REAL,"
+            " run_after REAL)"
+        )
+        # Databases created before retries were added
+        if "run_after" not in {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN run_after REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_priority ON jobs (status, priority DESC, created_at)")
+        self._conn.commit()
+
+    def insert(self, job_id: str, kind: str, priority: int, payload: str, webhook_url: Optional[str], created_at: float, max_queued: int) -> bool:
+        """Adds a queued job; returns False if the queue is full."""
+        with self._lock:
+            queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queued:
+                return False
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, priority, status, payload, webhook_url, webhook_status, created_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, priority, payload, webhook_url, "pending" if webhook_url else None, created_at),
+            )
+            self._conn.commit()
+        return True
+
+    def claim(self, lease_seconds: float) -> Optional[sqlite3.Row]:
+        """
+        Atomically moves the highest-priority, oldest queued job that is due to
+        'running' under a lease and returns it, or None if none is due. Its
+        `attempts` identifies this claim in later calls.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, lease_expires_at = ?, run_after = NULL, attempts = attempts + 1"
+                " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND (run_after IS NULL OR run_after <= ?)"
+                " ORDER BY priority DESC, created_at LIMIT 1)"
+                " RETURNING id, kind, payload, webhook_url, attempts",
+                (now, now + lease_seconds, now),
+            ).fetchone()
+            self._conn.commit()
+        return row
+
+    # The methods below act only while the caller's claim still holds the job.
+    # Once its lease expired the job may have been re-queued and claimed again.
+
+    def renew(self, job_id: str, attempt: int, lease_seconds: float) -> None:
+        """Extends the lease of a running job."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time() + lease_seconds, job_id, attempt),
+            )
+            self._conn.commit()
+
+    def finish(self, job_id: str, attempt: int, status: str, result: Optional[str], error: Optional[str]) -> bool:
+        """Stores the outcome of a job; returns False if the claim was lost."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL"
+                " WHERE id = ? AND status = 'running' AND attempts = ?",
+                (status, result, error, time.time(), job_id, attempt),
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def release(self, job_id: str, attempt: int, run_after: Optional[float] = None) -> bool:
+        """
+        Puts an interrupted or transiently failed job back in the queue, not
+        to be claimed before `run_after`. Returns False if the claim was lost.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, lease_expires_at = NULL, run_after = ?"
+                " WHERE id = ? AND status = 'running' AND attempts = ?",
+                (run_after, job_id, attempt),
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def set_webhook_status(self, job_id: str, webhook_status: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (webhook_status, job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def maintain(self, max_attempts: int, retention_seconds: float) -> None:
+        """
+        Re-queues jobs whose process died mid-run (expired lease), fails those
+        that were interrupted too often, and deletes old finished jobs.
+        """
+        now = time.time()
+        error = BatchItemError(status_code=500, detail="The job was interrupted too many times.").model_dump_json()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_expires_at = NULL"
+                " WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+                (error, now, now, max_attempts),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, lease_expires_at = NULL"
+                " WHERE status = 'running' AND lease_expires_at < ?",
+                (now,),
+            )
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - retention_seconds,))
+            self._conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    A persistent priority queue of service calls, drained by a pool of async
+    workers in this process.
+
+    Jobs are rows in SQLite, so queued work survives restarts and is shared by
+    all uvicorn workers. A worker claims the highest-priority, oldest job with
+    an atomic UPDATE ... RETURNING and holds a lease on it, renewed while the
+    job runs; if its process dies, the lease expires and the job is queued again.
+    """
+    def __init__(self, path: str):
+        self._store = _JobStore(path)
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._deliveries: Set[asyncio.Task] = set()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._last_maintenance = 0.0
+        self._counts: Dict[str, int] = {}
+
+    async def start(self, concurrency: int) -> None:
+        self._http = httpx.AsyncClient(timeout=settings.jobs_webhook_timeout_seconds)
+        await self._maintain()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(concurrency)]
+
+    async def stop(self) -> None:
+        """Stops the workers; jobs they were running go back to the queue."""
+        for task in [*self._workers, *self._deliveries]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._deliveries, return_exceptions=True)
+        self._workers = []
+        if self._http is not None:
+            await self._http.aclose()
+        self._store.close()
+
+    async def submit(self, kind: JobKind, request: JobOptions) -> JobStatusResponse:
+        """
+        Stores the request as a queued job and wakes a worker. Raises 503 when
+        the queue is full, and 422 when the webhook URL points at a host
+        that is not public.
+        """
+        job_id = uuid.uuid4().hex
+        created_at = time.time()
+        payload = request.model_dump_json(exclude={"priority", "webhook_url"})
+        webhook_url = str(request.webhook_url) if request.webhook_url is not None else None
+        if webhook_url is not None:
+            try:
+                await _check_webhook_host(webhook_url)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        stored = await asyncio.to_thread(
+            self._store.insert, job_id, kind, _PRIORITIES[request.priority], payload, webhook_url, created_at, settings.jobs_max_queued,
+        )
+        if not stored:
+            raise HTTPException(status_code=503, detail="The job queue is full. Retry later.", headers={"Retry-After": "30"})
+        self._wakeup.set()
+        return JobStatusResponse(
+            job_id=job_id,
+            kind=kind,
+            status="queued",
+            priority=request.priority,
+            created_at=_timestamp(created_at),
+            webhook_status="pending" if webhook_url else None,
+        )
+
+    async def get(self, job_id: str) -> Optional[JobStatusResponse]:
+        row = await asyncio.to_thread(self._store.get, job_id)
+        if row is None:
+            return None
+        result = None
+        if row["result"] is not None:
+            result = _HANDLERS[row["kind"]][1].model_validate_json(row["result"])
+        return JobStatusResponse(
+            job_id=row["id"],
+            kind=row["kind"],
+            status=row["status"],
+            priority=_PRIORITY_NAMES[row["priority"]],
+            created_at=_timestamp(row["created_at"]),
+            started_at=_timestamp(row["started_at"]),
+            finished_at=_timestamp(row["finished_at"]),
+            result=result,
+            error=BatchItemError.model_validate_json(row["error"]) if row["error"] is not None else None,
+            webhook_status=row["webhook_status"],
+        )
+
+    async def refresh_counts(self) -> Dict[str, int]:
+        """Reads the number of jobs per status, which `counts` then returns."""
+        self._counts = await asyncio.to_thread(self._store.counts)
+        return self._counts
+
+    def counts(self) -> Dict[str, int]:
+        """The number of jobs per status, as of the last `refresh_counts`."""
+        return dict(self._counts)
+
+    async def _maintain(self) -> None:
+        self._last_maintenance = time.monotonic()
+        await asyncio.to_thread(self._store.maintain, settings.jobs_max_attempts, settings.jobs_retention_seconds)
+
+    async def _worker(self) -> None:
+        failures = 0
+        while True:
+            try:
+                await self._step()
+                failures = 0
+            except Exception as e:
+                # e.g. 'database is locked' while other processes hold the database; keep the worker alive
+                failures += 1
+                print(f"An error occurred in a job worker: {e}")
+                await asyncio.sleep(min(settings.jobs_poll_interval_seconds * 2 ** failures, _ERROR_BACKOFF_MAX_SECONDS))
+
+    async def _step(self) -> None:
+        """Runs the next queued job, or waits for one and does the maintenance when idle."""
+        # Clear before claiming so a submit between the two is not missed
+        self._wakeup.clear()
+        job = await asyncio.to_thread(self._store.claim, settings.jobs_lease_seconds)
+        if job is not None:
+            await self._run(job)
+            return
+        try:
+            # Also poll, for jobs submitted through other processes
+            await asyncio.wait_for(self._wakeup.wait(), timeout=settings.jobs_poll_interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+        if time.monotonic() - self._last_maintenance > _MAINTENANCE_INTERVAL_SECONDS:
+            await self._maintain()
+
+    async def _heartbeat(self, job_id: str, attempt: int) -> None:
+        """Renews the lease of a running job, so a long job is not re-queued and run twice."""
+        while True:
+            await asyncio.sleep(settings.jobs_lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._store.renew, job_id, attempt, settings.jobs_lease_seconds)
+            except sqlite3.Error as e:
+                print(f"An error occurred while renewing the lease of job {job_id}: {e}")
+
+    async def _store_call(self, job_id: str, method: Callable[..., bool], *args) -> bool:
+        """Calls a store method that records a job's outcome, retrying on database errors."""
+        for attempt in range(_FINISH_ATTEMPTS):
+            try:
+                return await asyncio.to_thread(method, job_id, *args)
+            except sqlite3.Error as e:
+                if attempt == _FINISH_ATTEMPTS - 1:
+                    raise
+                print(f"An error occurred while storing the result of job {job_id}: {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    async def _run(self, job: sqlite3.Row) -> None:
+        job_id, kind, attempt = job["id"], job["kind"], job["attempts"]
+        request_model, _, handler = _HANDLERS[kind]
+        result = error = None
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt))
+        try:
+            try:
+                response = await handler(request_model.model_validate_json(job["payload"]))
+                result = response.model_dump_json()
+            except asyncio.CancelledError:
+                # Shutting down: hand the job to the next process that starts
+                await asyncio.to_thread(self._store.release, job_id, attempt)
+                raise
+            except HTTPException as e:
+                error = BatchItemError(status_code=e.status_code, detail=str(e.detail))
+            except Exception as e:
+                print(f"An error occurred during job {job_id}: {e}")
+                error = BatchItemError(status_code=500, detail="An unexpected internal error occurred.")
+
+            # The lease is kept until the outcome is stored
+            if error is not None and error.status_code in _TRANSIENT_STATUS_CODES and attempt < settings.jobs_max_attempts:
+                run_after = time.time() + settings.jobs_retry_backoff_seconds * 2 ** (attempt - 1)
+                if await self._store_call(job_id, self._store.release, attempt, run_after):
+                    print(f"Job {job_id} failed with status {error.status_code} on attempt {attempt}; it will be retried.")
+                return
+            status = "failed" if error is not None else "succeeded"
+            stored = await self._store_call(job_id, self._store.finish, attempt, status, result, error.model_dump_json() if error else None)
+        finally:
+            heartbeat.cancel()
+        if not stored:
+            # The lease expired mid-run and the job was re-queued; the newer attempt owns it now
+            print(f"Job {job_id} lost its lease before attempt {attempt} finished; its outcome was discarded.")
+            return
+        JOBS_FINISHED.inc(kind=kind, status=status)
+        if job["webhook_url"]:
+            task = asyncio.create_task(self._deliver(job_id, job["webhook_url"]))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, job_id: str, url: str) -> None:
+        """
+        POSTs the finished job to its webhook, retrying with exponential
+        backoff. With JOBS_WEBHOOK_SECRET set, the body is signed with
+        HMAC-SHA256 in the X-Signature-256 header.
+        """
+        try:
+            # Checked again at delivery, as the host may resolve differently by now
+            await _check_webhook_host(url)
+        except ValueError as e:
+            print(f"The webhook of job {job_id} was not delivered: {e}")
+            JOB_WEBHOOKS.inc(outcome="failed")
+            await asyncio.to_thread(self._store.set_webhook_status, job_id, "failed")
+            return
+
+        job = await self.get(job_id)
+        body = job.model_dump_json().encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if settings.jobs_webhook_secret:
+            signature = hmac.new(settings.jobs_webhook_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers["X-Signature-256"] = f"sha256={signature}"
+
+        delivered = False
+        for attempt in range(settings.jobs_webhook_max_attempts):
+            if attempt:
+                await asyncio.sleep(2 ** (attempt - 1))
+            try:
+                response = await self._http.post(url, content=body, headers=headers)
+                if response.is_success:
+                    delivered = True
+                    break
+            except httpx.HTTPError as e:
+                print(f"An error occurred while delivering the webhook of job {job_id}: {e}")
+        JOB_WEBHOOKS.inc(outcome="delivered" if delivered else "failed")
+        await asyncio.to_thread(self._store.set_webhook_status, job_id, "delivered" if delivered else "failed")
+
+async def _check_webhook_host(url: str) -> None:
+    """
+    Raises ValueError unless every address the webhook host resolves to is
+    public, so a webhook cannot reach this host or the internal network.
+    JOBS_WEBHOOK_ALLOW_PRIVATE lifts the check.
+    """
+    if settings.jobs_webhook_allow_private:
+        return
+    parsed = httpx.URL(url)
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(parsed.host, parsed.port or 443, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"The webhook host '{parsed.host}' could not be resolved: {e}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise ValueError(f"The webhook host '{parsed.host}' resolves to a non-public address ({address}).")
+
+_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns the process-wide job queue, opening its database on first use.
+    """
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(settings.jobs_db_path)
+    return _queue
+
+async def close_job_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+def _collect_job_metrics():
+    """Exports the number of jobs per status on /metrics, as last read by the endpoint."""
+    counts = _queue.counts() if _queue is not None else {}
+    yield from render_samples("resumealign_jobs", "gauge", "Jobs in the queue database, by status.",
+                              [({"status": status}, count) for status, count in sorted(counts.items())])
+
+registry.register_collector(_collect_job_metrics)
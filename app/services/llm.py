@@ -0,0 +1,222 @@
+import time
+from typing import Any, AsyncIterator, List, Optional, Type
+
+import httpx
+import instructor
+import openai
+from fastapi import HTTPException
+from instructor.core.hooks import Hooks
+
+from ..core.config import settings
+from .metrics import (
+    LLM_DURATION, LLM_ERRORS, LLM_HTTP_RESPONSES, LLM_REQUESTS, LLM_RETRIES, LLM_TIME_TO_FIRST_PARTIAL, LLM_TOKENS,
+    LLM_UPSTREAM_DURATION, LLM_VALIDATION_FAILURES, record_phase,
+)
+from .policy import LLM_CASCADE, cascade_model, hedge_delay, latency_tracker, run_hedged
+from .repair import repairable
+from .scheduler import SchedulingTransport, close_scheduler, current_operation, get_scheduler
+
+_client: Optional[openai.AsyncOpenAI] = None
+
+async def _count_response(response: httpx.Response) -> None:
+    LLM_HTTP_RESPONSES.inc(status=str(response.status_code))
+
+def get_client() -> openai.AsyncOpenAI:
+    """
+    Returns the instructor-patched OpenAI client shared by all services.
+
+    The client, and its HTTP connection pool, is created on first use so that
+    every service reuses the same warm connections. Every request goes through
+    the upstream scheduler, which also owns the retries of 429s and 5xx, so
+    the OpenAI SDK's own retries are turned off.
+    """
+    global _client
+    if _client is None:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+            ),
+            http2=settings.llm_http2,
+        )
+        http_client = httpx.AsyncClient(
+            transport=SchedulingTransport(transport, get_scheduler()),
+            timeout=httpx.Timeout(settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds),
+            event_hooks={"response": [_count_response]},
+        )
+        _client = instructor.patch(openai.AsyncOpenAI(base_url=settings.llm_base_url, http_client=http_client, max_retries=0))
+    return _client
+
+async def close_client() -> None:
+    """
+    Closes the shared client and its connection pool. Called on app shutdown.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    await close_scheduler()
+
+
+class _CallObserver:
+    """
+    Follows one structured-output call through instructor's hooks and records
+    its attempts, upstream time, token usage and validation failures.
+    """
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.attempts = 0
+        self.upstream_seconds = 0.0
+        self.started = time.perf_counter()
+        self._attempt_started = self.started
+        self.hooks = Hooks()
+        self.hooks.on("completion:kwargs", self._on_attempt)
+        self.hooks.on("completion:response", self._on_response)
+        self.hooks.on("completion:error", self._on_error)
+        self.hooks.on("parse:error", self._on_parse_error)
+
+    def _end_attempt(self) -> None:
+        elapsed = time.perf_counter() - self._attempt_started
+        self.upstream_seconds += elapsed
+        LLM_UPSTREAM_DURATION.observe(elapsed, operation=self.operation)
+
+    def _on_attempt(self, *args: Any, **kwargs: Any) -> None:
+        self.attempts += 1
+        self._attempt_started = time.perf_counter()
+
+    def _on_response(self, response: Any) -> None:
+        self._end_attempt()
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            get_scheduler().settle(usage.total_tokens or 0)
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, operation=self.operation, type="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens or 0, operation=self.operation, type="completion")
+            # Prompt-prefix cache hits, billed and processed faster by the provider
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) if details is not None else None
+            LLM_TOKENS.inc(cached or 0, operation=self.operation, type="cached_prompt")
+
+    def _on_error(self, error: Exception, **kwargs: Any) -> None:
+        self._end_attempt()
+        LLM_ERRORS.inc(operation=self.operation, error_type=type(error).__name__)
+
+    def _on_parse_error(self, error: Exception, **kwargs: Any) -> None:
+        LLM_VALIDATION_FAILURES.inc(operation=self.operation)
+
+    def finish(self, error: Optional[Exception] = None, streamed: bool = False) -> None:
+        total = time.perf_counter() - self.started
+        if streamed:
+            # Parsing is interleaved with reading the stream; count it all as upstream
+            self.upstream_seconds = total
+        LLM_DURATION.observe(total, operation=self.operation)
+        LLM_RETRIES.inc(max(self.attempts - 1, 0), operation=self.operation)
+        LLM_REQUESTS.inc(operation=self.operation, outcome="error" if error is not None else "success")
+        if error is not None:
+            LLM_ERRORS.inc(operation=self.operation, error_type=type(error).__name__)
+        record_phase("upstream", self.upstream_seconds)
+        record_phase("validation", max(total - self.upstream_seconds, 0.0))
+
+    async def observe_stream(self, partials: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        error = None
+        first = True
+        try:
+            async for partial in partials:
+                if first:
+                    first = False
+                    LLM_TIME_TO_FIRST_PARTIAL.observe(time.perf_counter() - self.started, operation=self.operation)
+                yield partial
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.finish(error, streamed=True)
+
+def _failed_validation(error: Exception) -> bool:
+    """Whether instructor gave up because the output kept failing validation, rather than on an API error."""
+    failed_attempts = getattr(error, "failed_attempts", None)
+    return bool(failed_attempts) and error.__cause__ is failed_attempts[-1].exception
+
+async def _complete(
+    operation: str,
+    model: str,
+    messages: List[dict],
+    response_model: Type[Any],
+    max_retries: int,
+    stream: bool,
+) -> Any:
+    observer = _CallObserver(operation)
+    current_operation.set(operation)
+    if settings.llm_repair_enabled and not stream:
+        response_model = repairable(response_model)
+    try:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            response_model=response_model,
+            max_retries=max_retries,
+            stream=stream,
+            hooks=observer.hooks,
+        )
+    except Exception as e:
+        observer.finish(e)
+        rate_limit = e if isinstance(e, openai.RateLimitError) else e.__cause__
+        if isinstance(rate_limit, openai.RateLimitError):
+            retry_after = rate_limit.response.headers.get("retry-after", "")
+            raise HTTPException(
+                status_code=503,
+                detail="The language model API is rate limiting requests. Please retry later.",
+                headers={"Retry-After": str(max(int(retry_after), 1)) if retry_after.isdigit() else str(int(settings.llm_backoff_max_seconds))},
+            ) from e
+        raise
+    if stream:
+        return observer.observe_stream(response)
+    observer.finish()
+    latency_tracker.record(operation, model, time.perf_counter() - observer.started)
+    return response
+
+async def create_completion(
+    operation: str,
+    messages: List[dict],
+    response_model: Type[Any],
+    max_retries: int = 2,
+    stream: bool = False,
+) -> Any:
+    """
+    Sends a structured-output request through the shared client and records
+    its metrics under `operation`. With `stream`, returns the async iterator of
+    partial responses.
+
+    Unless disabled, output that fails validation is first repaired locally
+    (see repair.repairable); instructor only re-asks the model when that fails.
+
+    Operations opted into the tail-latency policy (see policy.py) are, when
+    not streamed, first tried on the cascade model, escalating to the main
+    model if its output fails validation, and hedged with a second request
+    when slower than usual.
+
+    Raises HTTPException 503 with Retry-After when the API is still rate
+    limiting once the scheduler has used up its retries.
+    """
+    if stream:
+        return await _complete(operation, settings.llm_model, messages, response_model, max_retries, stream)
+
+    def attempt(model: str, retries: int):
+        return run_hedged(
+            operation, hedge_delay(operation, model),
+            lambda: _complete(operation, model, messages, response_model, retries, stream),
+        )
+
+    fast_model = cascade_model(operation, messages)
+    if fast_model is not None:
+        try:
+            # No re-asks: output the fast model cannot get right goes to the main model instead
+            response = await attempt(fast_model, 0)
+        except Exception as e:
+            if not _failed_validation(e):
+                raise
+            LLM_CASCADE.inc(operation=operation, outcome="escalated")
+        else:
+            LLM_CASCADE.inc(operation=operation, outcome="answered")
+            return response
+    return await attempt(settings.llm_model, max_retries)
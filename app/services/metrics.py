@@ -0,0 +1,256 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+# Latency buckets in seconds: fine-grained for our own work, wide for the model
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """
+    Base class: a named metric with a fixed set of label names and one value
+    (or histogram) per combination of label values.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = _LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label values: [per-bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        names = self.labelnames + ("le",)
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """
+    Holds the metrics of this worker process and renders them in the
+    Prometheus text exposition format. Collectors are callables that yield
+    extra lines at scrape time, for counters kept elsewhere (cache, ...).
+    """
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def render_samples(name: str, kind: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Renders values kept outside the registry, for use in collectors."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return lines
+
+HTTP_REQUESTS = registry.register(Counter(
+    "resumealign_http_requests_total", "HTTP requests handled, by endpoint and status.", ("method", "endpoint", "status")))
+HTTP_DURATION = registry.register(Histogram(
+    "resumealign_http_request_duration_seconds", "Time from request to the end of the response body.", ("method", "endpoint")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "resumealign_http_requests_in_flight", "HTTP requests currently being handled.", ("endpoint",)))
+PHASE_DURATION = registry.register(Histogram(
+    "resumealign_phase_duration_seconds", "Time spent per processing phase: preprocess, prompt, upstream, validation.", ("phase",)))
+LLM_REQUESTS = registry.register(Counter(
+    "resumealign_llm_requests_total", "Structured-output LLM calls, by operation and outcome.", ("operation", "outcome")))
+LLM_DURATION = registry.register(Histogram(
+    "resumealign_llm_request_duration_seconds", "Duration of a structured-output call including all retries.", ("operation",)))
+LLM_UPSTREAM_DURATION = registry.register(Histogram(
+    "resumealign_llm_upstream_duration_seconds", "Time waiting for the model, per attempt.", ("operation",)))
+LLM_TOKENS = registry.register(Counter(
+    "resumealign_llm_tokens_total", "Tokens reported by the API, by operation and type (prompt, cached_prompt, completion).", ("operation", "type")))
+LLM_TIME_TO_FIRST_PARTIAL = registry.register(Histogram(
+    "resumealign_llm_time_to_first_partial_seconds", "Time from a streamed call to its first partial result.", ("operation",)))
+LLM_RETRIES = registry.register(Counter(
+    "resumealign_llm_retries_total", "Attempts beyond the first, mostly re-asks after validation failures.", ("operation",)))
+LLM_VALIDATION_FAILURES = registry.register(Counter(
+    "resumealign_llm_validation_failures_total", "Model outputs that failed response-model validation.", ("operation",)))
+LLM_ERRORS = registry.register(Counter(
+    "resumealign_llm_errors_total", "Failed upstream attempts and failed calls, by exception type.", ("operation", "error_type")))
+LLM_HTTP_RESPONSES = registry.register(Counter(
+    "resumealign_llm_http_responses_total", "Raw HTTP responses from the LLM API, including the scheduler's retries.", ("status",)))
+
+# Phase durations of the request being handled, for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def record_phase(phase: str, seconds: float) -> None:
+    """Records time spent in a phase, globally and for the current request."""
+    PHASE_DURATION.observe(seconds, phase=phase)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+@contextmanager
+def timed_phase(phase: str) -> Iterator[None]:
+    """Times the enclosed block as one phase of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+
+def _route_path(scope: dict) -> str:
+    """The route template for a request, so path parameters do not become labels."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+def _server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in timings.items()]
+    # Whatever is not covered by a phase: routing, request parsing, response serialization
+    entries.append(f"app;dur={max(total - sum(timings.values()), 0.0) * 1000:.1f}")
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records latency, status and in-flight requests per
+    endpoint. With `timing_header`, responses carry a Server-Timing header
+    with the phase breakdown up to the moment the headers are sent.
+    """
+    def __init__(self, app, timing_header: bool = False):
+        self.app = app
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, endpoint = scope["method"], _route_path(scope)
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_header:
+                    header = _server_timing(timings, time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status=str(status))
+            HTTP_DURATION.observe(time.perf_counter() - started, method=method, endpoint=endpoint)
+            _request_timings.reset(token)
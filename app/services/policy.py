@@ -0,0 +1,97 @@
+import asyncio
+import math
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from ..core.config import settings
+from .metrics import Counter, registry
+from .preprocess import estimate_tokens
+
+T = TypeVar("T")
+
+LLM_HEDGES = registry.register(Counter(
+    "resumealign_llm_hedges_total",
+    "Calls that were still running at the hedge delay and got a second request, by which one answered first.",
+    ("operation", "winner"),
+))
+LLM_CASCADE = registry.register(Counter(
+    "resumealign_llm_cascade_total",
+    "Calls of cascaded operations, by outcome: answered by the cascade model, escalated after failed validation, or sent straight to the main model because of their size.",
+    ("operation", "outcome"),
+))
+
+
+class LatencyTracker:
+    """
+    The most recent successful call durations per operation and model, used
+    to place the hedge delay at a percentile of what the upstream normally takes.
+    """
+    def __init__(self, window: int):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, operation: str, model: str, seconds: float) -> None:
+        self._samples.setdefault((operation, model), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, operation: str, model: str, percentile: float, min_samples: int) -> Optional[float]:
+        """The given percentile of recent durations, or None with fewer than `min_samples`."""
+        samples = self._samples.get((operation, model))
+        if samples is None or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(math.ceil(percentile / 100 * len(ordered)) - 1, len(ordered) - 1)]
+
+latency_tracker = LatencyTracker(settings.llm_hedge_window)
+
+def hedge_delay(operation: str, model: str) -> Optional[float]:
+    """
+    Seconds after which a call of `operation` gets a second, identical
+    request, or None if the operation is not hedged or too few calls have
+    been seen to know what is slow.
+    """
+    if operation not in settings.llm_hedge_operations:
+        return None
+    delay = latency_tracker.percentile(operation, model, settings.llm_hedge_percentile, settings.llm_hedge_min_samples)
+    return None if delay is None else max(delay, settings.llm_hedge_min_delay_seconds)
+
+async def run_hedged(operation: str, delay: Optional[float], call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Awaits `call()`; if it has not finished after `delay` seconds, starts a
+    second `call()` and returns whichever succeeds first, cancelling the
+    other. Fails only if both do, with the first request's error.
+    """
+    primary = asyncio.ensure_future(call())
+    if delay is None:
+        return await primary
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+        tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    LLM_HEDGES.inc(operation=operation, winner="primary" if task is primary else "hedge")
+                    return task.result()
+        LLM_HEDGES.inc(operation=operation, winner="none")
+        return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def cascade_model(operation: str, messages: List[dict]) -> Optional[str]:
+    """
+    The faster model to try first for this call, or None to go straight to
+    the main model: the operation is not cascaded, or its input is larger
+    than the cascade model is trusted with.
+    """
+    if not settings.llm_cascade_model or operation not in settings.llm_cascade_operations:
+        return None
+    input_tokens = sum(estimate_tokens(str(message.get("content") or "")) for message in messages)
+    if input_tokens > settings.llm_cascade_max_input_tokens:
+        LLM_CASCADE.inc(operation=operation, outcome="too_large")
+        return None
+    return settings.llm_cascade_model
@@ -0,0 +1,253 @@
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal, Optional
+
+from ..core.config import settings
+from .metrics import record_phase, registry, render_samples
+
+TextKind = Literal["cv", "jd"]
+
+_BULLET_RE = re.compile(r"^([•‣▪●◦⁃∙·–—]|\*(?=\s))\s*")
+_SPACES_RE = re.compile(r"[ \t\u00a0\u2000-\u200b\u202f\u205f\u3000]+")
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Page furniture left behind by PDF/DOCX extraction
+_PAGE_NOISE_RE = re.compile(
+    r"^(page\s+\d+(\s*(of|/)\s*\d+)?|-?\s*\d{1,3}\s*-?|\d{1,3}\s*/\s*\d{1,3}|curriculum vitae|resume|résumé|cv)$",
+    re.IGNORECASE,
+)
+_BOILERPLATE_RE = re.compile(
+    r"references (are )?available (up)?on request"
+    r"|equal opportunity employer"
+    r"|we do not discriminate"
+    r"|this (e-?mail|document) (and any attachments )?(is|are) confidential"
+    r"|i hereby declare"
+    r"|all rights reserved",
+    re.IGNORECASE,
+)
+
+# Heading keyword -> canonical section name
+_HEADINGS: Dict[TextKind, Dict[str, str]] = {
+    "cv": {
+        "summary": "summary", "profile": "summary", "about me": "summary", "objective": "summary",
+        "professional summary": "summary",
+        "experience": "experience", "work experience": "experience", "professional experience": "experience",
+        "employment": "experience", "employment history": "experience", "work history": "experience",
+        "career history": "experience",
+        "skills": "skills", "technical skills": "skills", "core competencies": "skills", "competencies": "skills",
+        "technologies": "skills", "tech stack": "skills",
+        "education": "education", "academic background": "education",
+        "certifications": "certifications", "certificates": "certifications", "licenses": "certifications",
+        "projects": "projects", "personal projects": "projects", "side projects": "projects",
+        "languages": "languages",
+        "publications": "other", "awards": "other", "volunteering": "other", "interests": "other",
+        "hobbies": "other", "references": "other",
+    },
+    "jd": {
+        "about us": "about", "about the company": "about", "who we are": "about", "company": "about",
+        "about the role": "role", "the role": "role", "overview": "role", "job description": "role",
+        "responsibilities": "responsibilities", "what you will do": "responsibilities",
+        "what you'll do": "responsibilities", "key responsibilities": "responsibilities", "duties": "responsibilities",
+        "requirements": "requirements", "qualifications": "requirements", "must have": "requirements",
+        "what you bring": "requirements", "who you are": "requirements", "required skills": "requirements",
+        "nice to have": "nice_to_have", "preferred qualifications": "nice_to_have", "bonus points": "nice_to_have",
+        "desirable": "nice_to_have", "pluses": "nice_to_have",
+        "benefits": "benefits", "what we offer": "benefits", "perks": "benefits", "compensation": "benefits",
+        "how to apply": "benefits",
+    },
+}
+
+# Sections in the order they are trimmed when over budget (least relevant first)
+_TRIM_ORDER: Dict[TextKind, List[str]] = {
+    "cv": ["other", "languages", "projects", "certifications", "education", "summary", "skills", "experience", "header"],
+    "jd": ["benefits", "about", "nice_to_have", "role", "responsibilities", "requirements", "header"],
+}
+# Sections that are shortened but never dropped entirely
+_ESSENTIAL: Dict[TextKind, frozenset] = {
+    "cv": frozenset({"header", "experience", "skills"}),
+    "jd": frozenset({"header", "requirements", "responsibilities"}),
+}
+
+
+@dataclass
+class Section:
+    """A contiguous block of lines under one heading."""
+    name: str
+    lines: List[str] = field(default_factory=list)
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+@dataclass
+class PreparedText:
+    """
+    The compacted text to embed in a prompt, with its before/after token counts.
+    """
+    text: str
+    original_tokens: int
+    tokens: int
+    sections: List[str] = field(default_factory=list)
+    dropped_sections: List[str] = field(default_factory=list)
+    truncated: bool = False
+
+
+class PreprocessStats:
+    """
+    Running totals of original vs. compacted tokens per text kind.
+    """
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kind: TextKind, prepared: "PreparedText") -> None:
+        totals = self.totals.setdefault(kind, {"texts": 0, "original_tokens": 0, "tokens": 0, "truncated": 0})
+        totals["texts"] += 1
+        totals["original_tokens"] += prepared.original_tokens
+        totals["tokens"] += prepared.tokens
+        totals["truncated"] += int(prepared.truncated)
+
+preprocess_stats = PreprocessStats()
+
+def _collect_preprocess_metrics():
+    """Exports the preprocessing totals on /metrics."""
+    totals = preprocess_stats.totals
+    yield from render_samples("resumealign_preprocess_texts_total", "counter", "Texts preprocessed, by kind.",
+                              [({"kind": kind}, t["texts"]) for kind, t in totals.items()])
+    yield from render_samples("resumealign_preprocess_tokens_total", "counter", "Estimated tokens before and after preprocessing.",
+                              [({"kind": kind, "stage": stage}, t[key]) for kind, t in totals.items()
+                               for stage, key in (("original", "original_tokens"), ("compacted", "tokens"))])
+
+registry.register_collector(_collect_preprocess_metrics)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate close to OpenAI's BPE tokenizers for English prose:
+    one token per punctuation mark and per word, plus one per 8 characters of
+    long words.
+    """
+    return sum(1 + (len(token) - 1) // 8 for token in _TOKEN_RE.findall(text))
+
+def normalize_text(text: str) -> List[str]:
+    """
+    Normalizes unicode, whitespace and bullet characters and returns the
+    non-empty lines, without page headers/footers, boilerplate or duplicates.
+    """
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines: List[str] = []
+    seen = set()
+    for raw_line in text.split("\n"):
+        line = _SPACES_RE.sub(" ", raw_line).strip()
+        line = _BULLET_RE.sub("- ", line)
+        if not line or _PAGE_NOISE_RE.match(line) or _BOILERPLATE_RE.search(line):
+            continue
+        fingerprint = line.lower()
+        # Repeated lines are usually headers/footers or copy-paste; keep short
+        # ones since they are likely legitimate repeats such as job titles
+        if fingerprint in seen and len(line) > 20:
+            continue
+        seen.add(fingerprint)
+        lines.append(line)
+    return lines
+
+def heading_name(line: str, kind: TextKind) -> Optional[str]:
+    """Returns the canonical section name if the line is a recognized heading."""
+    candidate = line.strip("#*-=_: ").lower()
+    if len(candidate) > 40:
+        return None
+    return _HEADINGS[kind].get(candidate)
+
+def split_sections(lines: List[str], kind: TextKind) -> List[Section]:
+    """
+    Splits normalized lines into sections at recognized headings. Lines before
+    the first heading form the 'header' section (name and contact info in CVs).
+    """
+    sections = [Section(name="header")]
+    for line in lines:
+        name = heading_name(line, kind)
+        if name is not None:
+            sections.append(Section(name=name, lines=[line]))
+        else:
+            sections[-1].lines.append(line)
+    return [section for section in sections if section.lines]
+
+def _fit_lines(lines: List[str], budget: int) -> List[str]:
+    """The leading lines that fit in the budget; the first line (the heading) is always kept."""
+    kept = lines[:1]
+    used = estimate_tokens(lines[0]) if lines else 0
+    for line in lines[1:]:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+def _section_cap(costs: List[int], budget: int) -> int:
+    """
+    The largest per-section size that fits the sections in the budget when
+    only those above it are shortened, so sections that fit are left whole.
+    """
+    remaining = budget
+    ordered = sorted(costs)
+    for position, cost in enumerate(ordered):
+        share = remaining // (len(ordered) - position)
+        if cost > share:
+            return max(share, 0)
+        remaining -= cost
+    return ordered[-1] if ordered else 0
+
+def prepare_text(text: str, kind: TextKind, budget: Optional[int] = None) -> PreparedText:
+    """
+    Normalizes a CV or JD, segments it into sections and enforces the token
+    budget: the least relevant sections are dropped first, then the trailing
+    lines of the longest essential sections (experience, requirements, ...)
+    are cut. Essential sections always keep at least their first line.
+    """
+    started = time.perf_counter()
+    original_tokens = estimate_tokens(text)
+    if not settings.preprocess_enabled:
+        return PreparedText(text=text, original_tokens=original_tokens, tokens=original_tokens)
+    if budget is None:
+        budget = settings.cv_token_budget if kind == "cv" else settings.jd_token_budget
+
+    sections = split_sections(normalize_text(text), kind)
+    costs = [estimate_tokens(section.text()) for section in sections]
+    overflow = sum(costs) - budget
+    rank = {name: position for position, name in enumerate(_TRIM_ORDER[kind])}
+    least_relevant_first = sorted(range(len(sections)), key=lambda i: rank.get(sections[i].name, 0))
+
+    dropped: List[str] = []
+    keep = set(range(len(sections)))
+    for index in least_relevant_first:
+        if overflow <= 0:
+            break
+        if sections[index].name not in _ESSENTIAL[kind]:
+            keep.discard(index)
+            dropped.append(sections[index].name)
+            overflow -= costs[index]
+
+    truncated = False
+    if overflow > 0:
+        # Take the overflow from the sections that cause it rather than emptying short ones
+        kept_costs = [costs[i] for i in keep]
+        cap = _section_cap(kept_costs, sum(kept_costs) - overflow)
+        for index in keep:
+            if costs[index] > cap:
+                sections[index] = Section(name=sections[index].name, lines=_fit_lines(sections[index].lines, cap))
+                truncated = True
+
+    kept_sections = [sections[i] for i in sorted(keep)]
+    compacted = "\n\n".join(section.text() for section in kept_sections)
+    prepared = PreparedText(
+        text=compacted,
+        original_tokens=original_tokens,
+        tokens=estimate_tokens(compacted),
+        sections=[section.name for section in kept_sections],
+        dropped_sections=dropped,
+        truncated=truncated,
+    )
+    preprocess_stats.record(kind, prepared)
+    record_phase("preprocess", time.perf_counter() - started)
+    return prepared
@@ -0,0 +1,317 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from ..schemas import AnalysisResponse
+
+# Canonical skill -> aliases as they appear in CVs and JDs (lowercase)
+_SKILL_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "Python": ("python",),
+    "Java": ("java",),
+    "JavaScript": ("javascript", "js", "ecmascript"),
+    "TypeScript": ("typescript", "ts"),
+    "Go": ("golang", "go lang"),
+    "Rust": ("rust",),
+    "C++": ("c++", "cpp"),
+    "C#": ("c#", "csharp"),
+    ".NET": (".net", "dotnet", "asp.net"),
+    "Ruby": ("ruby", "ruby on rails", "rails"),
+    "PHP": ("php", "laravel", "symfony"),
+    "Kotlin": ("kotlin",),
+    "Swift": ("swift",),
+    "Scala": ("scala",),
+    "SQL": ("sql",),
+    "Bash": ("bash", "shell scripting"),
+    "Node.js": ("node.js", "nodejs", "node"),
+    "NestJS": ("nestjs", "nest.js"),
+    "Express": ("express.js", "expressjs"),
+    "React": ("react", "react.js", "reactjs"),
+    "Angular": ("angular", "angularjs"),
+    "Vue": ("vue", "vue.js", "vuejs"),
+    "Next.js": ("next.js", "nextjs"),
+    "HTML/CSS": ("html", "css", "html5", "css3", "sass", "tailwind"),
+    "Django": ("django",),
+    "Flask": ("flask",),
+    "FastAPI": ("fastapi",),
+    "Spring": ("spring", "spring boot"),
+    "GraphQL": ("graphql",),
+    "REST APIs": ("restful", "rest api", "rest apis"),
+    "gRPC": ("grpc",),
+    "Microservices": ("microservices", "microservice"),
+    "PostgreSQL": ("postgresql", "postgres"),
+    "MySQL": ("mysql", "mariadb"),
+    "MongoDB": ("mongodb", "mongo"),
+    "Redis": ("redis",),
+    "Cassandra": ("cassandra",),
+    "Elasticsearch": ("elasticsearch", "opensearch", "elk"),
+    "Kafka": ("kafka", "apache kafka"),
+    "RabbitMQ": ("rabbitmq",),
+    "AWS": ("aws", "amazon web services", "ec2", "s3", "lambda"),
+    "Azure": ("azure",),
+    "GCP": ("gcp", "google cloud", "bigquery"),
+    "Docker": ("docker", "containerization"),
+    "Kubernetes": ("kubernetes", "k8s", "eks", "aks", "gke", "helm"),
+    "Terraform": ("terraform",),
+    "Ansible": ("ansible",),
+    "CI/CD": ("ci/cd", "continuous integration", "continuous delivery", "jenkins", "github actions", "gitlab ci"),
+    "Git": ("git",),
+    "Linux": ("linux", "unix"),
+    "Networking": ("networking", "tcp/ip", "dns", "vpn", "load balancer", "firewall"),
+    "Monitoring": ("monitoring", "prometheus", "grafana", "datadog", "observability"),
+    "Machine Learning": ("machine learning", "ml", "scikit-learn", "sklearn", "pytorch", "tensorflow"),
+    "Data Analysis": ("pandas", "numpy", "data analysis", "spark", "pyspark"),
+    "LLMs": ("llm", "llms", "openai", "langchain", "generative ai", "genai"),
+    "Testing": ("unit testing", "pytest", "jest", "tdd", "test automation"),
+    "Agile": ("agile", "scrum", "kanban"),
+    "ITIL": ("itil", "servicenow"),
+    "Security": ("security", "oauth", "mfa", "iam", "owasp"),
+}
+
+_ALIAS_TO_SKILL = {alias: skill for skill, aliases in _SKILL_ALIASES.items() for alias in aliases}
+
+# Longest aliases first so "spring boot" wins over "spring"
+_SKILL_RE = re.compile(
+    r"(?<![a-z0-9+#.])("
+    + "|".join(re.escape(alias) for alias in sorted(_ALIAS_TO_SKILL, key=len, reverse=True))
+    + r")(?![a-z0-9+#])"
+)
+_KEYWORD_RE = re.compile(r"[a-z][a-z0-9+#]{2,}")
+_NICE_TO_HAVE_RE = re.compile(r"nice[ -]to[ -]have|\bplus\b|\bbonus\b|\bpreferred\b|\bdesirable\b|\bideally\b")
+_HEADING_RE = re.compile(
+    r"^[^.\-•*]{1,60}:$"
+    r"|^(about|requirements|responsibilities|qualifications|what you|who you|must[ -]have|nice[ -]to[ -]have"
+    r"|bonus|preferred|benefits|skills)\b[^.]{0,40}$"
+)
+
+_STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can could did do does doing during each
+for from further had has have having he her here hers him his how i if in into is it its just me more most my no nor
+not of off on once only or other our ours out over own same she should so some such than that the their them then
+there these they this those through to too under until up very was we were what when where which while who whom why
+will with would you your yours etc via per within across new using use used work working worked experience years
+year team teams role strong ability knowledge skills skill including include includes good great excellent
+responsibilities requirements required requirement must candidate looking join company plus bonus preferred nice
+""".split())
+
+# Named skills count more than generic keywords towards the technical score
+SKILL_WEIGHT = 3.0
+KEYWORD_WEIGHT = 1.0
+
+# How many of 1,000 software job descriptions name each skill, estimated from
+# public job-posting skill statistics. Within its type, a term weighs its
+# inverse document frequency over this fixed reference, so ubiquitous terms
+# count less than distinctive ones and a pair scores the same in any batch.
+_REFERENCE_DOCUMENTS = 1000
+_SKILL_DOCUMENT_FREQUENCY: Dict[str, int] = {
+    "Python": 320, "Java": 250, "JavaScript": 280, "TypeScript": 180, "Go": 90, "Rust": 30, "C++": 90, "C#": 110,
+    ".NET": 110, "Ruby": 40, "PHP": 60, "Kotlin": 50, "Swift": 40, "Scala": 30, "SQL": 400, "Bash": 80,
+    "Node.js": 150, "NestJS": 15, "Express": 40, "React": 220, "Angular": 90, "Vue": 60, "Next.js": 40,
+    "HTML/CSS": 180, "Django": 50, "Flask": 30, "FastAPI": 20, "Spring": 110, "GraphQL": 60, "REST APIs": 250,
+    "gRPC": 30, "Microservices": 200, "PostgreSQL": 150, "MySQL": 100, "MongoDB": 90, "Redis": 80, "Cassandra": 20,
+    "Elasticsearch": 50, "Kafka": 90, "RabbitMQ": 40, "AWS": 350, "Azure": 200, "GCP": 120, "Docker": 250,
+    "Kubernetes": 220, "Terraform": 120, "Ansible": 60, "CI/CD": 300, "Git": 300, "Linux": 200, "Networking": 120,
+    "Monitoring": 150, "Machine Learning": 120, "Data Analysis": 120, "LLMs": 60, "Testing": 250, "Agile": 350,
+    "ITIL": 30, "Security": 250,
+}
+# Generic job-posting vocabulary; other keywords get _DEFAULT_KEYWORD_FREQUENCY
+_KEYWORD_DOCUMENT_FREQUENCY: Dict[str, int] = {
+    "development": 700, "software": 650, "design": 550, "engineering": 500, "data": 450, "technical": 450,
+    "systems": 450, "engineer": 450, "build": 450, "developer": 400, "business": 400, "support": 400,
+    "communication": 400, "environment": 350, "code": 350, "solutions": 350, "product": 350, "tools": 350,
+    "services": 350, "cloud": 350, "degree": 350, "computer": 350, "applications": 300, "application": 300,
+    "develop": 300, "management": 300, "platform": 300, "quality": 300, "science": 300, "senior": 300,
+    "projects": 300, "project": 300, "understanding": 300, "opportunity": 300, "benefits": 300, "time": 300,
+    "building": 350, "best": 250, "practices": 250, "performance": 250, "problem": 250, "solving": 250,
+    "collaborate": 250, "web": 250, "bachelor": 250, "remote": 250, "customers": 250, "customer": 250, "lead": 250,
+    "scalable": 200, "collaboration": 200, "stakeholders": 200, "production": 200, "office": 200, "salary": 200,
+}
+_DEFAULT_SKILL_FREQUENCY = 50
+_DEFAULT_KEYWORD_FREQUENCY = 30
+
+
+@dataclass(frozen=True)
+class _Terms:
+    skills: Dict[str, str]       # canonical skill -> first line it was found in
+    desirable: FrozenSet[str]    # skills only mentioned under "nice to have" wording
+    keywords: FrozenSet[str]
+
+
+@dataclass
+class PreScore:
+    """
+    Result of the local, deterministic pre-scoring of one CV/JD pair.
+    """
+    technical_skills: int
+    matched_skills: List[str] = field(default_factory=list)
+    missing_skills: List[str] = field(default_factory=list)
+    desirable_missing: FrozenSet[str] = frozenset()
+
+
+@lru_cache(maxsize=4096)
+def _extract_terms(text: str) -> _Terms:
+    """
+    Extracts named skills (with the line they appear in) and generic keywords.
+    """
+    skills: Dict[str, str] = {}
+    required: set = set()
+    desirable: set = set()
+    in_nice_section = False
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        lowered = line.lower()
+        if _HEADING_RE.match(lowered):
+            in_nice_section = bool(_NICE_TO_HAVE_RE.search(lowered))
+        is_desirable = in_nice_section or bool(_NICE_TO_HAVE_RE.search(lowered))
+        for match in _SKILL_RE.finditer(lowered):
+            skill = _ALIAS_TO_SKILL[match.group(1)]
+            skills.setdefault(skill, line)
+            (desirable if is_desirable else required).add(skill)
+    keywords = frozenset(token for token in _KEYWORD_RE.findall(text.lower()) if token not in _STOPWORDS)
+    return _Terms(skills=skills, desirable=frozenset(desirable - required), keywords=keywords)
+
+def _reference_idf(document_frequency: int) -> float:
+    return float(idf_weights(np.float64(document_frequency), _REFERENCE_DOCUMENTS))
+
+def _term_weights(terms: _Terms, reference_idf: bool = True) -> Dict[str, float]:
+    if not reference_idf:
+        weights = {f"kw:{keyword}": KEYWORD_WEIGHT for keyword in terms.keywords}
+        weights.update({f"skill:{skill}": SKILL_WEIGHT for skill in terms.skills})
+        return weights
+    weights = {
+        f"kw:{keyword}": KEYWORD_WEIGHT * _KEYWORD_IDF.get(keyword, _DEFAULT_KEYWORD_IDF) for keyword in terms.keywords
+    }
+    weights.update({f"skill:{skill}": SKILL_WEIGHT * _SKILL_IDF.get(skill, _DEFAULT_SKILL_IDF) for skill in terms.skills})
+    return weights
+
+def extract_skills(text: str) -> Dict[str, str]:
+    """
+    Returns the named skills found in a text, mapped to the first line mentioning each.
+    """
+    return _extract_terms(text).skills
+
+def term_weights(text: str, reference_idf: bool = True) -> Dict[str, float]:
+    """
+    Returns the weighted skill/keyword terms of a text, as used by the scorer.
+    Without `reference_idf`, only the skill/keyword weights apply, for
+    callers that weigh terms by their own corpus.
+    """
+    return _term_weights(_extract_terms(text), reference_idf)
+
+def idf_weights(document_frequency: np.ndarray, document_count: int) -> np.ndarray:
+    """Smoothed inverse document frequency."""
+    return np.log((1.0 + document_count) / (1.0 + document_frequency)) + 1.0
+
+_SKILL_IDF = {skill: _reference_idf(count) for skill, count in _SKILL_DOCUMENT_FREQUENCY.items()}
+_KEYWORD_IDF = {keyword: _reference_idf(count) for keyword, count in _KEYWORD_DOCUMENT_FREQUENCY.items()}
+_DEFAULT_SKILL_IDF = _reference_idf(_DEFAULT_SKILL_FREQUENCY)
+_DEFAULT_KEYWORD_IDF = _reference_idf(_DEFAULT_KEYWORD_FREQUENCY)
+
+def prescore(pairs: Sequence[Tuple[str, str]]) -> List[PreScore]:
+    """
+    Scores many (cv_text, jd_text) pairs at once.
+
+    Each JD becomes a sparse vector of its skill and keyword weights, each CV
+    a sparse binary vector over the same vocabulary. The technical score is
+    the share of the JD's weighted terms that the CV covers, computed for all
+    pairs with one sparse element-wise product.
+
+    Term weights come from the fixed reference frequencies rather than from
+    the texts in the call, so a pair scores the same alone or in any batch;
+    the score gates LLM calls and must not depend on what else is being scored.
+    """
+    if not pairs:
+        return []
+    cv_terms = [_extract_terms(cv_text) for cv_text, _ in pairs]
+    jd_terms = [_extract_terms(jd_text) for _, jd_text in pairs]
+    jd_weights = [_term_weights(terms) for terms in jd_terms]
+
+    vocabulary: Dict[str, int] = {}
+    for weights in jd_weights:
+        for term in weights:
+            vocabulary.setdefault(term, len(vocabulary))
+    n_pairs, n_terms = len(pairs), max(len(vocabulary), 1)
+
+    jd_rows, jd_cols, jd_data = [], [], []
+    for row, weights in enumerate(jd_weights):
+        for term, weight in weights.items():
+            jd_rows.append(row)
+            jd_cols.append(vocabulary[term])
+            jd_data.append(weight)
+    cv_rows, cv_cols = [], []
+    for row, terms in enumerate(cv_terms):
+        for term in _term_weights(terms):
+            column = vocabulary.get(term)
+            if column is not None:
+                cv_rows.append(row)
+                cv_cols.append(column)
+
+    jd_matrix = sparse.csr_matrix((jd_data, (jd_rows, jd_cols)), shape=(n_pairs, n_terms), dtype=np.float64)
+    cv_matrix = sparse.csr_matrix((np.ones(len(cv_rows)), (cv_rows, cv_cols)), shape=(n_pairs, n_terms), dtype=np.float64)
+
+    covered = np.asarray(jd_matrix.multiply(cv_matrix).sum(axis=1)).ravel()
+    total = np.asarray(jd_matrix.sum(axis=1)).ravel()
+    scores = np.divide(covered, total, out=np.zeros_like(covered), where=total > 0)
+
+    results = []
+    for score, cv, jd in zip(scores, cv_terms, jd_terms):
+        matched = [skill for skill in jd.skills if skill in cv.skills]
+        missing = [skill for skill in jd.skills if skill not in cv.skills]
+        results.append(PreScore(
+            technical_skills=int(round(float(score) * 100)),
+            matched_skills=matched,
+            missing_skills=missing,
+            desirable_missing=frozenset(skill for skill in missing if skill in jd.desirable),
+        ))
+    return results
+
+def prescore_pair(cv_text: str, jd_text: str) -> PreScore:
+    """Scores a single CV/JD pair."""
+    return prescore([(cv_text, jd_text)])[0]
+
+def build_fast_analysis(cv_text: str, jd_text: str, score: PreScore) -> AnalysisResponse:
+    """
+    Builds an AnalysisResponse from the local pre-score alone, without the LLM.
+
+    Only technical fit is measured locally; experience and soft skills are
+    left null as not assessed, and the summaries say so.
+    """
+    cv_skills = _extract_terms(cv_text).skills
+    value = score.technical_skills
+    matched = ", ".join(score.matched_skills[:5]) or "none of the named skills"
+    missing = ", ".join(score.missing_skills[:5])
+    summary = (
+        f"Fast local pre-score: the CV covers {value}% of the job description's weighted skills and keywords "
+        f"(matched: {matched}). Experience and soft skills are not assessed in fast mode."
+    )
+    executive_summary = f"Your CV matches {len(score.matched_skills)} of the {len(score.matched_skills) + len(score.missing_skills)} named skills in this job description."
+    if missing:
+        executive_summary += f" The most visible gaps are: {missing}."
+    executive_summary += " Request a full analysis for a detailed assessment."
+    return AnalysisResponse.model_validate({
+        "analysis": {
+            "match_score": {
+                "overall_score": value,
+                "breakdown": {"technical_skills": value, "experience": None, "soft_skills": None},
+                "summary": summary,
+            },
+            "strengths": [
+                {"skill": skill, "evidence": cv_skills[skill][:300]}
+                for skill in score.matched_skills[:10]
+            ],
+            "skill_gaps": [
+                {
+                    "skill": skill,
+                    "importance": "Desirable" if skill in score.desirable_missing else "Important",
+                    "reason": "Mentioned in the job description but not found in the CV.",
+                }
+                for skill in score.missing_skills[:10]
+            ],
+            "executive_summary": executive_summary[:1000],
+        }
+    })
@@ -0,0 +1,135 @@
+import json
+import textwrap
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .metrics import registry, render_samples
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A versioned prompt, split for provider-side prompt caching: the static
+    instructions and output example form the system message, rendered once
+    when the template is registered, and the per-request inputs follow as
+    separate user messages. Requests of one kind then share a long identical
+    prefix (tool schema + system message) that the provider can cache.
+    """
+    name: str
+    version: str
+    instructions: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:v{self.version}"
+
+    def messages(self, **inputs: str) -> List[dict]:
+        """
+        The chat messages for one request. Each input becomes its own user
+        message, labelled with its name in upper case, in the order given.
+        """
+        messages = [{"role": "system", "content": self.instructions}]
+        for label, text in inputs.items():
+            messages.append({"role": "user", "content": f"{label.upper()}:\n```{text}```"})
+        return messages
+
+@dataclass(frozen=True)
+class PromptSection:
+    """One numbered instruction block and the output fields it produces."""
+    fields: Tuple[str, ...]
+    instructions: str
+
+@dataclass(frozen=True)
+class SectionedPromptTemplate:
+    """
+    A versioned prompt whose instructions and output example can be cut down
+    to some of the output fields. Each selection renders to its own
+    PromptTemplate once and is reused, so every combination of sections
+    still has a stable, cacheable prefix.
+    """
+    name: str
+    version: str
+    header: str
+    sections: Tuple[PromptSection, ...]
+    footer: str
+    example: Dict[str, Any] = field(repr=False)
+    wrapper: str = ""
+    _variants: Dict[Tuple[str, ...], PromptTemplate] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        example = self.example[self.wrapper] if self.wrapper else self.example
+        return tuple(example)
+
+    def select(self, fields: Optional[Sequence[str]] = None) -> PromptTemplate:
+        """The prompt for the given output fields, in example order; None means all."""
+        selected = tuple(name for name in self.fields if fields is None or name in fields)
+        if selected not in self._variants:
+            self._variants[selected] = self._render(selected)
+        return self._variants[selected]
+
+    def messages(self, fields: Optional[Sequence[str]] = None, **inputs: str) -> List[dict]:
+        return self.select(fields).messages(**inputs)
+
+    def _render(self, selected: Tuple[str, ...]) -> PromptTemplate:
+        blocks = [section for section in self.sections if set(section.fields) & set(selected)]
+        numbered = [f"{number}.  {section.instructions.strip()}" for number, section in enumerate(blocks, start=1)]
+        example = self.example[self.wrapper] if self.wrapper else self.example
+        reduced = {name: value for name, value in example.items() if name in selected}
+        if self.wrapper:
+            reduced = {self.wrapper: reduced}
+        instructions = "\n\n".join([
+            textwrap.dedent(self.header).strip(),
+            *numbered,
+            textwrap.dedent(self.footer).strip(),
+            f"```json\n{json.dumps(reduced, indent=2, ensure_ascii=False)}\n```",
+        ])
+        return PromptTemplate(name=self.name, version=self.version, instructions=instructions)
+
+_registry: Dict[str, Union[PromptTemplate, SectionedPromptTemplate]] = {}
+
+def _register(template):
+    if template.name in _registry:
+        raise ValueError(f"Prompt '{template.name}' is already registered.")
+    _registry[template.name] = template
+    return template
+
+def register_prompt(name: str, version: str, instructions: str) -> PromptTemplate:
+    """
+    Adds a prompt to the registry. Bump `version` whenever the instructions
+    change: it is part of the result cache keys of everything the prompt produces.
+    """
+    return _register(PromptTemplate(name=name, version=version, instructions=textwrap.dedent(instructions).strip()))
+
+def register_sectioned_prompt(
+    name: str,
+    version: str,
+    header: str,
+    sections: Sequence[PromptSection],
+    footer: str,
+    example: Dict[str, Any],
+    wrapper: str = "",
+) -> SectionedPromptTemplate:
+    """
+    Adds a sectioned prompt to the registry and renders its full variant.
+    `example` is the output example, wrapped in `wrapper` if the response
+    model nests its result under that key.
+    """
+    template = _register(SectionedPromptTemplate(
+        name=name, version=version, header=header, sections=tuple(sections), footer=footer, example=example, wrapper=wrapper,
+    ))
+    template.select()
+    return template
+
+def get_prompt(name: str) -> Union[PromptTemplate, SectionedPromptTemplate]:
+    return _registry[name]
+
+def prompt_versions() -> Dict[str, str]:
+    """The registered prompts and their versions."""
+    return {name: template.version for name, template in sorted(_registry.items())}
+
+def _collect_prompt_metrics():
+    """Exports the prompt versions in use on /metrics."""
+    yield from render_samples("resumealign_prompt_info", "gauge", "Registered prompt templates and their versions.",
+                              [({"prompt": name, "version": version}, 1) for name, version in prompt_versions().items()])
+
+registry.register_collector(_collect_prompt_metrics)
@@ -0,0 +1,173 @@
+import difflib
+import re
+import types
+from functools import lru_cache
+from typing import Any, List, Literal, Optional, Type, Union, get_args, get_origin
+
+import annotated_types
+from pydantic import BaseModel, ValidationError, create_model, model_validator
+
+from .metrics import Counter, registry
+from .scheduler import current_operation
+
+LLM_REPAIRS = registry.register(Counter(
+    "resumealign_llm_repairs_total",
+    "Model outputs that failed validation and were repaired locally, or could not be.",
+    ("operation", "outcome"),
+))
+LLM_REPAIR_FIXES = registry.register(Counter(
+    "resumealign_llm_repair_fixes_total", "Individual fixes applied by the local output repair.", ("operation", "fix"),
+))
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+def _key(name: str) -> str:
+    """Collapses camelCase, snake_case, kebab-case and spacing to one form."""
+    return _NON_ALNUM.sub("", name.lower())
+
+def unwrap_optional(annotation: Any) -> Any:
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+def _match_literal(value: str, choices: List[str]) -> Optional[str]:
+    by_key = {_key(choice): choice for choice in choices}
+    if _key(value) in by_key:
+        return by_key[_key(value)]
+    close = difflib.get_close_matches(value.lower(), [choice.lower() for choice in choices], n=1, cutoff=0.6)
+    return next((choice for choice in choices if choice.lower() == close[0]), None) if close else None
+
+def _repair_int(value: Any, metadata: List[Any], fixes: List[str]) -> Any:
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip("%"))
+        except ValueError:
+            return value
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if isinstance(value, float):
+        value = round(value)
+        fixes.append("number")
+    for constraint in metadata:
+        if isinstance(constraint, annotated_types.Ge) and value < constraint.ge:
+            value = constraint.ge
+        elif isinstance(constraint, annotated_types.Gt) and value <= constraint.gt:
+            value = constraint.gt + 1
+        elif isinstance(constraint, annotated_types.Le) and value > constraint.le:
+            value = constraint.le
+        elif isinstance(constraint, annotated_types.Lt) and value >= constraint.lt:
+            value = constraint.lt - 1
+        else:
+            continue
+        fixes.append("clamp")
+    return value
+
+def _repair_str(value: Any, metadata: List[Any], fixes: List[str]) -> Any:
+    if not isinstance(value, str):
+        return value
+    for constraint in metadata:
+        if isinstance(constraint, annotated_types.MaxLen) and len(value) > constraint.max_length:
+            cut = value[:constraint.max_length - 1]
+            # End on a word boundary when there is one reasonably close
+            if " " in cut[-50:]:
+                cut = cut[:cut.rindex(" ")]
+            value = cut.rstrip() + "…"
+            fixes.append("truncate")
+    return value
+
+def _repair_value(annotation: Any, metadata: List[Any], value: Any, fixes: List[str]) -> Any:
+    annotation = unwrap_optional(annotation)
+    origin = get_origin(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _repair_object(annotation, value, fixes) if isinstance(value, dict) else value
+    if origin is list:
+        (item_type,) = get_args(annotation) or (Any,)
+        return [_repair_value(item_type, [], item, fixes) for item in value] if isinstance(value, list) else value
+    if origin is Literal:
+        choices = [str(choice) for choice in get_args(annotation)]
+        if isinstance(value, str) and value not in choices:
+            matched = _match_literal(value, choices)
+            if matched is not None:
+                fixes.append("enum")
+                return matched
+        return value
+    if annotation is int:
+        return _repair_int(value, metadata, fixes)
+    if annotation is str:
+        return _repair_str(value, metadata, fixes)
+    return value
+
+def _repair_object(model: Type[BaseModel], data: dict, fixes: List[str]) -> dict:
+    fields = model.model_fields
+    by_key = {_key(info.alias or name): name for name, info in fields.items()}
+    repaired = {}
+    for key, value in data.items():
+        name = key if key in fields else by_key.get(_key(key))
+        if name is not None and name != key:
+            if name in data:
+                continue
+            fixes.append("key_case")
+        repaired[name or key] = value
+
+    for name, info in fields.items():
+        if name not in repaired:
+            if info.is_required() and get_origin(unwrap_optional(info.annotation)) is list:
+                repaired[name] = []
+                fixes.append("fill")
+            continue
+        repaired[name] = _repair_value(info.annotation, info.metadata, repaired[name], fixes)
+        section = unwrap_optional(info.annotation)
+        if not info.is_required() and isinstance(section, type) and issubclass(section, BaseModel) and repaired[name] is not None:
+            # An optional section that is still invalid is dropped rather than re-asked
+            try:
+                section.model_validate(repaired[name])
+            except ValidationError:
+                repaired[name] = None
+                fixes.append("drop_optional")
+    return repaired
+
+def repair_output(model: Type[BaseModel], data: dict) -> tuple[dict, List[str]]:
+    """
+    Returns `data` with the common mistakes of model output fixed for
+    `model`, and the list of fixes applied: key casing, out-of-range or
+    stringly-typed integers, near-miss Literal values, over-long strings,
+    missing required lists and invalid optional sections.
+    """
+    fixes: List[str] = []
+    return _repair_object(model, data, fixes), fixes
+
+def _validate_with_repair(cls: Type[BaseModel], data: Any, handler: Any) -> Any:
+    try:
+        return handler(data)
+    except ValidationError:
+        if not isinstance(data, dict):
+            raise
+        operation = current_operation.get()
+        repaired, fixes = repair_output(cls, data)
+        try:
+            result = handler(repaired)
+        except ValidationError:
+            LLM_REPAIRS.inc(operation=operation, outcome="failed")
+            raise
+        LLM_REPAIRS.inc(operation=operation, outcome="repaired")
+        for fix in fixes:
+            LLM_REPAIR_FIXES.inc(operation=operation, fix=fix)
+        return result
+
+@lru_cache(maxsize=None)
+def repairable(model: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Returns a subclass of `model` that, when validation fails, repairs the
+    output locally and validates again before giving up. Only if the repair
+    fails does instructor go back to the model with a re-ask. The subclass
+    keeps the name, docstring and JSON schema, so the prompt does not change.
+    """
+    return create_model(
+        model.__name__,
+        __base__=model,
+        __module__=model.__module__,
+        __doc__=model.__doc__,
+        __validators__={"_validate_with_repair": model_validator(mode="wrap")(_validate_with_repair)},
+    )
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from ..schemas import (
+    AnalysisRequest, ATSCheckRequest, BatchItemError, JDAnalysisRequest, ReportRequest, ReportResponse, ReportSection,
+)
+from .analyzer import run_analysis
+from .ats_checker import run_ats_check
+from .jd_analyzer import run_jd_analysis
+from .preprocess import prepare_text
+
+async def run_report(request: ReportRequest) -> ReportResponse:
+    """
+    Runs the requested sections concurrently on one preprocessed copy of the
+    CV and JD, so the report takes about as long as its slowest section.
+    Sections fail independently: a failed section is null and its error is
+    listed under 'errors' instead of failing the report.
+
+    With jd_format='digest', the analysis waits on the same single-flight JD
+    analysis as the 'jd_analysis' section instead of running its own.
+    """
+    cv_text = prepare_text(request.cv_text, "cv").text
+    jd_text = prepare_text(request.jd_text, "jd").text
+
+    runners: Dict[ReportSection, Callable[[], Awaitable[BaseModel]]] = {
+        "analysis": lambda: run_analysis(
+            AnalysisRequest(cv_text=cv_text, jd_text=jd_text, mode=request.mode, jd_format=request.jd_format), preprocessed=True
+        ),
+        "ats_check": lambda: run_ats_check(
+            ATSCheckRequest(cv_text=cv_text, mode=request.ats_mode), preprocessed=True, raw_cv_text=request.cv_text
+        ),
+        "jd_analysis": lambda: run_jd_analysis(JDAnalysisRequest(jd_text=jd_text), preprocessed=True),
+    }
+    sections = list(dict.fromkeys(request.include))
+    outcomes = await asyncio.gather(*(runners[section]() for section in sections), return_exceptions=True)
+
+    report = ReportResponse()
+    for section, outcome in zip(sections, outcomes):
+        if isinstance(outcome, HTTPException):
+            report.errors[section] = BatchItemError(status_code=outcome.status_code, detail=str(outcome.detail))
+        elif isinstance(outcome, Exception):
+            print(f"An error occurred during report section '{section}': {outcome}")
+            report.errors[section] = BatchItemError(status_code=500, detail="An unexpected internal error occurred.")
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            # Each response wraps its result in a field named after the section
+            setattr(report, section, getattr(outcome, section))
+    return report
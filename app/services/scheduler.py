@@ -0,0 +1,364 @@
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Optional, Tuple
+
+import httpx
+
+from ..core.config import settings
+from .metrics import Counter, Histogram, registry, render_samples
+from .preprocess import estimate_tokens
+
+# Statuses that mean "try again later" rather than "this request is wrong"
+_RETRYABLE_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Fair-queue key of the upstream call being made in this task (set by llm.create_completion)
+current_operation: ContextVar[str] = ContextVar("current_operation", default="default")
+# Tokens charged for the last request admitted in this task, until the API reports usage
+_admitted_tokens: ContextVar[Optional[int]] = ContextVar("admitted_tokens", default=None)
+
+SCHEDULER_WAIT = registry.register(Histogram(
+    "resumealign_llm_scheduler_wait_seconds", "Time upstream requests waited for admission.", ("operation",)))
+SCHEDULER_RETRIES = registry.register(Counter(
+    "resumealign_llm_scheduler_retries_total", "Upstream requests re-sent by the scheduler, by reason.", ("reason",)))
+
+
+class _TokenBucket:
+    """
+    Refills `per_minute` units evenly over a minute, up to one minute's worth.
+    The level can go negative when a request turns out bigger than estimated.
+    """
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` (at most one full bucket) is available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+@dataclass
+class _Ticket:
+    cost: int
+    operation: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class UpstreamScheduler:
+    """
+    Admission control for every request to the LLM API.
+
+    Requests wait in one FIFO queue per operation, served round-robin so that
+    a burst of one kind (e.g. a batch of analyses) cannot starve the others.
+    The head request is admitted once the RPM and TPM token buckets cover its
+    estimated cost, no 429 back-off is in effect, and fewer than the current
+    concurrency limit are in flight. The limit adapts AIMD-style: it grows by
+    one per window of successful calls, shrinks by 10% when latency climbs
+    well above the best observed, and halves on a 429. Latency is tracked per
+    (operation, model), since a slow analysis is not a sign of congestion
+    next to fast JD calls; streamed calls are left out, as their headers
+    arrive with the first token rather than the whole response.
+    """
+    def __init__(self):
+        self._rpm = _TokenBucket(settings.llm_rpm_limit) if settings.llm_rpm_limit else None
+        self._tpm = _TokenBucket(settings.llm_tpm_limit) if settings.llm_tpm_limit else None
+        self.limit = float(settings.llm_max_concurrency)
+        self.in_flight = 0
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._changed = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self._latency_ewma: Dict[Tuple[str, str], float] = {}
+        self._latency_floor: Dict[Tuple[str, str], float] = {}
+        self.admitted = 0
+        self.rate_limited = 0
+
+    # --- Admission ---
+
+    async def acquire(self, cost: int) -> None:
+        """Waits until a request of `cost` estimated tokens may be sent."""
+        operation = current_operation.get()
+        ticket = _Ticket(cost=cost, operation=operation, future=asyncio.get_running_loop().create_future())
+        self._queues.setdefault(operation, deque()).append(ticket)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._changed.set()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            # Cancelled after the dispatcher admitted the ticket but before this task resumed:
+            # the slot was taken on our behalf and nobody else will give it back
+            if ticket.future.done() and not ticket.future.cancelled():
+                self.release()
+            raise
+        _admitted_tokens.set(cost)
+        SCHEDULER_WAIT.observe(time.monotonic() - ticket.enqueued_at, operation=operation)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._changed.set()
+
+    def _head(self) -> Optional[_Ticket]:
+        """The next ticket in round-robin order, dropping abandoned ones."""
+        while self._queues:
+            operation, queue = next(iter(self._queues.items()))
+            while queue and queue[0].future.done():
+                queue.popleft()
+            if queue:
+                return queue[0]
+            del self._queues[operation]
+        return None
+
+    def _admission_delay(self, cost: int) -> Optional[float]:
+        """Seconds until `cost` can be admitted, or None if blocked on concurrency."""
+        if self.in_flight >= max(int(self.limit), 1):
+            return None
+        delay = max(self._paused_until - time.monotonic(), 0.0)
+        if self._rpm is not None:
+            delay = max(delay, self._rpm.wait_time(1))
+        if self._tpm is not None:
+            delay = max(delay, self._tpm.wait_time(cost))
+        return delay
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._changed.clear()
+            ticket = self._head()
+            if ticket is None:
+                await self._changed.wait()
+                continue
+            delay = self._admission_delay(ticket.cost)
+            if delay is None:
+                await self._changed.wait()
+                continue
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            queue = self._queues.pop(ticket.operation)
+            queue.popleft()
+            if queue:
+                # Rotate: this operation goes to the back of the line
+                self._queues[ticket.operation] = queue
+            if self._rpm is not None:
+                self._rpm.take(1)
+            if self._tpm is not None:
+                self._tpm.take(ticket.cost)
+            self.in_flight += 1
+            self.admitted += 1
+            ticket.future.set_result(None)
+
+    # --- Feedback ---
+
+    def settle(self, actual_tokens: int) -> None:
+        """
+        Corrects the TPM bucket once the API reports the real usage of the
+        last request admitted in this task.
+        """
+        estimate = _admitted_tokens.get()
+        if estimate is not None and self._tpm is not None:
+            self._tpm.take(actual_tokens - estimate)
+        _admitted_tokens.set(None)
+
+    def on_success(self, latency_key: Optional[Tuple[str, str]], latency: float) -> None:
+        """
+        Adapts the limit after a successful response. `latency_key` is the
+        (operation, model) the latency is compared within, or None when the
+        latency says nothing about load (streamed calls).
+        """
+        if latency_key is not None:
+            alpha = 0.2
+            ewma = self._latency_ewma.get(latency_key)
+            ewma = latency if ewma is None else (1 - alpha) * ewma + alpha * latency
+            # The floor follows the smoothed latency, so calls that simply vary in length do not
+            # read as congestion; it drifts up slowly to follow a permanently slower upstream
+            floor = self._latency_floor.get(latency_key)
+            floor = ewma if floor is None else min(floor * 1.01, ewma)
+            self._latency_ewma[latency_key] = ewma
+            self._latency_floor[latency_key] = floor
+            if ewma > floor * settings.llm_latency_tolerance:
+                self.limit = max(float(settings.llm_min_concurrency), self.limit * 0.9)
+                return
+        self.limit = min(float(settings.llm_max_concurrency), self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_rate_limited(self, pause: float) -> None:
+        """Holds back all admissions for `pause` seconds and halves the concurrency limit."""
+        self.rate_limited += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        self.limit = max(float(settings.llm_min_concurrency), self.limit / 2)
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "latency_ewma_s": {f"{operation}:{model}": round(ewma, 3) for (operation, model), ewma in self._latency_ewma.items()},
+        }
+
+_scheduler: Optional[UpstreamScheduler] = None
+
+def get_scheduler() -> UpstreamScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = UpstreamScheduler()
+    return _scheduler
+
+async def close_scheduler() -> None:
+    """Stops the dispatcher. Called on app shutdown, together with the LLM client."""
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.close()
+        _scheduler = None
+
+def _collect_scheduler_metrics():
+    """Exports the scheduler state on /metrics."""
+    if _scheduler is None:
+        return
+    stats = _scheduler.stats()
+    yield from render_samples("resumealign_llm_concurrency_limit", "gauge", "Current adaptive limit on concurrent upstream requests.", [({}, _scheduler.limit)])
+    yield from render_samples("resumealign_llm_upstream_in_flight", "gauge", "Upstream requests currently admitted.", [({}, stats["in_flight"])])
+    yield from render_samples("resumealign_llm_scheduler_queued", "gauge", "Upstream requests waiting for admission.", [({}, stats["queued"])])
+    yield from render_samples("resumealign_llm_rate_limited_total", "counter", "429 responses that paused admissions.", [({}, stats["rate_limited"])])
+
+registry.register_collector(_collect_scheduler_metrics)
+
+
+def _request_body(request: httpx.Request) -> dict:
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return body if isinstance(body, dict) else {}
+
+def _estimate_cost(body: dict) -> int:
+    """
+    Estimated tokens of a chat-completions request: the prompt (messages and
+    tool schema) plus the completion reserve (max_tokens, or the configured estimate).
+    """
+    prompt = sum(estimate_tokens(str(message.get("content") or "")) for message in body.get("messages", []))
+    prompt += len(json.dumps(body.get("tools", []))) // 4
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or settings.llm_completion_token_estimate
+    return prompt + completion
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """
+    The server's Retry-After (seconds, milliseconds or HTTP date) if given,
+    otherwise exponential backoff with full jitter.
+    """
+    if response is not None:
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return min(float(headers["retry-after-ms"]) / 1000, settings.llm_backoff_max_seconds)
+            if "retry-after" in headers:
+                value = headers["retry-after"]
+                try:
+                    seconds = float(value)
+                except ValueError:
+                    seconds = parsedate_to_datetime(value).timestamp() - time.time()
+                return min(max(seconds, 0.0), settings.llm_backoff_max_seconds)
+        except (TypeError, ValueError):
+            pass
+    ceiling = min(settings.llm_backoff_max_seconds, settings.llm_backoff_base_seconds * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that frees the scheduler slot once it is closed."""
+    def __init__(self, stream: httpx.AsyncByteStream, scheduler: UpstreamScheduler):
+        self._stream = stream
+        self._scheduler = scheduler
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._scheduler.release()
+
+
+class SchedulingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport for the LLM client that sends every request through the
+    scheduler, and re-sends it after 429s, 5xx and connection errors with the
+    server's Retry-After or jittered exponential backoff.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: UpstreamScheduler):
+        self._transport = transport
+        self._scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scheduler = self._scheduler
+        body = _request_body(request)
+        cost = _estimate_cost(body)
+        latency_key = None if body.get("stream") else (current_operation.get(), str(body.get("model", "")))
+        for attempt in range(settings.llm_max_retries + 1):
+            last_attempt = attempt == settings.llm_max_retries
+            await scheduler.acquire(cost)
+            started = time.monotonic()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError):
+                scheduler.release()
+                if last_attempt:
+                    raise
+                SCHEDULER_RETRIES.inc(reason="connection")
+                await asyncio.sleep(_retry_delay(None, attempt))
+                continue
+            except BaseException:
+                scheduler.release()
+                raise
+
+            if response.status_code in _RETRYABLE_STATUSES and not last_attempt:
+                delay = _retry_delay(response, attempt)
+                await response.aclose()
+                scheduler.release()
+                if response.status_code == 429:
+                    scheduler.on_rate_limited(delay)
+                SCHEDULER_RETRIES.inc(reason=str(response.status_code))
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code < 400:
+                scheduler.on_success(latency_key, time.monotonic() - started)
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=_ReleasingStream(response.stream, scheduler),
+                extensions=response.extensions,
+            )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,69 @@
+from functools import lru_cache
+from typing import Annotated, Optional, Sequence, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, Field, create_model
+
+from .repair import unwrap_optional
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+def _result_field(response_model: Type[BaseModel]) -> Tuple[str, Type[BaseModel]]:
+    """The single field a response model wraps its result in, e.g. ('analysis', AnalysisResult)."""
+    ((name, info),) = response_model.model_fields.items()
+    return name, info.annotation
+
+def section_key(result_model: Type[BaseModel], sections: Optional[Sequence[str]]) -> Optional[Tuple[str, ...]]:
+    """
+    The requested sections in field order, or None when all were requested,
+    so that equivalent selections share prompts, models and cache entries.
+    """
+    if sections is None:
+        return None
+    selected = tuple(name for name in result_model.model_fields if name in sections)
+    return None if len(selected) == len(result_model.model_fields) else selected
+
+@lru_cache(maxsize=None)
+def llm_response_model(
+    response_model: Type[BaseModel], sections: Optional[Tuple[str, ...]] = None, optional: Tuple[str, ...] = (),
+) -> Type[BaseModel]:
+    """
+    The model the LLM is asked to fill for the given sections of
+    `response_model`. The API models keep every section nullable so that
+    omitted ones can be returned as null; here the requested sections are
+    required and non-null again, except those in `optional`. Names,
+    docstrings, descriptions and constraints are kept, so the tool schema
+    of a full request does not change.
+    """
+    wrapper, result_model = _result_field(response_model)
+    fields = {}
+    for name, info in result_model.model_fields.items():
+        if sections is not None and name not in sections:
+            continue
+        annotation = unwrap_optional(info.annotation)
+        if info.metadata:
+            annotation = Annotated[(annotation, *info.metadata)]
+        if name in optional:
+            fields[name] = (Optional[annotation], Field(None, description=info.description))
+        else:
+            fields[name] = (annotation, Field(..., description=info.description))
+    reduced = create_model(result_model.__name__, __doc__=result_model.__doc__, __module__=result_model.__module__, **fields)
+    wrapper_info = response_model.model_fields[wrapper]
+    return create_model(
+        response_model.__name__,
+        __doc__=response_model.__doc__,
+        __module__=response_model.__module__,
+        **{wrapper: (reduced, Field(..., description=wrapper_info.description))},
+    )
+
+def to_api_response(response_model: Type[ResponseT], output: BaseModel) -> ResponseT:
+    """Converts the LLM's (possibly reduced) output to the API model, with omitted sections null."""
+    return response_model.model_validate(output.model_dump())
+
+def select_sections(response: ResponseT, sections: Optional[Tuple[str, ...]]) -> ResponseT:
+    """Returns `response` with every section outside `sections` set to null."""
+    if sections is None:
+        return response
+    wrapper, _ = _result_field(type(response))
+    result = getattr(response, wrapper)
+    omitted = {name: None for name in type(result).model_fields if name not in sections}
+    return response.model_copy(update={wrapper: result.model_copy(update=omitted)})
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from .metrics import registry, render_samples
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    work, every caller that arrives while it is running awaits the same
+    result (or the same exception).
+    """
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `fn()` once per key at a time and returns its result to all callers.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            # The work runs in its own task so a disconnecting caller cannot
+            # cancel it for everyone else waiting on the same key.
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+inflight = SingleFlight()
+
+def _collect_singleflight_metrics():
+    """Exports the single-flight counters on /metrics."""
+    yield from render_samples("resumealign_singleflight_started_total", "counter", "Upstream calls started by single-flight.", [({}, inflight.started)])
+    yield from render_samples("resumealign_singleflight_coalesced_total", "counter", "Requests that shared an in-flight call.", [({}, inflight.coalesced)])
+    yield from render_samples("resumealign_singleflight_in_flight", "gauge", "Distinct calls currently in flight.", [({}, len(inflight._inflight))])
+
+registry.register_collector(_collect_singleflight_metrics)
@@ -0,0 +1,74 @@
+import json
+from typing import AsyncIterator, List, Tuple, Type
+
+import instructor
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from ..core.config import settings
+from .cache import result_cache
+from .llm import create_completion
+from .repair import repairable
+from .sections import to_api_response
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def to_sse(stream: AsyncIterator[Tuple[str, BaseModel]]) -> AsyncIterator[str]:
+    """
+    Formats a service stream as Server-Sent Events.
+
+    The services yield ("partial", snapshot) pairs while the response is being
+    generated and one ("complete", response) pair once it is fully validated.
+    Snapshots are sent as `partial` events (unchanged ones are skipped), the
+    validated response as a `complete` event and failures as `error`.
+    """
+    last_payload = None
+    try:
+        async for event, item in stream:
+            if event == "complete":
+                yield _sse_event("complete", item.model_dump_json())
+                continue
+            payload = item.model_dump_json(exclude_none=True)
+            if payload != last_payload:
+                last_payload = payload
+                yield _sse_event("partial", payload)
+    except HTTPException as e:
+        yield _sse_event("error", json.dumps({"status_code": e.status_code, "detail": e.detail}))
+    except Exception as e:
+        print(f"An error occurred while streaming a response: {e}")
+        yield _sse_event("error", json.dumps({"status_code": 500, "detail": "An unexpected internal error occurred."}))
+
+async def stream_completion(
+    operation: str,
+    messages: List[dict],
+    llm_model: Type[BaseModel],
+    response_model: Type[BaseModel],
+    cache_key: str,
+    failure_detail: str,
+) -> AsyncIterator[Tuple[str, BaseModel]]:
+    """
+    Streams a structured completion for a service: yields ("partial",
+    snapshot) pairs while the model writes `llm_model`, then validates the
+    final output as a non-streamed call would, with the local repair when
+    enabled, caches it under `cache_key` and yields ("complete", response).
+    Failures other than HTTPException become 500 with `failure_detail`.
+    """
+    try:
+        partials = await create_completion(operation, messages, instructor.Partial[llm_model], stream=True)
+        last = None
+        async for partial in partials:
+            last = partial
+            yield "partial", partial
+        final_model = repairable(llm_model) if settings.llm_repair_enabled else llm_model
+        response = to_api_response(response_model, final_model.model_validate(last.model_dump() if last is not None else {}))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"An error occurred during a streamed {operation} call: {e}")
+        raise HTTPException(status_code=500, detail=failure_detail)
+
+    await result_cache.set(cache_key, response)
+    yield "complete", response
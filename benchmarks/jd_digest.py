@@ -0,0 +1,119 @@
+"""
+Compares /analyze prompts built from the raw JD text with prompts built from
+the structured JD digest (AnalysisRequest.jd_format = "digest").
+
+For every CV it reports the prompt size of both variants and, unless
+--prompt-only is given, runs each prompt against the configured model and
+records latency and the token usage reported by the API. The JD digest itself
+comes from run_jd_analysis, so it is computed once and then served from the
+result cache.
+
+Usage:
+    python -m benchmarks.jd_digest --jd jd.txt --cv cv1.txt --cv cv2.txt [--runs 3] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.schemas import AnalysisResponse, JDAnalysisRequest
+from app.services.analyzer import ANALYSIS_PROMPT
+from app.services.jd_analyzer import render_jd_digest, run_jd_analysis
+from app.services.llm import close_client, get_client
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except ImportError:
+    _ENCODING = None
+
+def _count_tokens(text: str) -> int:
+    """Exact count with tiktoken when available, otherwise ~4 characters per token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text) // 4
+
+def _count_message_tokens(messages: list) -> int:
+    return sum(_count_tokens(message["content"]) for message in messages)
+
+async def _timed_call(messages: list) -> dict:
+    started = time.perf_counter()
+    response = await get_client().chat.completions.create(
+        model=settings.llm_model,
+        messages=messages,
+        response_model=AnalysisResponse,
+        max_retries=2,
+    )
+    elapsed = time.perf_counter() - started
+    usage = response._raw_response.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "latency_s": round(elapsed, 3),
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details is not None else 0,
+        "completion_tokens": usage.completion_tokens,
+    }
+
+def _summarize(calls: list) -> dict:
+    if not calls:
+        return {}
+    return {
+        "calls": len(calls),
+        "latency_p50_s": round(statistics.median(c["latency_s"] for c in calls), 3),
+        "latency_mean_s": round(statistics.fmean(c["latency_s"] for c in calls), 3),
+        "prompt_tokens_mean": round(statistics.fmean(c["prompt_tokens"] for c in calls), 1),
+        "cached_tokens_mean": round(statistics.fmean(c["cached_tokens"] for c in calls), 1),
+        "completion_tokens_mean": round(statistics.fmean(c["completion_tokens"] for c in calls), 1),
+    }
+
+async def main(args: argparse.Namespace) -> dict:
+    jd_text = Path(args.jd).read_text(encoding="utf-8")
+    cv_texts = [Path(path).read_text(encoding="utf-8") for path in args.cv]
+
+    jd_response = await run_jd_analysis(JDAnalysisRequest(jd_text=jd_text))
+    digest = render_jd_digest(jd_response.jd_analysis)
+
+    results = {
+        "model": settings.llm_model,
+        "jd_tokens": {"raw": _count_tokens(jd_text), "digest": _count_tokens(digest)},
+        "prompts": [],
+        "live": {"raw": [], "digest": []},
+    }
+    for cv_path, cv_text in zip(args.cv, cv_texts):
+        prompts = {
+            "raw": ANALYSIS_PROMPT.messages(cv_text=cv_text, job_description_text=jd_text),
+            "digest": ANALYSIS_PROMPT.messages(cv_text=cv_text, job_description_text=digest),
+        }
+        results["prompts"].append({"cv": cv_path, **{mode: _count_message_tokens(messages) for mode, messages in prompts.items()}})
+        if args.prompt_only:
+            continue
+        for _ in range(args.runs):
+            for mode, messages in prompts.items():
+                results["live"][mode].append(await _timed_call(messages))
+
+    results["summary"] = {mode: _summarize(calls) for mode, calls in results["live"].items()}
+    await close_client()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jd", required=True, help="Path to a job description text file.")
+    parser.add_argument("--cv", required=True, action="append", help="Path to a CV text file (repeatable).")
+    parser.add_argument("--runs", type=int, default=1, help="Live calls per CV and prompt variant.")
+    parser.add_argument("--prompt-only", action="store_true", help="Only compare prompt sizes; no analysis calls.")
+    parser.add_argument("--output", help="Write the full results as JSON to this path.")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    print(f"JD tokens: raw={results['jd_tokens']['raw']} digest={results['jd_tokens']['digest']}")
+    for prompt in results["prompts"]:
+        saved = prompt["raw"] - prompt["digest"]
+        print(f"{prompt['cv']}: prompt tokens raw={prompt['raw']} digest={prompt['digest']} ({saved} saved)")
+    for mode, summary in results["summary"].items():
+        if summary:
+            print(f"{mode}: {summary}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
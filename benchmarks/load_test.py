@@ -0,0 +1,331 @@
+"""
+Offline load test for the service's own overhead: FastAPI routing, request
+and response validation, preprocessing, instructor parsing and retries.
+
+By default the app runs in-process (httpx ASGI transport), and its LLM client
+points at a local mock chat-completions server (benchmarks.mock_openai), so no
+request reaches OpenAI. Traffic is replayed from a JSONL file or generated
+from built-in sample CVs/JDs, and sent at a fixed concurrency. The report has
+throughput and p50/p95/p99 latency per endpoint, plus the upstream calls the
+mock served, and can be saved as a JSON baseline and compared against one.
+
+Traffic file format, one request per line:
+    {"endpoint": "/analyze", "body": {"cv_text": "...", "jd_text": "..."}}
+
+The result cache is disabled unless --cache is given, so every request does
+the full round trip. In-process runs need no OPENAI_API_KEY, and keep their
+cache, job and candidate pool files in a temporary directory.
+
+Usage:
+    python -m benchmarks.load_test [--traffic traffic.jsonl] [--requests 300] [--concurrency 20]
+                                   [--latency-ms 200 --error-rate 0.01 --invalid-rate 0.02]
+                                   [--output baseline.json] [--compare baseline.json --tolerance 0.2]
+    python -m benchmarks.load_test --target http://localhost:8000 ...   # a separately started service
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.__version__ import __version__
+from app.core.config import settings
+from .mock_openai import MockServer, MockStats, add_mock_arguments, mock_config_from_args
+
+ENDPOINTS = ("/analyze", "/check-ats", "/analyze-jd-profile")
+
+_SAMPLE_CVS = [
+    """Jane Doe
+jane.doe@example.com | +1 555 123 4567 | linkedin.com/in/janedoe
+
+Summary
+Backend engineer with 7 years of experience building Python services.
+
+Work Experience
+Senior Backend Engineer, Acme Corp (2020 - Present)
+- Built FastAPI services handling 2M requests per day
+- Reduced p95 latency by 35% by introducing Redis caching
+- Led the migration from a monolith to Docker-based microservices
+Backend Engineer, Globex (2017 - 2020)
+- Developed billing APIs in Django and PostgreSQL
+- Automated deployments with GitHub Actions and Terraform
+
+Skills
+Python, FastAPI, Django, PostgreSQL, Redis, Docker, AWS, Terraform
+
+Education
+BSc Computer Science, State University
+""",
+    """John Smith
+john.smith@example.com
++44 20 7946 0958
+
+Profile
+Data engineer focused on batch and streaming pipelines.
+
+Professional Experience
+Data Engineer, Initech (2019 - Present)
+- Designed Spark and Airflow pipelines processing 4TB per day
+- Cut warehouse costs by 28% by partitioning Snowflake tables
+- Mentored three junior engineers
+Analyst, Umbrella (2016 - 2019)
+- Wrote SQL reports and maintained Tableau dashboards
+
+Technical Skills
+Python, SQL, Spark, Airflow, Kafka, Snowflake, dbt, GCP
+
+Education
+MSc Data Science, City University
+""",
+]
+
+_SAMPLE_JDS = [
+    """Senior Backend Engineer
+
+About the role
+You will build and operate the Python APIs behind our payments platform.
+
+Responsibilities
+- Design, build and operate FastAPI services
+- Own the PostgreSQL data model and its performance
+- Improve observability and reliability
+
+Requirements
+- 5+ years of Python backend development
+- Experience with PostgreSQL, Docker and AWS
+- Strong communication skills
+
+Nice to have
+- Kubernetes, Terraform
+
+Benefits
+Remote-first, learning budget, stock options.
+""",
+    """Data Engineer
+
+Responsibilities
+- Build batch and streaming pipelines with Spark, Kafka and Airflow
+- Model the warehouse in Snowflake with dbt
+- Partner with analysts on data quality
+
+Requirements
+- 3+ years of data engineering experience
+- Python and SQL
+- Experience with a cloud data warehouse
+
+Nice to have
+- GCP, Terraform
+""",
+]
+
+
+def _synthetic_traffic(count: int, endpoints: List[str]) -> List[dict]:
+    """
+    Generates `count` requests round-robin over `endpoints`. Each text gets a
+    unique reference line so that neither the cache nor single-flight can
+    collapse requests.
+    """
+    traffic = []
+    for i, endpoint in zip(range(count), itertools.cycle(endpoints)):
+        cv = f"{_SAMPLE_CVS[i % len(_SAMPLE_CVS)]}\nReference: bench-{i}"
+        jd = f"{_SAMPLE_JDS[i % len(_SAMPLE_JDS)]}\nReference: bench-{i}"
+        if endpoint == "/analyze":
+            body = {"cv_text": cv, "jd_text": jd}
+        elif endpoint == "/check-ats":
+            body = {"cv_text": cv}
+        else:
+            body = {"jd_text": jd}
+        traffic.append({"endpoint": endpoint, "body": body})
+    return traffic
+
+def _load_traffic(path: str, count: Optional[int]) -> List[dict]:
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    traffic = [json.loads(line) for line in lines if line.strip()]
+    if count is not None and traffic:
+        traffic = [traffic[i % len(traffic)] for i in range(count)]
+    return traffic
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list, q in [0, 100]."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def _summarize(samples: List[Tuple[float, int]], elapsed: float) -> dict:
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = Counter(status for _, status in samples)
+    errors = sum(count for status, count in statuses.items() if status >= 400 or status == 0)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p95": round(_percentile(latencies, 95) * 1000, 2),
+            "p99": round(_percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+async def _replay(client: httpx.AsyncClient, traffic: List[dict], concurrency: int) -> Tuple[Dict[str, List[Tuple[float, int]]], float]:
+    """
+    Sends the traffic with `concurrency` closed-loop workers and returns the
+    (latency, status) samples per endpoint and the wall-clock duration.
+    Status 0 marks a request that failed without an HTTP response.
+    """
+    samples: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+    queue: Iterator[dict] = iter(traffic)
+
+    async def worker() -> None:
+        for item in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.post(item["endpoint"], json=item["body"])
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples[item["endpoint"]].append((time.perf_counter() - started, status))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+async def _run_in_process(args: argparse.Namespace, traffic: List[dict], warmup: List[dict]) -> dict:
+    # The mock accepts any key; without one the OpenAI client refuses to send requests
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    with tempfile.TemporaryDirectory(prefix="resumealign-load-") as scratch:
+        # Set before the app is imported: the result cache opens its file on import
+        settings.cache_db_path = os.path.join(scratch, "cache.sqlite3")
+        settings.jobs_db_path = os.path.join(scratch, "jobs.sqlite3")
+        settings.documents_db_path = os.path.join(scratch, "documents.sqlite3")
+        settings.pool_dir = os.path.join(scratch, "candidate_pool")
+
+        from app.main import app
+        from app.services.cache import result_cache
+        from app.services.llm import close_client
+
+        result_cache.enabled = args.cache
+        mock = MockServer(mock_config_from_args(args)).start()
+        settings.llm_base_url = mock.base_url
+        try:
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://service", timeout=None) as client:
+                    await _replay(client, warmup, args.concurrency)
+                    mock.app.state.stats = MockStats()
+                    samples, elapsed = await _replay(client, traffic, args.concurrency)
+            return {"samples": samples, "elapsed": elapsed, "upstream": asdict(mock.stats)}
+        finally:
+            await close_client()
+            mock.stop()
+
+async def _run_against_target(args: argparse.Namespace, traffic: List[dict], warmup: List[dict]) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.target, timeout=None, limits=limits) as client:
+        await _replay(client, warmup, args.concurrency)
+        samples, elapsed = await _replay(client, traffic, args.concurrency)
+    return {"samples": samples, "elapsed": elapsed, "upstream": None}
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every endpoint whose p95 latency, throughput or
+    error rate regressed by more than `tolerance` against the baseline.
+    """
+    regressions = []
+    for endpoint, base in baseline.get("endpoints", {}).items():
+        current = results["endpoints"].get(endpoint)
+        if current is None:
+            continue
+        p95, base_p95 = current["latency_ms"]["p95"], base["latency_ms"]["p95"]
+        if base_p95 and p95 > base_p95 * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {base_p95} ms -> {p95} ms")
+        rps, base_rps = current["throughput_rps"], base["throughput_rps"]
+        if base_rps and rps < base_rps * (1 - tolerance):
+            regressions.append(f"{endpoint}: throughput {base_rps} -> {rps} req/s")
+        if current["error_rate"] > base["error_rate"] + tolerance / 10:
+            regressions.append(f"{endpoint}: error rate {base['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+async def main(args: argparse.Namespace) -> dict:
+    endpoints = args.endpoint or list(ENDPOINTS)
+    if args.traffic:
+        traffic = _load_traffic(args.traffic, args.requests)
+    else:
+        traffic = _synthetic_traffic(args.requests or 300, endpoints)
+    # Warm-up requests use other texts than the measured ones
+    warmup = [
+        {"endpoint": item["endpoint"], "body": {key: f"{value}\nWarm-up" if isinstance(value, str) else value for key, value in item["body"].items()}}
+        for item in traffic[:args.warmup]
+    ]
+
+    runner = _run_against_target if args.target else _run_in_process
+    run = await runner(args, traffic, warmup)
+    samples, elapsed = run["samples"], run["elapsed"]
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "service_version": __version__,
+            "python": platform.python_version(),
+            "target": args.target or "in-process",
+            "concurrency": args.concurrency,
+            "requests": len(traffic),
+            "warmup": len(warmup),
+            "cache": args.cache,
+            "mock": None if args.target else asdict(mock_config_from_args(args)),
+        },
+        "duration_s": round(elapsed, 3),
+        "overall": _summarize([sample for endpoint_samples in samples.values() for sample in endpoint_samples], elapsed),
+        "endpoints": {endpoint: _summarize(endpoint_samples, elapsed) for endpoint, endpoint_samples in sorted(samples.items())},
+        "upstream": run["upstream"],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traffic", help="JSONL file of {'endpoint', 'body'} requests to replay.")
+    parser.add_argument("--requests", type=int, help="Number of requests to send (default: 300, or the whole traffic file).")
+    parser.add_argument("--endpoint", action="append", choices=ENDPOINTS, help="Endpoint for generated traffic (repeatable; default: all).")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at any time.")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first.")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled.")
+    parser.add_argument("--target", help="Base URL of a running service; its LLM_BASE_URL must point at a mock server.")
+    parser.add_argument("--output", help="Write the results as a JSON baseline to this path.")
+    parser.add_argument("--compare", help="A previous baseline; exit with status 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression for --compare.")
+    add_mock_arguments(parser)
+    parser.set_defaults(latency_ms=200.0, jitter_ms=50.0)
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    print(f"{results['meta']['requests']} requests at concurrency {args.concurrency} in {results['duration_s']} s")
+    for name, summary in [("overall", results["overall"]), *results["endpoints"].items()]:
+        latency = summary["latency_ms"]
+        print(
+            f"{name:<22} {summary['throughput_rps']:>8} req/s  p50={latency['p50']} ms  p95={latency['p95']} ms  "
+            f"p99={latency['p99']} ms  errors={summary['errors']}"
+        )
+    if results["upstream"]:
+        print(f"upstream: {results['upstream']}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
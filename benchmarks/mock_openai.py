@@ -0,0 +1,350 @@
+"""
+A local, OpenAI-compatible chat-completions server for offline benchmarks.
+
+It answers POST /v1/chat/completions with canned structured output for the
+response models the services request (AnalysisResponse, ATSCheckResponse,
+ATSProseResult, JDAnalysisResponse), returned as a tool call the way
+instructor expects, either whole or streamed. Like the OpenAI API, it
+reports a repeated prompt prefix (tool schema + system message, 1024 tokens
+or more) as cached_tokens in the usage. Latency follows a
+configurable distribution, and a share of the calls can fail with 500 or
+429, or return arguments that fail validation so that instructor's retry
+path is exercised.
+
+Point the service at it with LLM_BASE_URL=http://127.0.0.1:8001/v1 and any
+OPENAI_API_KEY.
+
+Usage:
+    python -m benchmarks.mock_openai [--port 8001] [--latency lognormal --latency-ms 800 --sigma 0.4]
+                                     [--error-rate 0.01] [--rate-limit-rate 0.01] [--invalid-rate 0.02]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Literal, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.schemas import AnalysisResponse, ATSCheckResponse, ATSProseResult, JDAnalysisResponse
+
+# Tool-call arguments per response model, keyed by the function name instructor sends
+CANNED_RESPONSES: Dict[str, dict] = {
+    AnalysisResponse.__name__: {
+        "analysis": {
+            "match_score": {
+                "overall_score": 78,
+                "breakdown": {"technical_skills": 82, "experience": 75, "soft_skills": 70},
+                "summary": "Strong backend match with solid Python and cloud experience; limited exposure to Kubernetes.",
+            },
+            "strengths": [
+                {"skill": "Python backend development", "evidence": "Built FastAPI services handling 2M requests per day."},
+                {"skill": "PostgreSQL", "evidence": "Designed the schema and query tuning for the billing platform."},
+            ],
+            "skill_gaps": [
+                {"skill": "Kubernetes", "importance": "Important", "reason": "The role deploys all services to Kubernetes clusters."},
+            ],
+            "learning_path": [
+                {"skill_to_develop": "Kubernetes", "recommendation": "Deploy a side project to a managed cluster and complete the CKAD curriculum."},
+            ],
+            "executive_summary": "You are a strong fit for the core backend work; closing the Kubernetes gap would make you a top candidate.",
+            "learning_potential": {
+                "rating": "High",
+                "summary": "The CV shows several successful technology transitions.",
+                "evidence": ["Moved from PHP to Python within one year", "Adopted AWS and Terraform for the platform team"],
+            },
+        }
+    },
+    ATSCheckResponse.__name__: {
+        "ats_check": {
+            "ats_score": 84,
+            "summary": "The CV uses standard headings and a clear skills list, but some achievements lack metrics.",
+            "issues": [
+                {
+                    "issue_type": "Keywords",
+                    "description": "Several bullets under the most recent role describe tasks without measurable results.",
+                    "suggestion": "Quantify outcomes, e.g. 'Reduced p95 latency by 35%'.",
+                },
+                {
+                    "issue_type": "Parsing Risk",
+                    "description": "The contact line mixes icons and separators, which suggests a graphical header.",
+                    "suggestion": "Put email, phone and LinkedIn as plain text below your name.",
+                },
+            ],
+        }
+    },
+    ATSProseResult.__name__: {
+        "summary": "The CV is mostly ATS friendly; the rule-based findings are minor.",
+        "issues": [
+            {
+                "issue_type": "Parsing Risk",
+                "description": "The skills line uses vertical bars, which suggests a table or multi-column layout.",
+                "suggestion": "List skills as a comma-separated line in a single column.",
+            },
+        ],
+    },
+    JDAnalysisResponse.__name__: {
+        "jd_analysis": {
+            "is_hybrid_role": False,
+            "primary_focus": "Backend engineering",
+            "identified_profiles": [
+                {
+                    "profile_title": "Backend Engineer",
+                    "key_responsibilities": ["Build and operate Python APIs", "Own the PostgreSQL data model"],
+                    "core_requirements": ["Python", "FastAPI", "PostgreSQL", "Docker"],
+                    "desirable_skills": ["Kubernetes", "Terraform"],
+                }
+            ],
+            "conflict_summary": "The JD describes a single cohesive backend role.",
+            "hiring_realism": {"rating": "High", "justification": "The skill combination is common in the market."},
+            "recommendations": ["Clarify the expected seniority", "State the salary range"],
+        }
+    },
+}
+
+
+@dataclass
+class MockConfig:
+    """
+    Behaviour of the mock server: latency distribution and injected failures.
+    """
+    latency: Literal["fixed", "uniform", "lognormal"] = "lognormal"
+    latency_ms: float = 800.0
+    jitter_ms: float = 200.0
+    sigma: float = 0.4
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    invalid_rate: float = 0.0
+    token_latency_ms: float = 0.0
+    seed: Optional[int] = None
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Returns one upstream latency in seconds."""
+        if self.latency == "fixed":
+            ms = self.latency_ms
+        elif self.latency == "uniform":
+            ms = rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        else:
+            # latency_ms is the median; sigma controls the tail
+            ms = self.latency_ms * math.exp(rng.gauss(0.0, self.sigma))
+        return max(ms, 0.0) / 1000
+
+
+@dataclass
+class MockStats:
+    """Counters of what the mock served, to relate service requests to upstream calls."""
+    calls: int = 0
+    ok: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    invalid: int = 0
+    by_model: Dict[str, int] = field(default_factory=dict)
+
+
+def _completion(model: str, name: str, arguments: str, prompt_chars: int, cached_tokens: int) -> dict:
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(arguments) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": {"name": name, "arguments": arguments}}],
+            },
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
+
+def _cached_tokens(body: dict, seen_prefixes: set) -> int:
+    """
+    Tokens of the request's static prefix if an earlier request had the same
+    one, counted in 128-token steps from 1024 tokens as the OpenAI API does.
+    """
+    messages = body.get("messages", [])
+    system = messages[0].get("content") if messages and messages[0].get("role") == "system" else ""
+    prefix = json.dumps(body.get("tools", [])) + str(system or "")
+    tokens = len(prefix) // 4
+    if tokens < 1024:
+        return 0
+    if prefix not in seen_prefixes:
+        seen_prefixes.add(prefix)
+        return 0
+    return tokens // 128 * 128
+
+def _stream_chunks(model: str, name: str, arguments: str, chunk_chars: int = 64):
+    """Yields the tool-call arguments as chat.completion.chunk server-sent events."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    for start in range(0, len(arguments), chunk_chars):
+        tool_call = {"index": 0, "function": {"arguments": arguments[start:start + chunk_chars]}}
+        if start == 0:
+            tool_call.update({"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function"})
+            tool_call["function"]["name"] = name
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"tool_calls": [tool_call]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+def _fit_to_schema(payload: dict, parameters: dict) -> dict:
+    """
+    Drops the fields of the canned payload that the requested tool schema
+    does not ask for, so requests for some sections get only those sections.
+    """
+    defs = parameters.get("$defs", {})
+    fitted = {}
+    for key, value in payload.items():
+        schema = parameters.get("properties", {}).get(key)
+        if schema is None:
+            continue
+        ref = schema.get("$ref", "")
+        schema = defs.get(ref.rsplit("/", 1)[-1], schema) if ref else schema
+        if isinstance(value, dict) and "properties" in schema:
+            value = {name: item for name, item in value.items() if name in schema["properties"]}
+        fitted[key] = value
+    return fitted
+
+def create_app(config: MockConfig) -> FastAPI:
+    """
+    Builds the mock server. Its counters are available as app.state.stats and
+    via GET /stats.
+    """
+    app = FastAPI(title="Mock OpenAI chat completions")
+    app.state.config = config
+    app.state.stats = MockStats()
+    rng = random.Random(config.seed)
+    seen_prefixes: set = set()
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        stats: MockStats = app.state.stats
+        body = await request.json()
+        stats.calls += 1
+        await asyncio.sleep(config.sample_latency(rng))
+
+        roll = rng.random()
+        if roll < config.error_rate:
+            stats.errors += 1
+            return JSONResponse({"error": {"message": "Injected upstream error.", "type": "server_error"}}, status_code=500)
+        roll -= config.error_rate
+        if roll < config.rate_limit_rate:
+            stats.rate_limited += 1
+            return JSONResponse({"error": {"message": "Injected rate limit.", "type": "rate_limit_exceeded"}}, status_code=429, headers={"retry-after": "0"})
+
+        tools = body.get("tools") or []
+        name = tools[0]["function"]["name"] if tools else ""
+        # Streamed requests ask for instructor's Partial[...] variant of the model
+        payload = CANNED_RESPONSES.get(name.removeprefix("Partial"))
+        if payload is None:
+            return JSONResponse({"error": {"message": f"No canned response for '{name}'.", "type": "invalid_request_error"}}, status_code=400)
+        payload = _fit_to_schema(payload, tools[0]["function"].get("parameters", {}))
+        # Generation time grows with the output, roughly 4 characters per token
+        await asyncio.sleep(config.token_latency_ms * len(json.dumps(payload)) / 4 / 1000)
+        stats.by_model[name] = stats.by_model.get(name, 0) + 1
+        if rng.random() < config.invalid_rate:
+            # Empty objects fail validation and make instructor re-ask the model
+            stats.invalid += 1
+            payload = {key: {} for key in payload}
+        else:
+            stats.ok += 1
+        if body.get("stream"):
+            return StreamingResponse(_stream_chunks(body.get("model", "mock"), name, json.dumps(payload)), media_type="text/event-stream")
+        prompt_chars = sum(len(str(message.get("content") or "")) for message in body.get("messages", [])) + len(json.dumps(tools))
+        return _completion(body.get("model", "mock"), name, json.dumps(payload), prompt_chars, _cached_tokens(body, seen_prefixes))
+
+    @app.get("/stats")
+    async def get_stats():
+        return asdict(app.state.stats)
+
+    return app
+
+
+class MockServer:
+    """
+    Runs the mock app with uvicorn on a background thread, so a benchmark can
+    drive the service and its upstream from one process.
+    """
+    def __init__(self, config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+        import uvicorn
+
+        self.app = create_app(config)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning", access_log=False))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def stats(self) -> MockStats:
+        return self.app.state.stats
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("The mock OpenAI server failed to start.")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the MockConfig options to an argument parser."""
+    defaults = MockConfig()
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default=defaults.latency, help="Upstream latency distribution.")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Fixed value, uniform centre or lognormal median, in ms.")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="Half-width of the uniform distribution, in ms.")
+    parser.add_argument("--sigma", type=float, default=defaults.sigma, help="Shape of the lognormal distribution.")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Share of calls answered with HTTP 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="Share of calls answered with HTTP 429.")
+    parser.add_argument("--invalid-rate", type=float, default=defaults.invalid_rate, help="Share of calls whose output fails validation.")
+    parser.add_argument("--token-latency-ms", type=float, default=defaults.token_latency_ms, help="Extra latency per output token, in ms.")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed for reproducible latencies and failures.")
+
+def mock_config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        invalid_rate=args.invalid_rate,
+        token_latency_ms=args.token_latency_ms,
+        seed=args.seed,
+    )
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(mock_config_from_args(args)), host=args.host, port=args.port, log_level="warning")
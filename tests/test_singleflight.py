@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+CALLERS = 20
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    async def scenario():
+        flight = SingleFlight()
+        upstream_calls = 0
+        release = asyncio.Event()
+
+        async def upstream():
+            nonlocal upstream_calls
+            upstream_calls += 1
+            await release.wait()
+            return "result"
+
+        callers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(CALLERS)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers)
+        return flight, upstream_calls, results
+
+    flight, upstream_calls, results = asyncio.run(scenario())
+
+    assert upstream_calls == 1
+    assert results == ["result"] * CALLERS
+    assert flight.stats() == {"in_flight": 0, "started": 1, "coalesced": CALLERS - 1}
+
+
+def test_upstream_error_reaches_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+        upstream_calls = 0
+        release = asyncio.Event()
+
+        async def upstream():
+            nonlocal upstream_calls
+            upstream_calls += 1
+            await release.wait()
+            raise RuntimeError("upstream failed")
+
+        callers = [asyncio.ensure_future(flight.do("key", upstream)) for _ in range(CALLERS)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*callers, return_exceptions=True)
+        return upstream_calls, outcomes
+
+    upstream_calls, outcomes = asyncio.run(scenario())
+
+    assert upstream_calls == 1
+    assert len(outcomes) == CALLERS
+    for outcome in outcomes:
+        assert isinstance(outcome, RuntimeError)
+        assert str(outcome) == "upstream failed"
+
+
+def test_calls_after_completion_start_a_new_upstream_call():
+    async def scenario():
+        flight = SingleFlight()
+        upstream_calls = 0
+
+        async def upstream():
+            nonlocal upstream_calls
+            upstream_calls += 1
+            return upstream_calls
+
+        first = await flight.do("key", upstream)
+        second = await flight.do("key", upstream)
+        return first, second
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def upstream():
+            await release.wait()
+            return "result"
+
+        leaving = asyncio.ensure_future(flight.do("key", upstream))
+        staying = asyncio.ensure_future(flight.do("key", upstream))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(scenario()) == "result"